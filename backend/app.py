@@ -4,18 +4,34 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 from config import Config
-from models.connect_log_model import ConnectionLog
-from routes.alicat_routes import alicat_bp
+from models.connect_log_model import ConnectionLog, ConnectionLogDaily
+from models.recipe_model import RecipeRecord
+from models.history_model import HistoryChannel, HistorySample
+from models.run_model import RunRecord
+from routes.alicat_routes import alicat_bp, alicat_bus, poll_status as alicat_poll_status, poll_bus_status as alicat_bus_poll_status, apply_recipe as alicat_apply_recipe
 from routes.recipe_routes import recipe_bp
 from routes.auth_routes import auth_bp
-from routes.co2_laser_routes import uc2000_bp
+from routes.co2_laser_routes import uc2000_bp, poll_status as uc2000_poll_status, apply_recipe as uc2000_apply_recipe
 from routes.port_connect_routes import port_scanner_bp
-from routes.heater_routes import heater_bp
-from routes.ultrasonic_routes import modbus_bp
-from routes.azbil_MFC_routes import azbil_MFC_bp
+from routes.heater_routes import heater_bp, poll_status as heater_poll_status, apply_recipe as heater_apply_recipe
+from routes.ultrasonic_routes import modbus_bp, poll_status as ultrasonic_poll_status
+from routes.azbil_MFC_routes import azbil_MFC_bp, poll_status as azbil_poll_status, apply_recipe as azbil_apply_recipe
 from routes.transmittance_routes import transmittance_bp
-from routes.power_supply_routes import power_supply_bp
-from routes.robot_arm_routes import robot_bp
+from routes.power_supply_routes import power_supply_bp, poll_status as power_supply_poll_status, apply_recipe as power_supply_apply_recipe
+from routes.robot_arm_routes import robot_bp, poll_status as robot_poll_status
+from routes.device_poller_routes import device_poller_bp
+from routes.connect_log_routes import connect_log_bp
+from routes.history_routes import history_bp
+from routes.run_recorder_routes import run_recorder_bp
+from services.device_poller_services import DevicePollerService
+from services.connect_log_services import connection_log_writer
+from services.connect_log_maintenance_services import ConnectionLogMaintenanceService
+from services.recipe_apply_services import RecipeApplyService
+from services.historian_services import HistorianService
+from services.run_recorder_services import RunRecorderService
+from services.transmittance_watcher_services import TransmittanceWatcherService
+from async_loop import background_loop
+from sqlite_setup import engine_options, configure_sqlite, self_check, checkpoint
 import pandas as pd
 import matplotlib.pyplot as plt
 import io
@@ -25,6 +41,7 @@ import signal
 import json
 import tempfile
 import atexit
+import multiprocessing
 from flask_socketio import SocketIO
 import threading
 import logging
@@ -194,6 +211,7 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["JWT_SECRET_KEY"] = "supersecretjwt"
     app.config["JWT_VERIFY_SUB"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
     
     # 初始化擴展
     migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
@@ -202,11 +220,20 @@ def create_app():
     
     # 確保資料庫表格存在
     with app.app_context():
+        # WAL 與 PRAGMA 必須在第一條連線建立前設定
+        configure_sqlite(db.engine, app.config)
+        atexit.register(checkpoint, db.engine)
         if not os.path.exists(DB_PATH):
             db.create_all()
             logger.info("資料庫已建立！")
         else:
-            logger.info("資料庫已存在，跳過建立步驟")
+            # 只會建立新增的資料表 (例如 recipes)，既有的資料表不會變動
+            db.create_all()
+            # create_all 不會替既有的資料表加索引，連線日誌的查詢索引另外補建
+            for index in ConnectionLog.__table__.indexes:
+                index.create(db.engine, checkfirst=True)
+            logger.info("資料庫已存在，已補建缺少的資料表")
+        app.sqlite_settings = self_check(db.engine, app.config)
     
     # 註冊 Blueprints
     app.register_blueprint(alicat_bp, url_prefix='/api/alicat_api')
@@ -220,6 +247,96 @@ def create_app():
     app.register_blueprint(transmittance_bp, url_prefix='/api/transmittance_api')
     app.register_blueprint(power_supply_bp, url_prefix='/api/power_supply')
     app.register_blueprint(robot_bp, url_prefix='/api/robot_api')
+    app.register_blueprint(device_poller_bp, url_prefix='/api/poller')
+    app.register_blueprint(connect_log_bp, url_prefix='/api/connection_logs')
+    app.register_blueprint(history_bp, url_prefix='/api/history')
+    app.register_blueprint(run_recorder_bp, url_prefix='/api/runs')
+    
+    # 啟動常駐的背景 event loop，Azbil MFC 與脈衝電源的異步操作都在這裡執行
+    background_loop.start()
+    atexit.register(background_loop.stop)
+    
+    # 連線日誌改由背景執行緒批次寫入，連線路由不必等待資料庫 commit
+    connection_log_writer.start(
+        app,
+        flush_interval=app.config.get("CONNECTION_LOG_FLUSH_INTERVAL", 0.2),
+        batch_size=app.config.get("CONNECTION_LOG_BATCH_SIZE", 100)
+    )
+    atexit.register(connection_log_writer.stop)
+    
+    # 過期連線日誌的彙總、刪除與資料庫整理
+    connection_log_maintenance = ConnectionLogMaintenanceService(
+        app,
+        retention_days=app.config.get("CONNECTION_LOG_RETENTION_DAYS", 30),
+        interval=app.config.get("CONNECTION_LOG_MAINTENANCE_INTERVAL", 6 * 3600)
+    )
+    connection_log_maintenance.start()
+    atexit.register(connection_log_maintenance.stop)
+    app.connection_log_maintenance = connection_log_maintenance
+    
+    # 啟動設備輪詢排程器，統一讀取已連線設備並廣播狀態
+    device_poller = DevicePollerService(socketio, intervals=app.config.get("DEVICE_POLL_INTERVALS"))
+    device_poller.register('azbil', azbil_poll_status)
+    device_poller.register('alicat', alicat_poll_status)
+    device_poller.register('alicat_bus', alicat_bus_poll_status)
+    device_poller.register('co2laser', uc2000_poll_status)
+    device_poller.register('heater', heater_poll_status)
+    device_poller.register('powersupply', power_supply_poll_status)
+    device_poller.register('ultrasonic', ultrasonic_poll_status)
+    device_poller.register('robotarm', robot_poll_status)
+    
+    # 設備歷史資料記錄器，記錄排程器讀到的每一筆資料
+    historian = HistorianService(
+        app,
+        buffer_size=app.config.get("HISTORIAN_BUFFER_SIZE", 4096),
+        flush_interval=app.config.get("HISTORIAN_FLUSH_INTERVAL", 5.0),
+        heartbeat=app.config.get("HISTORIAN_HEARTBEAT", 60.0),
+        retention_days=app.config.get("HISTORIAN_RETENTION_DAYS", 7)
+    )
+    device_poller.add_listener(historian.record_poll)
+    historian.start()
+    atexit.register(historian.stop)
+    app.historian = historian
+    
+    device_poller.start()
+    # atexit 依註冊的相反順序執行: 排程器先停止，再斷開多站號 Alicat 的串口
+    atexit.register(alicat_bus.shutdown)
+    atexit.register(device_poller.stop)
+    app.device_poller = device_poller
+    
+    # 製程紀錄器，開始錄製後以共同時脈取樣所有設備，錄製中分段寫入磁碟，停止時合併成一個 Parquet 檔
+    run_recorder = RunRecorderService(
+        app,
+        device_poller,
+        output_dir=app.config.get("RUN_RECORDER_DIR"),
+        interval=app.config.get("RUN_RECORDER_INTERVAL", 1.0),
+        chunk_seconds=app.config.get("RUN_RECORDER_CHUNK_SECONDS", 60.0)
+    )
+    with app.app_context():
+        interrupted = run_recorder.mark_interrupted()
+        if interrupted:
+            logger.warning(f"{interrupted} 個製程在上次伺服器異常結束時未完成錄製")
+    atexit.register(run_recorder.stop_if_recording)
+    app.run_recorder = run_recorder
+    
+    # 配方套用引擎，各設備的設定值同時送出
+    recipe_applier = RecipeApplyService()
+    recipe_applier.register('azbil', azbil_apply_recipe)
+    recipe_applier.register('alicat', alicat_apply_recipe)
+    recipe_applier.register('co2laser', uc2000_apply_recipe)
+    recipe_applier.register('heater', heater_apply_recipe)
+    recipe_applier.register('powersupply', power_supply_apply_recipe)
+    atexit.register(recipe_applier.shutdown)
+    app.recipe_applier = recipe_applier
+    
+    # 光譜資料夾監看服務，登記資料夾後才會啟動背景執行緒
+    transmittance_watcher = TransmittanceWatcherService(
+        socketio,
+        interval=app.config.get("TRANSMITTANCE_WATCH_INTERVAL", 1.0),
+        settle_seconds=app.config.get("TRANSMITTANCE_WATCH_SETTLE", 0.5)
+    )
+    atexit.register(transmittance_watcher.stop)
+    app.transmittance_watcher = transmittance_watcher
     
     # =================================================================
     # 主機切換和 IP 白名單相關路由
@@ -522,6 +639,13 @@ def create_app():
         """關閉伺服器"""
         logger.info("收到關閉請求，Flask 伺服器即將關閉...")
         cleanup_pid_file()  # 先清理 PID 文件
+        app.run_recorder.stop_if_recording()
+        app.device_poller.stop()
+        alicat_bus.shutdown()  # os._exit 不會執行 atexit，先斷開多站號 Alicat 的串口
+        connection_log_writer.stop()  # 同上，先寫入佇列中的連線日誌
+        app.historian.stop()
+        with app.app_context():
+            checkpoint(db.engine)
         os._exit(0)  # 強制終止
         return jsonify({"message": "伺服器正在關閉..."})
 
@@ -535,6 +659,20 @@ def create_app():
         """健康檢查"""
         return jsonify({"status": "ok"}), 200
     
+    @app.route('/api/database/status')
+    def database_status():
+        """取得 SQLite 實際生效的設定與連線池狀態"""
+        wal_path = f"{DB_PATH}-wal"
+        return jsonify({
+            "status": "success",
+            "data": {
+                "settings": app.sqlite_settings,
+                "pool": db.engine.pool.status(),
+                "db_size": os.path.getsize(DB_PATH) if os.path.exists(DB_PATH) else None,
+                "wal_size": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+            }
+        }), 200
+    
     @app.route('/api/client_info')
     def client_info():
         """獲取客戶端訪問信息"""
@@ -586,6 +724,9 @@ if hasattr(signal, 'SIGABRT'):
     signal.signal(signal.SIGABRT, handle_shutdown)
 
 if __name__ == '__main__':
+    # 打包後的執行檔需要這行，透射率批次計算的進程池才能正常啟動子進程
+    multiprocessing.freeze_support()
+
     # 創建應用程式實例
     app, socketio = create_app()
     
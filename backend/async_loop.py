@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+
+class BackgroundEventLoop:
+    """
+    常駐的背景 asyncio event loop
+    Azbil MFC 與脈衝電源的協程都在這個 loop 上執行，
+    同步的 Flask view 透過 submit/run 取得結果，不用每個請求都建立新的 loop 與執行緒
+    """
+
+    def __init__(self, name: str = "background-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive() and self._loop and self._loop.is_running())
+
+    def start(self):
+        """啟動背景 loop (重複呼叫不會建立第二個)"""
+        with self._lock:
+            if self.is_running():
+                return
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(self._ready.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """以執行緒安全的方式把協程排入背景 loop，回傳 concurrent.futures.Future"""
+        if not self.is_running():
+            self.start()
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("不可在背景 loop 內同步等待協程，請直接 await")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """同步執行協程並等待結果"""
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self, timeout: float = 5.0):
+        """停止背景 loop"""
+        with self._lock:
+            if not self._loop or not self._thread:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+
+background_loop = BackgroundEventLoop()
@@ -0,0 +1,122 @@
+# benchmark_protocol_codec.py
+# 比較 protocol_codec 與原本逐位元 CRC / 逐位元組組幀寫法的單幀編解碼耗時
+# 執行: python benchmark_protocol_codec.py
+import struct
+import timeit
+
+from protocol_codec import ModbusRtuCodec, SpikCodec
+
+
+# ------------------------------------------------------------
+# 原本的寫法 (AzbilMFC.calculate_crc / SpikService._spik_writing)
+# ------------------------------------------------------------
+def legacy_crc16(data: bytes) -> int:
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def legacy_modbus_read_request(device_id: int, address: int, count: int) -> bytes:
+    request = bytearray([device_id, 0x03])
+    request += struct.pack(">H", address)
+    request += struct.pack(">H", count)
+    request += struct.pack('<H', legacy_crc16(request))
+    return bytes(request)
+
+
+def legacy_modbus_decode(response: bytes, count: int):
+    received_crc = struct.unpack('<H', response[-2:])[0]
+    if received_crc != legacy_crc16(response[:-2]):
+        return None
+    return tuple(
+        struct.unpack('>H', response[3 + 2 * i:5 + 2 * i])[0] for i in range(count)
+    )
+
+
+def legacy_spik_write(data) -> bytes:
+    outbyte2 = bytearray(21)  # 設定時脈
+    outbyte2[5] = 4
+    outbyte2[7] = 4
+    outbyte2[10] = (data[1] >> 8) & 0xFF
+    outbyte2[11] = data[1] & 0xFF
+    outbyte2[12] = (data[2] >> 8) & 0xFF
+    outbyte2[13] = data[2] & 0xFF
+    outbyte2[14] = (data[3] >> 8) & 0xFF
+    outbyte2[15] = data[3] & 0xFF
+    outbyte2[16] = (data[4] >> 8) & 0xFF
+    outbyte2[17] = data[4] & 0xFF
+    outbyte2[0:5] = bytes([0, 0, 65, 68, 0])
+    outbyte2[6] = 0
+    outbyte2[8:10] = bytes([0xFF, 0xFF])
+    outbyte2[-3] = 16  # DLE
+    outbyte2[-2] = 3   # ETX
+    bcc = 0
+    for b in outbyte2[:-1]:
+        bcc ^= b
+    outbyte2[-1] = bcc
+    return bytes(outbyte2)
+
+
+def legacy_spik_read(spik_address: int) -> bytes:
+    outbyte2 = bytearray(13)
+    outbyte2[0:6] = bytes([0, 0, 0x45, 0x44, 0, spik_address & 0xFF])
+    outbyte2[6:10] = bytes([0, 1, 0xFF, 0xFF])
+    outbyte2[10:12] = bytes([16, 3])
+    bcc = 0
+    for i in range(12):
+        bcc ^= outbyte2[i]
+    outbyte2[12] = bcc
+    return bytes(outbyte2)
+
+
+def _modbus_response(device_id: int, values) -> bytes:
+    body = bytes([device_id, 0x03, 2 * len(values)]) + struct.pack(f">{len(values)}H", *values)
+    return body + struct.pack('<H', legacy_crc16(body))
+
+
+def bench(label: str, legacy, current, number: int):
+    legacy_time = min(timeit.repeat(legacy, number=number, repeat=5)) / number * 1e6
+    current_time = min(timeit.repeat(current, number=number, repeat=5)) / number * 1e6
+    print(f"{label:<32} 原本 {legacy_time:8.2f} µs   codec {current_time:8.2f} µs   x{legacy_time / current_time:5.1f}")
+
+
+def main(number: int = 20000):
+    modbus = ModbusRtuCodec(1)
+    spik = SpikCodec()
+    clock = [2, 1000, 2000, 3000, 4000]
+    single = _modbus_response(1, (1234,))
+    block = _modbus_response(1, tuple(range(52)))
+
+    # 先確認輸出完全一致
+    assert modbus.encode_read(0x07D1, 52) == legacy_modbus_read_request(1, 0x07D1, 52)
+    assert ModbusRtuCodec.decode_registers(block, 52) == legacy_modbus_decode(block, 52)
+    assert ModbusRtuCodec.check_crc(block)
+    assert spik.encode_write(clock) == legacy_spik_write(clock)
+    assert spik.encode_read(3) == legacy_spik_read(3)
+
+    print(f"每幀平均耗時 (number={number})")
+    bench("Modbus 0x03 請求編碼",
+          lambda: legacy_modbus_read_request(1, 0x04B4, 6),
+          lambda: modbus.encode_read(0x04B4, 6), number)
+    bench("Modbus 單寄存器回應解碼",
+          lambda: legacy_modbus_decode(single, 1),
+          lambda: ModbusRtuCodec.check_crc(single) and ModbusRtuCodec.decode_registers(single, 1), number)
+    bench("Modbus 52 寄存器回應解碼",
+          lambda: legacy_modbus_decode(block, 52),
+          lambda: ModbusRtuCodec.check_crc(block) and ModbusRtuCodec.decode_registers(block, 52), number // 10)
+    bench("SPIK 設定時脈幀編碼",
+          lambda: legacy_spik_write(clock),
+          lambda: spik.encode_write(clock), number)
+    bench("SPIK 讀取幀編碼",
+          lambda: legacy_spik_read(3),
+          lambda: spik.encode_read(3), number)
+
+
+if __name__ == "__main__":
+    main()
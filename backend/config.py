@@ -20,5 +20,56 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(basedir, 'database.db')}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite 連線設定 (WAL 模式)，見 sqlite_setup.py
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+    SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "20"))
+    SQLITE_POOL_TIMEOUT = float(os.getenv("SQLITE_POOL_TIMEOUT", "30"))
+
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=12)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+
+    # 已解析光譜的記憶體快取上限 (MB)；設定 SPECTRUM_CACHE_DIR 時被淘汰的光譜會存成 .npy
+    SPECTRUM_CACHE_MAX_MB = int(os.getenv("SPECTRUM_CACHE_MAX_MB", "256"))
+    SPECTRUM_CACHE_DIR = os.getenv("SPECTRUM_CACHE_DIR") or None
+    # 光譜封存檔 (.npy) 的存放位置，封存後重新分析不需要再讀 txt
+    SPECTRUM_ARCHIVE_DIR = os.getenv("SPECTRUM_ARCHIVE_DIR") or os.path.join(basedir, "spectrum_archive")
+
+    # 光譜資料夾監看的掃描週期 (秒)，mtime 未超過 SETTLE 秒的檔案視為仍在寫入
+    TRANSMITTANCE_WATCH_INTERVAL = float(os.getenv("TRANSMITTANCE_WATCH_INTERVAL", "1.0"))
+    TRANSMITTANCE_WATCH_SETTLE = float(os.getenv("TRANSMITTANCE_WATCH_SETTLE", "0.5"))
+
+    # 連線日誌批次寫入: 每 FLUSH_INTERVAL 秒或累積 BATCH_SIZE 筆寫入一次
+    CONNECTION_LOG_FLUSH_INTERVAL = float(os.getenv("CONNECTION_LOG_FLUSH_INTERVAL", "0.2"))
+    CONNECTION_LOG_BATCH_SIZE = int(os.getenv("CONNECTION_LOG_BATCH_SIZE", "100"))
+
+    # 超過保存天數的連線日誌彙總成每日統計後刪除 (0 表示全部保留)，維護排程週期 (秒)
+    CONNECTION_LOG_RETENTION_DAYS = int(os.getenv("CONNECTION_LOG_RETENTION_DAYS", "30"))
+    CONNECTION_LOG_MAINTENANCE_INTERVAL = float(os.getenv("CONNECTION_LOG_MAINTENANCE_INTERVAL", str(6 * 3600)))
+
+    # 設備歷史資料: 每個通道在記憶體保留的點數、寫入資料庫的週期 (秒)、
+    # 值不變時最少多久寫一次 (秒)、資料庫保存天數、查詢預設的最大點數
+    HISTORIAN_BUFFER_SIZE = int(os.getenv("HISTORIAN_BUFFER_SIZE", "4096"))
+    HISTORIAN_FLUSH_INTERVAL = float(os.getenv("HISTORIAN_FLUSH_INTERVAL", "5.0"))
+    HISTORIAN_HEARTBEAT = float(os.getenv("HISTORIAN_HEARTBEAT", "60.0"))
+    HISTORIAN_RETENTION_DAYS = float(os.getenv("HISTORIAN_RETENTION_DAYS", "7"))
+    HISTORIAN_MAX_POINTS = int(os.getenv("HISTORIAN_MAX_POINTS", "2000"))
+
+    # 製程紀錄檔 (Parquet) 的存放位置與預設取樣間隔 (秒)
+    RUN_RECORDER_DIR = os.getenv("RUN_RECORDER_DIR") or os.path.join(basedir, "runs")
+    RUN_RECORDER_INTERVAL = float(os.getenv("RUN_RECORDER_INTERVAL", "1.0"))
+    # 錄製中每隔幾秒把樣本寫成一個分段檔，伺服器異常結束時最多遺失這段時間的資料
+    RUN_RECORDER_CHUNK_SECONDS = float(os.getenv("RUN_RECORDER_CHUNK_SECONDS", "60"))
+
+    # 設備輪詢排程器週期 (秒)，由後端統一讀取並透過 Socket 廣播
+    DEVICE_POLL_INTERVALS = {
+        "azbil": 3.0,
+        "alicat": 3.0,
+        "alicat_bus": 3.0,
+        "co2laser": 3.0,
+        "heater": 3.0,
+        "powersupply": 3.0,
+        "ultrasonic": 5.0,
+        "robotarm": 3.0
+    }
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降採樣，回傳保留點的索引 (遞增)
+    第一點與最後一點一定保留，中間每個桶選出與前一個選點、下一桶平均點面積最大的點，
+    保留曲線的峰谷形狀；點數不超過 threshold 或 threshold < 3 時回傳全部索引
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # 中間 n - 2 個點分成 threshold - 2 個桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        px, py = x[previous], y[previous]
+        areas = np.abs((px - avg_x) * (y[start:end] - py) - (px - x[start:end]) * (avg_y - py))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample_series(values, max_points: int = 0):
+    """
+    以索引為 x 軸對一條序列降採樣，回傳 (索引, 數值)
+    非數值 (None / NaN) 的點先排除；max_points 為 0 時不降採樣
+    """
+    y = np.array([np.nan if value is None else value for value in values], dtype=float)
+    index = np.flatnonzero(np.isfinite(y))
+    y = y[index]
+    if max_points and len(index) > max_points:
+        keep = lttb_indices(index.astype(float), y, int(max_points))
+        index, y = index[keep], y[keep]
+    return index, y
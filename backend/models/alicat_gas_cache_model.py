@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Optional
+from config import basedir
+
+GAS_CACHE_FILE = os.path.join(basedir, "alicat_gas_cache.json")
+
+
+class AlicatGasCache:
+    """
+    Alicat 混合氣體表快取
+    以 port / 站號 / 序號 為鍵保存掃描 236~255 得到的混合氣體名稱，寫入 JSON 檔，重新啟動後仍可使用；
+    建立或刪除混合氣體後需呼叫 invalidate 讓下次重新掃描
+    """
+
+    def __init__(self, path: str = GAS_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @staticmethod
+    def make_key(port: str, address: str, serial_number: Optional[str]) -> str:
+        return f"{port}|{address}|{serial_number or 'unknown'}"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._entries = json.load(f)
+                except Exception as e:
+                    print(f"載入氣體表快取失敗，將重新掃描: {e}")
+        return self._entries
+
+    def _save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"保存氣體表快取失敗: {e}")
+
+    def get(self, key: str) -> Optional[Dict[int, Dict[str, str]]]:
+        """取得快取的混合氣體表 {mix_no: {'name': ...}}，沒有快取回傳 None"""
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return None
+            return {int(mix_no): dict(info) for mix_no, info in entry["custom_mixtures"].items()}
+
+    def put(self, key: str, custom_mixtures: Dict[int, Dict[str, str]]):
+        with self._lock:
+            self._load()[key] = {
+                "custom_mixtures": {str(mix_no): info for mix_no, info in custom_mixtures.items()},
+                "updated_at": time.time()
+            }
+            self._save()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._save()
+
+
+gas_cache = AlicatGasCache()
@@ -1,17 +1,106 @@
+import re
 import threading
 import serial
+from collections import deque
+from contextlib import contextmanager
 from serial.serialutil import SerialException
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from alicat import FlowController
+from serial_transport import SerialTransportService, PRIORITY_READ, PRIORITY_WRITE
+from models.alicat_gas_cache_model import gas_cache
 import time
 
+class AlicatBus:
+    """
+    RS-485 多站號匯流排
+    同一個串口上的多台 Alicat (站號 A~Z) 共用一個開啟的串口與串口工作執行緒，
+    最後一個站號斷線時才關閉串口
+    """
+
+    _buses: Dict[str, "AlicatBus"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, port: str, baudrate: int = 19200, timeout: float = 1):
+        self.port = port
+        self.ser = serial.Serial(port, baudrate=baudrate, timeout=timeout)
+        self.worker = SerialTransportService.open_worker(port)
+        self.units = set()
+        self.streaming = False  # 串流模式會佔滿匯流排，只允許單一站號使用
+
+    @classmethod
+    def acquire(cls, port: str, address: str) -> "AlicatBus":
+        """取得 (或開啟) 串口上的匯流排並登記站號"""
+        with cls._registry_lock:
+            bus = cls._buses.get(port)
+            if bus is None or not bus.ser.is_open:
+                bus = cls(port)
+                cls._buses[port] = bus
+            if address in bus.units:
+                raise Exception(f"{port} 上的站號 {address} 已連接")
+            if bus.streaming:
+                raise Exception(f"{port} 正在串流模式，無法加入其他站號")
+            bus.units.add(address)
+            return bus
+
+    @classmethod
+    def release(cls, port: str, address: str):
+        """移除站號，匯流排上沒有站號時關閉串口"""
+        with cls._registry_lock:
+            bus = cls._buses.get(port)
+            if bus is None:
+                return
+            bus.units.discard(address)
+            if bus.units:
+                return
+            del cls._buses[port]
+        bus.close()
+
+    def close(self):
+        SerialTransportService.close_worker(self.port)
+        if self.ser.is_open:
+            self.ser.close()
+
 class FlowControllerModel:
+    # 標準氣體，索引即為氣體編號
+    STANDARD_GASES = [
+        'Air', 'Ar', 'CH4', 'CO', 'CO2', 'C2H6', 'H2', 'He',
+        'N2', 'N2O', 'Ne', 'O2', 'C3H8', 'nC4H10', 'C2H2',
+        'C2H4', 'iC4H10', 'Kr', 'Xe', 'SF6', 'C-25', 'C-10',
+        'C-8', 'C-2', 'C-75', 'He-25', 'He-75', 'A1025',
+        'Star29', 'P-5'
+    ]
+
+    # 自訂混合氣體編號範圍
+    MIX_NUMBERS = range(236, 256)
+
+    # 串流模式的環形緩衝區大小 (筆)
+    STREAM_BUFFER_SIZE = 3000
+    # 未指定 interval_ms 時假設的數據幀間隔 (秒，設備出廠值為 50 ms)
+    DEFAULT_STREAM_INTERVAL = 0.05
+    # 最新數據幀超過幾個幀間隔 (且至少 STREAM_STALE_MIN 秒) 沒有更新就視為過期，不再直接回傳
+    STREAM_STALE_FRAMES = 5
+    STREAM_STALE_MIN = 0.5
+
     def __init__(self, port: str, address: str):
         self.port = port
         self.address = address
         self.ser: Optional[serial.Serial] = None
         self.timeout = 1
-        self.lock = threading.RLock()  # 使用可重入鎖
+        self.lock = threading.RLock()  # 多步驟操作 (切換氣體、建立混合氣) 使用
+        self.worker = None  # 串口工作執行緒，所有讀寫都經由它排隊執行
+        self.bus: Optional[AlicatBus] = None  # 與同一串口上的其他站號共用
+        self.serial_number: Optional[str] = None  # 氣體表快取的鍵值之一，第一次使用時讀取
+
+        # 串流模式：設備持續送出數據幀，由背景執行緒解析後放入環形緩衝區
+        self.streaming = False
+        self.samples: deque = deque(maxlen=self.STREAM_BUFFER_SIZE)
+        self._stream_thread: Optional[threading.Thread] = None
+        self._stream_stop = threading.Event()
+        self.stream_interval = self.DEFAULT_STREAM_INTERVAL
+        self._stream_interval_ms: Optional[int] = None  # 使用者指定的數據幀間隔，暫停串流後以同樣的間隔恢復
+        self.stream_error: Optional[str] = None  # 讀取執行緒異常結束的原因，重新開始串流時清除
+        self._frame_condition = threading.Condition()
+        self._latest_frame: Optional[bytes] = None
 
     def check_device_connection(self) -> bool:
         """檢查設備連接狀態"""
@@ -48,25 +137,67 @@ class FlowControllerModel:
             return False
 
     def _parse_response(self, response: bytes) -> Dict[str, Any]:
-        """解析設備回應"""
+        """解析設備回應 (串流模式的數據幀可能不含站號)"""
         try:
             parts = response.decode('ascii').strip().split()
-            if len(parts) >= 6:
+            if parts and parts[0][0] not in "+-.0123456789":
+                parts = parts[1:]  # 去掉站號
+            if len(parts) >= 5:
                 return {
-                    "pressure": float(parts[1]),
-                    "temperature": float(parts[2]),
-                    "volumetric_flow": float(parts[3]),
-                    "mass_flow": float(parts[4]),
-                    "setpoint": float(parts[5]),
-                    "gas": parts[-1] if len(parts) > 6 else "Unknown"
+                    "pressure": float(parts[0]),
+                    "temperature": float(parts[1]),
+                    "volumetric_flow": float(parts[2]),
+                    "mass_flow": float(parts[3]),
+                    "setpoint": float(parts[4]),
+                    "gas": parts[-1] if len(parts) > 5 else "Unknown"
                 }
             return {}
         except Exception as e:
             print(f"解析回應失敗: {e}")
             return {}
 
-    def _send_command(self, command: str) -> Optional[bytes]:
-        """發送命令到設備並讀取回應"""
+    def _send_command(self, command: str, priority: int = PRIORITY_READ) -> Optional[bytes]:
+        """發送命令到設備並讀取回應 (經由串口工作執行緒排隊)"""
+        if not self.ser or not self.worker:
+            return None
+
+        if self.streaming:
+            return self._send_streaming_command(command, priority)
+
+        try:
+            return self.worker.call(self._transact, command, priority=priority, timeout=self.timeout * 5)
+        except Exception as e:
+            print(f"發送命令失敗: {e}")
+            return None
+
+    def _send_streaming_command(self, command: str, priority: int) -> Optional[bytes]:
+        """
+        串流模式下設備站號為 @，回應混在數據流中；
+        只寫入命令，再等待下一個數據幀作為回應
+        """
+        if command.startswith(self.address):
+            command = "@" + command[len(self.address):]
+
+        with self._frame_condition:
+            previous = self._latest_frame
+        try:
+            self.worker.call(self._write_only, command, priority=priority, timeout=self.timeout * 5)
+        except Exception as e:
+            print(f"發送命令失敗: {e}")
+            return None
+
+        with self._frame_condition:
+            self._frame_condition.wait_for(lambda: self._latest_frame is not previous, timeout=self.timeout)
+            return self._latest_frame
+
+    def _write_only(self, command: str):
+        """在串口工作執行緒上只寫入命令 (回應由串流讀取執行緒處理)"""
+        if not command.endswith('\r'):
+            command = f"{command}\r"
+        self.ser.write(command.encode('ascii'))
+
+    def _transact(self, command: str) -> Optional[bytes]:
+        """在串口工作執行緒上執行一次寫入與讀取"""
         if not self.ser:
             return None
             
@@ -92,15 +223,202 @@ class FlowControllerModel:
             print(f"發送命令失敗: {e}")
             return None
 
+    def _transact_lines(self, command: str, max_lines: int = 16) -> list:
+        """在串口工作執行緒上發送命令並讀取多行回應 (例如 ??M* 製造資訊)"""
+        if not self.ser:
+            return []
+
+        original_timeout = self.ser.timeout
+        try:
+            self.ser.reset_input_buffer()
+            self.ser.write(f"{command}\r".encode('ascii'))
+            lines = [self.ser.read_until(b'\r')]
+            # 第一行之後縮短等待時間，沒有新資料即視為結束
+            self.ser.timeout = 0.2
+            while lines[-1] and len(lines) < max_lines:
+                lines.append(self.ser.read_until(b'\r'))
+            return [line.decode('ascii', errors='ignore').strip() for line in lines if line]
+        except Exception as e:
+            print(f"讀取多行回應失敗: {e}")
+            return []
+        finally:
+            self.ser.timeout = original_timeout
+
+    def read_serial_number(self) -> Optional[str]:
+        """讀取設備序號 (??M*)，讀不到時回傳 None"""
+        if self.serial_number is None and self.worker:
+            try:
+                lines = self.worker.call(self._transact_lines, f"{self.address}??M*",
+                                         priority=PRIORITY_READ, timeout=self.timeout * 5)
+            except Exception as e:
+                print(f"讀取序號失敗: {e}")
+                return None
+            for line in lines:
+                match = re.search(r"Serial\s*(?:Number|No\.?)\s*:?\s*(\S+)", line, re.IGNORECASE)
+                if match:
+                    self.serial_number = match.group(1)
+                    break
+        return self.serial_number
+
+    def _gas_cache_key(self) -> str:
+        return gas_cache.make_key(self.port, self.address, self.read_serial_number())
+
+    def _scan_mixtures(self) -> Dict[int, Dict[str, str]]:
+        """
+        逐一切換 236~255 讀取混合氣體名稱 (約 40 次串口交易)
+        掃描完切換回原本的氣體，結果寫入快取
+        """
+        current_response = self._send_command(self.address)
+        current_gas = self._parse_response(current_response).get('gas') if current_response else None
+
+        custom_mixtures = {}
+        for mix_no in self.MIX_NUMBERS:
+            try:
+                # 嘗試切換到每個可能的混合氣體編號
+                response = self._send_command(f"{self.address}G{mix_no}")
+                if response:
+                    # 再次讀取狀態來獲取氣體名稱
+                    status_response = self._send_command(self.address)
+                    if status_response:
+                        status = self._parse_response(status_response)
+                        if status and 'gas' in status:
+                            custom_mixtures[mix_no] = {
+                                'name': status['gas']
+                            }
+            except Exception as e:
+                print(f"檢查混合氣體 {mix_no} 時發生錯誤: {e}")
+
+        # 切換回掃描前的氣體
+        restore_number = self._resolve_gas_number(current_gas, custom_mixtures) if current_gas else None
+        if restore_number is not None:
+            self._send_command(f"{self.address}G{restore_number}", priority=PRIORITY_WRITE)
+
+        gas_cache.put(self._gas_cache_key(), custom_mixtures)
+        return custom_mixtures
+
+    def get_custom_mixtures(self, refresh: bool = False) -> Dict[int, Dict[str, str]]:
+        """取得混合氣體表，優先使用快取，沒有快取或指定 refresh 才掃描設備"""
+        with self.lock:
+            if not refresh:
+                cached = gas_cache.get(self._gas_cache_key())
+                if cached is not None:
+                    return cached
+            return self._scan_mixtures()
+
+    def _resolve_gas_number(self, gas, custom_mixtures: Dict[int, Dict[str, str]]) -> Optional[int]:
+        """將氣體名稱 (或編號) 轉換為氣體編號"""
+        if isinstance(gas, int):
+            return gas if gas < len(self.STANDARD_GASES) or gas in custom_mixtures else None
+        if gas in self.STANDARD_GASES:
+            return self.STANDARD_GASES.index(gas)
+        return next((mix_no for mix_no, info in custom_mixtures.items() if info["name"] == gas), None)
+
+    def start_streaming(self, interval_ms: Optional[int] = None):
+        """
+        開始串流模式
+        interval_ms 為設備送出數據幀的間隔 (NCS 指令，舊韌體可能不支援，失敗時沿用設備設定)
+        """
+        with self.lock:
+            if not self.ser or not self.worker:
+                raise Exception("設備未連接")
+            if self.streaming:
+                return
+            if self.bus and len(self.bus.units) > 1:
+                raise Exception(f"{self.port} 上有多個站號，無法使用串流模式")
+
+            if interval_ms:
+                self._send_command(f"{self.address}NCS {int(interval_ms)}", priority=PRIORITY_WRITE)
+
+            self.worker.call(self._write_only, f"{self.address}@=@", priority=PRIORITY_WRITE)
+            self._stream_interval_ms = int(interval_ms) if interval_ms else None
+            self.stream_interval = self._stream_interval_ms / 1000 if interval_ms else self.DEFAULT_STREAM_INTERVAL
+            self.stream_error = None
+            self.samples.clear()
+            self._stream_stop.clear()
+            self.streaming = True
+            if self.bus:
+                self.bus.streaming = True
+            self._stream_thread = threading.Thread(target=self._stream_loop, name=f"alicat-stream-{self.port}", daemon=True)
+            self._stream_thread.start()
+            print(f"Alicat {self.port} 開始串流")
+
+    def stop_streaming(self):
+        """停止串流模式，設備站號改回原本的站號"""
+        with self.lock:
+            if not self.streaming:
+                return
+            try:
+                if self.ser and self.worker:
+                    self.worker.call(self._write_only, f"@@={self.address}", priority=PRIORITY_WRITE)
+            finally:
+                self._stream_stop.set()
+                if self._stream_thread:
+                    self._stream_thread.join(timeout=self.timeout * 2)
+                    self._stream_thread = None
+                self.streaming = False
+                if self.bus:
+                    self.bus.streaming = False
+                if self.ser:
+                    self.ser.reset_input_buffer()
+                print(f"Alicat {self.port} 停止串流")
+
+    @contextmanager
+    def _polling_mode(self):
+        """多步驟的請求 / 回應操作需要暫停串流，完成後恢復"""
+        was_streaming = self.streaming
+        if was_streaming:
+            self.stop_streaming()
+        try:
+            yield
+        finally:
+            if was_streaming and self.ser:
+                self.start_streaming(self._stream_interval_ms)
+
+    def _stream_loop(self):
+        """背景讀取串流數據幀並放入環形緩衝區"""
+        while not self._stream_stop.is_set():
+            try:
+                line = self.ser.read_until(b'\r')
+            except Exception as e:
+                # streaming 維持 True，stop_streaming 仍會把站號改回來；read_status 看到 stream_error 會拋出例外
+                print(f"串流讀取失敗: {e}")
+                self.stream_error = str(e)
+                break
+            if not line:
+                continue
+
+            status = self._parse_response(line)
+            if not status:
+                continue
+            status["timestamp"] = time.time()
+            with self._frame_condition:
+                self.samples.append(status)
+                self._latest_frame = line
+                self._frame_condition.notify_all()
+
+    def stream_stale_after(self) -> float:
+        """串流數據幀的有效時間 (秒)"""
+        return max(self.stream_interval * self.STREAM_STALE_FRAMES, self.STREAM_STALE_MIN)
+
+    def get_latest_sample(self) -> Optional[Dict[str, Any]]:
+        """取得串流的最新一筆資料"""
+        with self._frame_condition:
+            return dict(self.samples[-1]) if self.samples else None
+
+    def get_samples(self, count: int) -> List[Dict[str, Any]]:
+        """取得串流最近 count 筆資料 (舊到新)"""
+        with self._frame_condition:
+            count = max(0, min(int(count), len(self.samples)))
+            return [dict(sample) for sample in list(self.samples)[len(self.samples) - count:]]
+
     def connect(self) -> Dict[str, Any]:
         """建立與流量控制器的連線"""          
         with self.lock:
             try:
-                self.ser = serial.Serial(
-                    self.port,
-                    baudrate=19200,
-                    timeout=self.timeout
-                )
+                # 同一串口上的多個站號共用串口與工作執行緒
+                self.bus = AlicatBus.acquire(self.port, self.address)
+                self.ser = self.bus.ser
+                self.worker = self.bus.worker
                 
                 time.sleep(1)
                 
@@ -118,98 +436,100 @@ class FlowControllerModel:
                 raise Exception("無法獲取設備狀態")
                 
             except Exception as e:
-                if self.ser:
-                    self.ser.close()
-                    self.ser = None
+                self._close()
                 raise Exception(f"連接設備時發生錯誤: {e}")
 
+    def _close(self):
+        """離開匯流排，最後一個站號離開時才停止工作執行緒並關閉串口"""
+        if self.bus:
+            self.bus = None
+            AlicatBus.release(self.port, self.address)
+        self.worker = None
+        self.ser = None
+
     def disconnect(self):
         """關閉與流量控制器的連線"""
         with self.lock:
-            if self.ser:
-                try:
-                    self.ser.close()
-                finally:
-                    self.ser = None
+            try:
+                self.stop_streaming()
+            finally:
+                self._close()
 
     def read_status(self) -> Dict[str, Any]:
         """讀取設備狀態"""
-        with self.lock:
-            if not self.ser:
-                raise Exception("設備未連接")
+        if not self.ser:
+            raise Exception("設備未連接")
+
+        # 串流模式直接回傳最新的數據幀，不需要串口往返；數據幀過期時等待下一幀
+        if self.streaming:
+            if self.stream_error:
+                raise Exception(f"串流讀取已中斷: {self.stream_error}")
+            sample = self.get_latest_sample()
+            if sample and time.time() - sample["timestamp"] <= self.stream_stale_after():
+                return sample
+
+        response = self._send_command(self.address)
+        if response:
+            status = self._parse_response(response)
+            if status:
+                return status
                 
-            response = self._send_command(self.address)
-            if response:
-                status = self._parse_response(response)
-                if status:
-                    return status
-                    
+        raise Exception("無法讀取設備狀態")
+
+    def submit_status_read(self):
+        """排入一次狀態讀取並立即回傳 Future，供同一匯流排上的多個站號批次輪詢"""
+        if not self.ser or not self.worker:
+            raise Exception("設備未連接")
+        return self.worker.submit(self._transact, self.address, priority=PRIORITY_READ, timeout=self.timeout * 5)
+
+    def parse_status(self, response: Optional[bytes]) -> Dict[str, Any]:
+        """解析狀態回應，失敗時拋出例外 (匯流排上其他站號的回應視為失敗)"""
+        if response and response.decode('ascii', errors='ignore').split()[:1] != [self.address]:
+            raise Exception(f"收到非站號 {self.address} 的回應: {response}")
+        status = self._parse_response(response) if response else {}
+        if not status:
             raise Exception("無法讀取設備狀態")
+        return status
 
     def set_gas(self, gas: str):
-        with self.lock:
+        with self.lock, self._polling_mode():
             try:
                 print(f"🔄 嘗試切換氣體至: {gas}")
 
-                # **1. 取得氣體列表 (已掃描過的氣體)**
-                all_standard_gases = {
-                    0: {'name': 'Air'}, 1: {'name': 'Ar'}, 2: {'name': 'CH4'}, 3: {'name': 'CO'},
-                    4: {'name': 'CO2'}, 5: {'name': 'C2H6'}, 6: {'name': 'H2'}, 7: {'name': 'He'},
-                    8: {'name': 'N2'}, 9: {'name': 'N2O'}, 10: {'name': 'Ne'}, 11: {'name': 'O2'},
-                    12: {'name': 'C3H8'}, 13: {'name': 'nC4H10'}, 14: {'name': 'C2H2'}, 
-                    15: {'name': 'C2H4'}, 16: {'name': 'iC4H10'}, 17: {'name': 'Kr'}, 
-                    18: {'name': 'Xe'}, 19: {'name': 'SF6'}, 20: {'name': 'C-25'}, 21: {'name': 'C-10'}, 
-                    22: {'name': 'C-8'}, 23: {'name': 'C-2'}, 24: {'name': 'C-75'}, 25: {'name': 'He-25'}, 
-                    26: {'name': 'He-75'}, 27: {'name': 'A1025'}, 28: {'name': 'Star29'}, 29: {'name': 'P-5'}
-                }
-
-                custom_mixtures = {}
-                for mix_no in range(236, 256):
-                    try:
-                        # 嘗試切換到每個可能的混合氣體編號
-                        response = self._send_command(f"{self.address}G{mix_no}")
-                        if response:
-                            # 再次讀取狀態來獲取氣體名稱
-                            status_response = self._send_command(self.address)
-                            if status_response:
-                                status = self._parse_response(status_response)
-                                if status and 'gas' in status:
-                                    custom_mixtures[mix_no] = {
-                                        'name': status['gas']
-                                    }
-                    except Exception as e:
-                        print(f"檢查混合氣體 {mix_no} 時發生錯誤: {e}")
-
-                all_standard_gases.update(custom_mixtures)
-
-                print('mix', custom_mixtures)
-                print('all_standard_gases', all_standard_gases)
-
-                # **2. 確保 `gas` 存在於 `custom_mixtures`**
-                gas_number = next((k for k, v in all_standard_gases.items() if v["name"] == gas), None)
+                # **1. 由快取的氣體表取得氣體編號，不需要逐一掃描設備**
+                custom_mixtures = self.get_custom_mixtures()
+                gas_number = self._resolve_gas_number(gas, custom_mixtures)
+                if gas_number is None:
+                    # 可能是其他程式新增的混合氣，重新掃描一次
+                    custom_mixtures = self.get_custom_mixtures(refresh=True)
+                    gas_number = self._resolve_gas_number(gas, custom_mixtures)
                 if gas_number is None:
                     raise ValueError(f"不支援的氣體類型: {gas}")
 
-                print(f"氣體 {gas} 的對應編號為: {gas_number}")
+                gas_name = gas
+                if isinstance(gas, int):
+                    gas_name = self.STANDARD_GASES[gas] if gas < len(self.STANDARD_GASES) else custom_mixtures[gas]["name"]
+
+                print(f"氣體 {gas_name} 的對應編號為: {gas_number}")
 
-                # **3. 發送氣體切換命令**
+                # **2. 發送氣體切換命令**
                 gas_command = f"{self.address}G{gas_number}"
                 print(f"發送氣體切換命令: {gas_command}")
-                response = self._send_command(gas_command)
+                response = self._send_command(gas_command, priority=PRIORITY_WRITE)
                 time.sleep(1)
 
-                # **4. 儲存變更**
+                # **3. 儲存變更**
                 print("🔄 嘗試儲存氣體設定...")
-                self._send_command(f"{self.address}S")
+                self._send_command(f"{self.address}S", priority=PRIORITY_WRITE)
                 time.sleep(1)
 
-                # **5. 確認設備是否正確切換**
+                # **4. 確認設備是否正確切換**
                 for _ in range(3):
                     verify_status = self._parse_response(self._send_command(self.address))
                     print(f"確認變更後的狀態: {verify_status}")
 
-                    if verify_status.get('gas') == gas:
-                        return {"message": f"成功切換至 {gas}", "status": "success"}
+                    if verify_status.get('gas') == gas_name:
+                        return {"message": f"成功切換至 {gas_name}", "status": "success"}
 
                     time.sleep(1)  # 等待設備應用變更
 
@@ -220,52 +540,45 @@ class FlowControllerModel:
                 return {"message": str(e), "status": "error"}
 
     def set_flow_rate(self, flow_rate: float):
-        """設定流量"""
-        with self.lock:
-            if not self.ser:
-                raise Exception("設備未連接")
-                
-            response = self._send_command(f"{self.address}S{flow_rate:.3f}")
-            if not response:
-                raise Exception("設定流量失敗")
+        """設定流量 (寫入指令優先於狀態讀取)，回傳設定後設備回應的狀態，可用來確認設定值"""
+        if not self.ser:
+            raise Exception("設備未連接")
+            
+        response = self._send_command(f"{self.address}S{flow_rate:.3f}", priority=PRIORITY_WRITE)
+        if not response:
+            raise Exception("設定流量失敗")
+        return self._parse_response(response)
 
     def create_mix(self, mix_no: int, name: str, gases: Dict[str, float]):
-        with self.lock:
+        with self.lock, self._polling_mode():
             try:
                 print(f"🛠️ 嘗試建立混合氣體: {name}, 編號: {mix_no}, 成分: {gases}")
 
-                # **1. 手動定義標準氣體與對應編號**
-                standard_gases = {
-                    "Air": 0, "Ar": 1, "CH4": 2, "CO": 3, "CO2": 4, "C2H6": 5, "H2": 6, "He": 7,
-                    "N2": 8, "N2O": 9, "Ne": 10, "O2": 11, "C3H8": 12, "nC4H10": 13, "C2H2": 14,
-                    "C2H4": 15, "iC4H10": 16, "Kr": 17, "Xe": 18, "SF6": 19, "C-25": 20, "C-10": 21,
-                    "C-8": 22, "C-2": 23, "C-75": 24, "He-25": 25, "He-75": 26, "A1025": 27,
-                    "Star29": 28, "P-5": 29
-                }
-
-                # **2. 檢查輸入的氣體是否存在**
+                # **1. 檢查輸入的氣體是否為標準氣體**
                 gas_parts = []
                 for gas, percentage in gases.items():
-                    if gas not in standard_gases:
+                    if gas not in self.STANDARD_GASES:
                         raise ValueError(f"❌ 不支援的氣體: {gas}")
 
-                    gas_number = standard_gases[gas]  # 取得氣體對應的編號
+                    gas_number = self.STANDARD_GASES.index(gas)  # 取得氣體對應的編號
                     gas_parts.append(f"{percentage:.1f} {gas_number}")
 
                 gas_str = " ".join(gas_parts)
 
-                # **3. 正確的 `AGM` 格式**
+                # **2. 正確的 `AGM` 格式**
                 mix_command = f"AGM {name} {mix_no} {gas_str}"
                 print(f"📡 發送混合氣體創建命令: {mix_command}")
-                response = self._send_command(mix_command)
+                response = self._send_command(mix_command, priority=PRIORITY_WRITE)
+                # 氣體表已變更，下次使用時重新掃描
+                gas_cache.invalidate(self._gas_cache_key())
                 time.sleep(2)
 
-                # **4. 儲存變更**
+                # **3. 儲存變更**
                 print("💾 儲存混合氣體...")
-                self._send_command(f"{self.address}S")
+                self._send_command(f"{self.address}S", priority=PRIORITY_WRITE)
                 time.sleep(1)
 
-                # **5. 驗證是否成功**
+                # **4. 驗證是否成功**
                 for _ in range(3):
                     self._send_command(f"{self.address}G{mix_no}")  # 嘗試切換到新混合氣
                     time.sleep(2)
@@ -283,13 +596,15 @@ class FlowControllerModel:
                 return {"message": str(e), "status": "error"}
 
     def delete_mix(self, mix_no: int):
-        with self.lock:
+        with self.lock, self._polling_mode():
             try:
                 if not self.ser:
                     raise Exception("設備未連接")
 
                 command = f"{self.address}GD {mix_no}"
-                response = self._send_command(command)
+                response = self._send_command(command, priority=PRIORITY_WRITE)
+                # 氣體表已變更，下次使用時重新掃描
+                gas_cache.invalidate(self._gas_cache_key())
                 time.sleep(1)
 
                 # **驗證是否成功刪除**
@@ -319,9 +634,9 @@ class FlowControllerModel:
             print(f"格式化數據錯誤: {e}")
             return {"error": str(e)}
 
-    def get_all_gases(self, search_term: str = None) -> Dict[str, Any]:
-        """獲取所有氣體資訊（標準氣體和混合氣體）"""
-        with self.lock:
+    def get_all_gases(self, search_term: str = None, refresh: bool = False) -> Dict[str, Any]:
+        """獲取所有氣體資訊（標準氣體和混合氣體），混合氣體表來自快取"""
+        with self.lock, self._polling_mode():
             if not self.ser:
                 raise Exception("設備未連接")
                 
@@ -331,34 +646,10 @@ class FlowControllerModel:
                 current_gas = self._parse_response(current_response).get('gas', 'Unknown') if current_response else 'Unknown'
 
                 # 標準氣體列表
-                standard_gases = [
-                    'Air', 'Ar', 'CH4', 'CO', 'CO2', 'C2H6', 'H2', 'He',
-                    'N2', 'N2O', 'Ne', 'O2', 'C3H8', 'nC4H10', 'C2H2',
-                    'C2H4', 'iC4H10', 'Kr', 'Xe', 'SF6', 'C-25', 'C-10',
-                    'C-8', 'C-2', 'C-75', 'He-25', 'He-75', 'A1025',
-                    'Star29', 'P-5'
-                ]
-
-                # 獲取混合氣體
-                custom_mixtures = {}
-                for mix_no in range(236, 256):
-                    try:
-                        # 嘗試切換到每個可能的混合氣體編號
-                        response = self._send_command(f"{self.address}G{mix_no}")
-                        if response:
-                            # 再次讀取狀態來獲取氣體名稱
-                            status_response = self._send_command(self.address)
-                            if status_response:
-                                status = self._parse_response(status_response)
-                                if status and 'gas' in status:
-                                    custom_mixtures[mix_no] = {
-                                        'name': status['gas']
-                                    }
-                    except Exception as e:
-                        print(f"檢查混合氣體 {mix_no} 時發生錯誤: {e}")
-
-                # 切換回原始氣體（建議使用 'N2' 或 'Ar'）
-                self._send_command(f"{self.address}GAr")
+                standard_gases = list(self.STANDARD_GASES)
+
+                # 獲取混合氣體 (沒有快取時才掃描設備)
+                custom_mixtures = self.get_custom_mixtures(refresh=refresh)
 
                 # 如果有搜尋條件，過濾結果
                 if search_term:
@@ -387,4 +678,4 @@ class FlowControllerModel:
 
             except Exception as e:
                 print(f"獲取氣體列表錯誤: {e}")
-                raise Exception(f"獲取氣體列表失敗: {str(e)}")
\ No newline at end of file
+                raise Exception(f"獲取氣體列表失敗: {str(e)}")
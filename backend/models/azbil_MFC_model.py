@@ -1,9 +1,11 @@
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, Tuple, TypedDict
+from typing import Optional, Dict, Any, List, Tuple, TypedDict
 import serial
 import struct
 import asyncio
 from enum import Enum
+from protocol_codec import ModbusRtuCodec, ModbusExceptionResponse, ILLEGAL_DATA_ADDRESS, crc16_modbus
+from serial_transport import SerialTransportService, PRIORITY_SAFETY, PRIORITY_READ, PRIORITY_WRITE
 
 class MFCData(TypedDict, total=False):
     GAS_TYPE: str
@@ -134,13 +136,62 @@ class AzbilMFC:
         'KEY_DIRECTION': "按鍵方向"
     }
 
+    # 批次讀取設定：相鄰寄存器間隔不超過 MAX_READ_GAP 就合併成同一次 0x03 讀取
+    MAX_READ_GAP = 16
+    MAX_READ_COUNT = 60
+
+    # 幀間隔下限 (秒)，USB 轉串口的傳輸延遲可能讓同一幀的位元組分批到達
+    FRAME_GAP_FLOOR = 0.005
+
+    # 主要狀態需要的寄存器 (SP_NO_SETTING 位於 GATE_CONTROL 與 SETTING_SP_FLOW 之間，一起讀不增加交易次數)
+    MAIN_STATUS_REGISTERS = (
+        "FLOW_DECIMAL",
+        "TOTAL_FLOW_DECIMAL",
+        "FLOW_UNIT",
+        "TOTAL_FLOW_UNIT",
+        "SETTING_SP_FLOW",
+        "GATE_CONTROL",
+        "PV_FLOW",
+        "FLOW_CONTROL_SETTING",
+        "SP_NO_SETTING",
+        "TOTAL_FLOW_LOW",
+        "TOTAL_FLOW_HIGH"
+    )
+
+    SP_SETTING_REGISTERS = (
+        "SP_0_SETTING", "SP_1_SETTING", "SP_2_SETTING", "SP_3_SETTING",
+        "SP_4_SETTING", "SP_5_SETTING", "SP_6_SETTING", "SP_7_SETTING"
+    )
+
+    @classmethod
+    def plan_register_reads(cls, keys, max_gap: Optional[int] = None, max_count: Optional[int] = None) -> List[Tuple[int, int, List[str]]]:
+        """
+        將寄存器依地址排序後分組成連續區段
+        回傳 [(起始地址, 讀取數量, [寄存器名稱...]), ...]，每個區段只需一次 0x03 讀取
+        """
+        max_gap = cls.MAX_READ_GAP if max_gap is None else max_gap
+        max_count = cls.MAX_READ_COUNT if max_count is None else max_count
+
+        spans: List[Tuple[int, int, List[str]]] = []
+        for key in sorted(set(keys), key=lambda k: cls.REGISTERS[k]):
+            address = cls.REGISTERS[key]
+            if spans:
+                start, count, names = spans[-1]
+                end = start + count - 1
+                if address - end - 1 <= max_gap and address - start + 1 <= max_count:
+                    spans[-1] = (start, max(count, address - start + 1), names + [key])
+                    continue
+            spans.append((address, 1, [key]))
+        return spans
+
     def __post_init__(self):
         """確保初始化時數值型別正確"""
         self.baudrate = int(self.baudrate)
         self.device_id = int(self.device_id)
         self.write_queue = asyncio.Queue()
-        self.is_writing = False  # 標記寫入狀態
-        self.is_reading = False  # 標記讀取狀態
+        self.codec = ModbusRtuCodec(self.device_id)  # RTU 幀編碼 / 解碼 (查表 CRC)
+        self.worker = None  # 串口工作執行緒，讀寫依優先權排隊，不會互相交錯
+        self._rejected_spans = set()  # 設備不接受的跨間隔區段，之後直接拆成連續區段讀取
         
     async def process_write_queue(self):
         """處理等待中的寫入操作"""
@@ -155,104 +206,152 @@ class AzbilMFC:
 
     def calculate_crc(self, data: bytes) -> int:
         """計算 CRC16 Modbus"""
-        crc = 0xFFFF
-        for byte in data:
-            crc ^= byte
-            for _ in range(8):
-                if crc & 0x0001:
-                    crc = (crc >> 1) ^ 0xA001
-                else:
-                    crc >>= 1
-        return crc
+        return crc16_modbus(data)
 
     def verify_crc(self, data: bytes) -> bool:
         """驗證接收數據的 CRC"""
-        if len(data) < 3:  # 至少需要3字節才能有效驗證
-            return False
-        received_crc = struct.unpack('<H', data[-2:])[0]
-        calculated_crc = self.calculate_crc(data[:-2])
-        return received_crc == calculated_crc
+        return ModbusRtuCodec.check_crc(data)
       
     def is_connected(self) -> bool:
       """檢查連線狀態"""
       return bool(self.client and self.client.is_open)
 
-    async def send_modbus_command(self, function_code: int, register_address: int, values: Optional[int] = None) -> bytes:
+    async def send_modbus_command(self, function_code: int, register_address: int, values: Optional[int] = None,
+                                  priority: Optional[int] = None, count: int = 1) -> bytes:
         """發送 Modbus RTU 指令並等待回應"""
+        if not self.worker:
+            raise Exception("設備未連接")
+
         is_write = function_code == 0x06
+        if priority is None:
+            priority = PRIORITY_WRITE if is_write else PRIORITY_READ
+
+        # 構建請求
+        if function_code == 0x03:  # 讀取 count 個寄存器
+            request = self.codec.encode_read(register_address, count)
+        elif function_code == 0x06:  # 寫入寄存器
+            request = self.codec.encode_write_single(register_address, values if values is not None else 0)
+        else:
+            raise ValueError(f"不支援的功能碼: 0x{function_code:02X}")
+
+        async with asyncio.timeout(1):
+            try:
+                # 讀寫交給串口工作執行緒，寫入指令會排在狀態讀取之前
+                response = await asyncio.wrap_future(
+                    self.worker.submit(self._transact, request, self.expected_response_length(function_code, count),
+                                       priority=priority, timeout=1)
+                )
+
+                if response:
+                    if not self.verify_crc(response):
+                        print("CRC 校驗失敗")
+                        return b''
+
+                error_code = ModbusRtuCodec.exception_code(response, function_code)
+                if error_code is not None:
+                    raise ModbusExceptionResponse(error_code)
+                
+                return response
+                    
+            except Exception as e:
+                print(f"命令執行錯誤: {str(e)}")
+                raise
 
-        # 如果是寫入操作，等待任何讀取操作完成
-        while is_write and self.is_reading:
-            await asyncio.sleep(0.1)
+    @staticmethod
+    def expected_response_length(function_code: int, count: int = 1) -> int:
+        """依功能碼計算正常回應的 RTU 幀長度 (含 CRC)"""
+        return ModbusRtuCodec.response_length(function_code, count)
 
-        # 如果是讀取操作，等待任何寫入操作完成
-        while not is_write and self.is_writing:
-            await asyncio.sleep(0.1)
+    def frame_gap(self) -> float:
+        """
+        RTU 幀間隔 (3.5 字元時間，秒)
+        偶校驗 1 停止位每字元 11 bits，鮑率高於 19200 時依規範固定為 1.75 ms，
+        另保留 FRAME_GAP_FLOOR 以容納 USB 轉串口的傳輸延遲
+        """
+        baudrate = int(self.baudrate)
+        gap = 0.00175 if baudrate > 19200 else 3.5 * 11 / baudrate
+        return max(gap, self.FRAME_GAP_FLOOR)
 
+    def _read_frame(self, response_length: int) -> bytes:
+        """
+        讀取一個 RTU 回應幀
+        先讀站號與功能碼，異常回應 (功能碼最高位為 1) 只再讀 3 bytes；
+        正常回應讀到預期長度即返回，中途超過幀間隔沒有新資料則視為幀結束
+        """
+        header = self.client.read(2)
+        if len(header) < 2:
+            return header
+        if header[1] & 0x80:
+            return header + self.client.read(3)  # 異常碼 + CRC
+        return header + self.client.read(response_length - 2)
+
+    def _transact(self, request: bytes, response_length: int) -> bytes:
+        """在串口工作執行緒上寫入請求並讀取回應"""
         try:
-            if is_write:
-                self.is_writing = True
-            else:
-                self.is_reading = True
+            # 清空接收緩衝區
+            self.client.reset_input_buffer()
+            
+            self.client.write(request)
+            
+            # 依預期長度讀取回應，不再固定等待
+            return self._read_frame(response_length)
+        finally:
+            # 確保緩衝區被清空
+            self.client.reset_input_buffer()
+            self.client.reset_output_buffer()
 
-            async with asyncio.timeout(1):
-                try:
-                    # 構建請求
-                    request = bytearray([self.device_id, function_code])
-                    request += struct.pack(">H", register_address)
-                    
-                    if function_code == 0x03:  # 讀取寄存器
-                        request += struct.pack(">H", 1)  # 讀取1個寄存器
-                    elif function_code == 0x06:  # 寫入寄存器
-                        request += struct.pack(">H", values if values is not None else 0)
-                    
-                    crc = self.calculate_crc(request)
-                    request += struct.pack('<H', crc)
-                    
-                    # 清空接收緩衝區
-                    self.client.reset_input_buffer()
-                    
-                    self.client.write(request)
-                    await asyncio.sleep(0.1)
-                    
-                    # 讀取回應
-                    if function_code == 0x03:  
-                        response = self.client.read(7)
-                    else:  
-                        response = self.client.read(8)
+    async def read_registers(self, start_address: int, count: int) -> Optional[Tuple[int, ...]]:
+        """一次讀取 count 個連續寄存器，失敗回傳 None"""
+        response = await self.send_modbus_command(0x03, start_address, count=count)
+        if response:
+            return ModbusRtuCodec.decode_registers(response, count)
+        return None
 
-                    if response:
-                        if not self.verify_crc(response):
-                            print("CRC 校驗失敗")
-                            return b''
-
-                    if len(response) >= 3 and response[1] == (function_code | 0x80):
-                        error_code = response[2]
-                        error_msg = {
-                            1: "非法功能",
-                            2: "非法數據地址",
-                            3: "非法數據值",
-                            4: "設備故障",
-                            5: "確認",
-                            6: "設備忙",
-                        }.get(error_code, f"未知錯誤碼: {error_code}")
-                        raise Exception(f"Modbus 異常: {error_msg}")
-                    
-                    return response
-                        
-                except Exception as e:
-                    print(f"命令執行錯誤: {str(e)}")
+    async def read_register_map(self, keys) -> Dict[str, int]:
+        """
+        依讀取計畫批次讀取多個寄存器並解碼，任何一個寄存器讀不到都會拋出例外
+        只有設備以「非法數據地址」拒絕某個區段時，才改拆成連續區段 (已連續則逐一) 重新讀取，
+        並記住該區段，之後直接拆開；逾時、CRC 錯誤等通訊錯誤直接拋出，不影響之後的讀取計畫
+        """
+        values: Dict[str, int] = {}
+        pending = self.plan_register_reads(keys)
+        while pending:
+            start, count, names = pending.pop(0)
+            span = (start, count)
+            if span in self._rejected_spans:
+                pending[0:0] = self._split_span(start, count, names)
+                continue
+
+            try:
+                block = await self.read_registers(start, count)
+            except ModbusExceptionResponse as e:
+                if e.code != ILLEGAL_DATA_ADDRESS or len(names) == 1:
                     raise
-                finally:
-                    # 確保緩衝區被清空
-                    self.client.reset_input_buffer()
-                    self.client.reset_output_buffer()
+                print(f"區段 0x{start:04X} (+{count}) 被設備拒絕，改為拆開讀取")
+                self._rejected_spans.add(span)
+                pending[0:0] = self._split_span(start, count, names)
+                continue
 
-        finally:
-            if is_write:
-                self.is_writing = False
-            else:
-                self.is_reading = False
+            if block is None:
+                raise Exception(f"區段 0x{start:04X} (+{count}) 回應格式錯誤")
+            for name in names:
+                values[name] = block[self.REGISTERS[name] - start]
+        return values
+
+    def _split_span(self, start: int, count: int, names: List[str]) -> List[Tuple[int, int, List[str]]]:
+        """把區段拆成完全連續的區段；本身已連續時拆成單一寄存器"""
+        spans = self.plan_register_reads(names, max_gap=0)
+        if len(spans) == 1 and spans[0][:2] == (start, count):
+            spans = [(self.REGISTERS[name], 1, [name]) for name in names]
+        return spans
+
+    @staticmethod
+    def decode_total_flow(values: Dict[str, int]) -> Optional[float]:
+        """由低位、高位與小數點寄存器組合累計流量"""
+        if "TOTAL_FLOW_LOW" not in values or "TOTAL_FLOW_HIGH" not in values:
+            return None
+        accumulated_flow = (values["TOTAL_FLOW_HIGH"] << 16) | values["TOTAL_FLOW_LOW"]
+        return accumulated_flow / (10 ** values.get("TOTAL_FLOW_DECIMAL", 0))
 
     async def read_flow_rate_decimal(self) -> Dict[str, Any]:
         """讀取當前流量值"""
@@ -281,16 +380,14 @@ class AzbilMFC:
           if not self.is_connected():
               return {"status": "failure", "message": "設備未連接"}
 
-          # 讀取低位和高位數據
-          low_response = await self.send_modbus_command(0x03, self.REGISTERS['TOTAL_FLOW_LOW'])
-          high_response = await self.send_modbus_command(0x03, self.REGISTERS['TOTAL_FLOW_HIGH'])
+          # 低位與高位是相鄰寄存器，一次讀取兩個
+          words = await self.read_registers(self.REGISTERS['TOTAL_FLOW_LOW'], 2)
 
-          if not low_response or not high_response or len(low_response) < 5 or len(high_response) < 5:
+          if words is None:
               return {"status": "failure", "message": "讀取累計流量失敗"}
 
           # 解析低位和高位
-          low_word = struct.unpack('>H', low_response[3:5])[0]
-          high_word = struct.unpack('>H', high_response[3:5])[0]
+          low_word, high_word = words
 
           # 合併數據 (高16位 + 低16位)
           accumulated_flow = (high_word << 16) | low_word
@@ -341,6 +438,9 @@ class AzbilMFC:
                 stopbits=serial.STOPBITS_ONE,
                 timeout=1
             )
+            # 收到第一個位元組後，超過幀間隔沒有新資料就結束讀取
+            self.client.inter_byte_timeout = self.frame_gap()
+            self.worker = SerialTransportService.open_worker(str(self.port))
 
             # 檢查設備回應
             is_valid, message = await self.verify_device()
@@ -355,43 +455,44 @@ class AzbilMFC:
                     }, 200
                 return {"status": "failure", "message": f"Azbil MFC 連接失敗 (Port: {self.port})"}, 400
             
-            self.client.close()
+            self._close()
             return {"status": "failure", "message": f"連接失敗: {message}"}, 400
             
         except Exception as e:
-            if self.client and self.client.is_open:
-                self.client.close()
+            self._close()
             return {"status": "failure", "message": f"連接請求處理失敗: {str(e)}"}, 400
 
+    def _close(self):
+        """停止串口工作執行緒並關閉串口"""
+        if self.worker:
+            SerialTransportService.close_worker(str(self.port))
+            self.worker = None
+        if self.client and self.client.is_open:
+            self.client.close()
+
     async def disconnect(self) -> Dict[str, Any]:
         """斷開連線"""
         if self.client and self.client.is_open:
-            self.client.close()
+            self._close()
             print("已斷開連線")
             return {"status": "success", "message": "設備已斷開連線"}, 200
         return {"status": "warning", "message": "設備未連接"}, 400
       
     async def get_status(self) -> MFCStatus:
-        """獲取設備狀態"""
+        """獲取設備狀態 (依讀取計畫合併相鄰寄存器，只需少數幾次交易)"""
         if not self.is_connected():
             return {"status": "failure", "message": "設備未連接", "data": {}}
 
         try:
-            status_data: MFCData = {}
-            for key, address in self.REGISTERS.items():
-                if address == 0x270c:
-                    continue
-                response = await self.send_modbus_command(0x03, address)
-                if response and len(response) >= 5:
-                    value = struct.unpack('>H', response[3:5])[0]
-                    status_data[key] = value
-            
-            read_accumulated_flow = await self.read_accumulated_flow()
+            values = await self.read_register_map(
+                key for key, address in self.REGISTERS.items() if address != 0x270c
+            )
+            status_data: MFCData = {
+                key: values[key] for key in self.REGISTERS if key in values
+            }
 
-            if read_accumulated_flow["status"] == "success":
-                status_data["TOTAL_FLOW"] = read_accumulated_flow["value"]
-            else:
-                status_data["TOTAL_FLOW"] = 0
+            total_flow = self.decode_total_flow(values)
+            status_data["TOTAL_FLOW"] = total_flow if total_flow is not None else 0
 
             return {
                 "status": "success",
@@ -442,11 +543,13 @@ class AzbilMFC:
 
             try:
                 async with asyncio.timeout(2):
-                    # 發送設定命令
+                    # 發送設定命令，關閉閥門屬於安全指令，優先執行
+                    is_safety = register_name == 'GATE_CONTROL' and value == 0
                     response = await self.send_modbus_command(
                         0x06,
                         self.REGISTERS[register_name],
-                        value
+                        value,
+                        priority=PRIORITY_SAFETY if is_safety else None
                     )
 
                     if response:
@@ -497,45 +600,30 @@ class AzbilMFC:
             }
 
         try:
-            # 主要需要讀取的寄存器
-            main_registers = [
-                "FLOW_DECIMAL",
-                "TOTAL_FLOW_DECIMAL",
-                "FLOW_UNIT",
-                "TOTAL_FLOW_UNIT",
-                "SETTING_SP_FLOW",
-                "GATE_CONTROL",
-                "PV_FLOW",
-                "FLOW_CONTROL_SETTING"
-            ]
-
-            status_data: MFCData = {}
-
-            # 讀取主要寄存器
-            for key in main_registers:
-                response = await self.send_modbus_command(0x03, self.REGISTERS[key])
-                if response and len(response) >= 5:
-                    value = struct.unpack('>H', response[3:5])[0]
-                    status_data[key] = value
-
-            # 判斷是否需要讀取 SP 設定
+            # 主要寄存器依讀取計畫合併成少數幾次交易
+            values = await self.read_register_map(self.MAIN_STATUS_REGISTERS)
+            missing = [key for key in self.MAIN_STATUS_REGISTERS if key not in values]
+            if missing:
+                raise Exception(f"缺少寄存器: {', '.join(missing)}")
+
+            status_data: MFCData = {
+                key: values[key]
+                for key in self.MAIN_STATUS_REGISTERS
+                if key in values and key not in ("SP_NO_SETTING", "TOTAL_FLOW_LOW", "TOTAL_FLOW_HIGH")
+            }
+
+            # 判斷是否需要讀取 SP 設定 (SP0~7 為連續寄存器，一次讀取)
             if status_data.get("FLOW_CONTROL_SETTING") == 0:
-                sp_registers = [
-                    "SP_NO_SETTING", "SP_0_SETTING", "SP_1_SETTING", "SP_2_SETTING",
-                    "SP_3_SETTING", "SP_4_SETTING", "SP_5_SETTING", "SP_6_SETTING",
-                    "SP_7_SETTING"
-                ]
-                for key in sp_registers:
-                    response = await self.send_modbus_command(0x03, self.REGISTERS[key])
-                    if response and len(response) >= 5:
-                        value = struct.unpack('>H', response[3:5])[0]
-                        status_data[key] = value
-
-            read_accumulated_flow = await self.read_accumulated_flow()
-            if read_accumulated_flow["status"] == "success":
-                status_data["TOTAL_FLOW"] = read_accumulated_flow["value"]
-            else:
-                status_data["TOTAL_FLOW"] = 0
+                if "SP_NO_SETTING" in values:
+                    status_data["SP_NO_SETTING"] = values["SP_NO_SETTING"]
+                sp_values = await self.read_register_map(self.SP_SETTING_REGISTERS)
+                missing = [key for key in self.SP_SETTING_REGISTERS if key not in sp_values]
+                if missing:
+                    raise Exception(f"缺少寄存器: {', '.join(missing)}")
+                for key in self.SP_SETTING_REGISTERS:
+                    status_data[key] = sp_values[key]
+
+            status_data["TOTAL_FLOW"] = self.decode_total_flow(values)
 
             return {
                 "status": "success",
@@ -578,24 +666,14 @@ class AzbilMFC:
             # 設定寄存器地址
             register_address = self.REGISTERS['TOTAL_FLOW_LOW']  # 假設你已經在 REGISTERS 定義了這個地址
             
-            # 準備數據: 寫入 2 個寄存器 (低位和高位)
-            request_data = bytearray([self.device_id, 0x10])  # Function Code 0x10
-            request_data += struct.pack(">H", register_address)  # 寄存器起始地址
-            request_data += struct.pack(">H", 2)  # 寫入 2 個寄存器
-            request_data += struct.pack("B", 4)  # 總共 4 個字節
-            request_data += struct.pack(">HH", 0x0000, 0x0000)  # 設定低位和高位為 0
-
-            # 計算 CRC
-            crc = self.calculate_crc(request_data)
-            request_data += struct.pack('<H', crc)
-
-            # 發送指令
-            self.client.reset_input_buffer()
-            self.client.write(request_data)
-            await asyncio.sleep(0.1)
+            # 準備數據: 以 0x10 寫入 2 個寄存器，低位和高位都設為 0
+            request_data = self.codec.encode_write_multiple(register_address, (0x0000, 0x0000))
 
-            # 讀取回應
-            response = self.client.read(8)
+            # 發送指令並讀取回應
+            response = await asyncio.wrap_future(
+                self.worker.submit(self._transact, request_data, self.expected_response_length(0x10),
+                                   priority=PRIORITY_WRITE)
+            )
             if response and self.verify_crc(response):
                 return {"status": "success", "message": "成功將累積流量清零"}
             else:
@@ -1,5 +1,6 @@
 import serial
 import time
+from serial_transport import SerialTransportService, PRIORITY_SAFETY, PRIORITY_READ, PRIORITY_WRITE
 
 MODE_MAPPING = {
     0: "manual",
@@ -25,6 +26,7 @@ class UC2000:
         """初始化，port 尚未設定"""
         self.ser = None
         self.port = None
+        self.worker = None  # 串口工作執行緒，所有讀寫都經由它排隊執行
 
     def connect(self, port, baudrate=9600):
         """嘗試連接到指定的 COM Port"""
@@ -39,6 +41,7 @@ class UC2000:
                 timeout=1
             )
             self.port = port
+            self.worker = SerialTransportService.open_worker(port)
             
             if self.ser.is_open:
                 print(f"Successfully opened {port}")
@@ -79,6 +82,8 @@ class UC2000:
                 self._send_command(0x7F)  # 請根據實際命令碼調整
                 time.sleep(1)  # 等待切換完成
                 
+                SerialTransportService.close_worker(self.port)
+                self.worker = None
                 self.ser.close()
                 self.ser = None
                 self.port = None
@@ -87,12 +92,20 @@ class UC2000:
         except Exception as e:
             return False, str(e)
 
-    def _send_command(self, command_byte, data_byte=None):
-        """發送指令"""
-        if not self.ser or not self.ser.is_open:
+    def _send_command(self, command_byte, data_byte=None, priority=PRIORITY_WRITE):
+        """發送指令 (經由串口工作執行緒排隊)"""
+        if not self.ser or not self.ser.is_open or not self.worker:
             print("Serial port not ready")
             return False
 
+        try:
+            return self.worker.call(self._transact, command_byte, data_byte, priority=priority)
+        except Exception as e:
+            print(f"Error in _send_command: {str(e)}")
+            return False
+
+    def _transact(self, command_byte, data_byte=None):
+        """在串口工作執行緒上送出指令並等待回應"""
         try:
             print(f"Sending command: {hex(command_byte)}")
             if data_byte is not None:
@@ -132,6 +145,15 @@ class UC2000:
             print(f"Error in _send_command: {str(e)}")
             return False
 
+    def _read_status_frame(self):
+        """在串口工作執行緒上送出狀態請求並讀取 5 bytes 回應"""
+        # 清空緩衝區
+        self.ser.reset_input_buffer()
+        self.ser.reset_output_buffer()
+
+        self.ser.write(bytes([0x7E]))  # 發送狀態請求命令
+        return self.ser.read(5)
+
     # 解析回應數據
     def parse_status(response):        
         """解析 UC-2000 狀態數據"""
@@ -145,7 +167,7 @@ class UC2000:
 
     def get_status(self):
         """獲取控制器狀態"""
-        if not self.ser or not self.ser.is_open:
+        if not self.ser or not self.ser.is_open or not self.worker:
             print("Serial port not open")
             return None
 
@@ -153,12 +175,7 @@ class UC2000:
         for attempt in range(3):
             try:
                 print(f"Attempt {attempt + 1} to get status")
-                # 清空緩衝區
-                self.ser.reset_input_buffer()
-                self.ser.reset_output_buffer()
-
-                self.ser.write(bytes([0x7E]))  # 發送狀態請求命令
-                response = self.ser.read(5)
+                response = self.worker.call(self._read_status_frame, priority=PRIORITY_READ)
 
                 if len(response) != 5:
                     print(f"Invalid status response length: {len(response)}")
@@ -202,7 +219,7 @@ class UC2000:
         status = self.get_status()
         if status and status.get('laser_on') != desired_state:
             command = 0x75 if desired_state else 0x76
-            return self._send_command(command)
+            return self._send_command(command, priority=PRIORITY_WRITE if desired_state else PRIORITY_SAFETY)
         return True
         
     def set_pwm_frequency(self, frequency):
@@ -281,7 +298,8 @@ class UC2000:
             return False
 
         command = 0x75 if enable else 0x76  # 75h = Lase ON, 76h = Lase OFF
-        return self._send_command(command)
+        # 關閉雷射屬於安全指令，優先於其他排隊中的指令
+        return self._send_command(command, priority=PRIORITY_WRITE if enable else PRIORITY_SAFETY)
       
     def set_pwm_percentage(self, percentage):
       """設定 PWM 佔空比(Duty cycle) (0-99%)"""
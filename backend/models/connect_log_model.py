@@ -4,6 +4,12 @@ from datetime import datetime, timezone, timedelta
 
 class ConnectionLog(db.Model):
     __tablename__ = 'connection_logs'
+    # 日誌查詢一律依 (connected_time, id) 由新到舊分頁，索引的欄位順序配合篩選條件
+    __table_args__ = (
+        db.Index('ix_connection_logs_connected_time', 'connected_time', 'id'),
+        db.Index('ix_connection_logs_device_time', 'device_id', 'connected_time'),
+        db.Index('ix_connection_logs_status_time', 'status', 'connected_time'),
+    )
     
     @staticmethod
     def get_tw_time():
@@ -56,4 +62,40 @@ class ConnectionLog(db.Model):
             return log, None
         except Exception as e:
             db.session.rollback()
-            return None, str(e)
\ No newline at end of file
+            return None, str(e)
+
+
+class ConnectionLogDaily(db.Model):
+    """
+    連線日誌的每日彙總 (每個設備一天一列)
+    超過保存期限的原始日誌彙總到這裡後刪除，連線時間以台灣時間的日期切分
+    """
+    __tablename__ = 'connection_log_daily'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'device_id', name='uq_connection_log_daily_day_device'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    device_id = db.Column(db.String(50), nullable=False)
+    device_name = db.Column(db.String(100), nullable=False)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    connects = db.Column(db.Integer, nullable=False, default=0)
+    disconnects = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    connected_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    # 當天結束時設備仍在連線中，下一天的連線時間由 0 點起算
+    open_at_end = db.Column(db.Boolean, nullable=False, default=False)
+
+    def to_dict(self):
+        return {
+            'day': self.day.strftime('%Y-%m-%d'),
+            'device_id': self.device_id,
+            'device_name': self.device_name,
+            'events': self.events,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'failures': self.failures,
+            'connected_seconds': round(self.connected_seconds, 3),
+            'open_at_end': self.open_at_end
+        }
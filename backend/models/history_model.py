@@ -0,0 +1,27 @@
+from database import db
+
+
+class HistoryChannel(db.Model):
+    """歷史資料的通道 (設備 + 欄位名稱)，樣本以 id 參照，避免每筆都重複存字串"""
+    __tablename__ = 'history_channels'
+    __table_args__ = (
+        db.UniqueConstraint('device', 'channel', name='uq_history_channels_device_channel'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    device = db.Column(db.String(50), nullable=False)
+    channel = db.Column(db.String(100), nullable=False)
+
+
+class HistorySample(db.Model):
+    """歷史樣本，只會附加與依時間刪除；timestamp 為 Unix 時間 (秒)"""
+    __tablename__ = 'history_samples'
+    __table_args__ = (
+        db.Index('ix_history_samples_channel_time', 'channel_id', 'timestamp'),
+        db.Index('ix_history_samples_time', 'timestamp'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel_id = db.Column(db.Integer, db.ForeignKey('history_channels.id'), nullable=False)
+    timestamp = db.Column(db.Float, nullable=False)
+    value = db.Column(db.Float, nullable=False)
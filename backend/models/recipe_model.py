@@ -3,6 +3,7 @@ from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, Field, field_validator, ConfigDict
 from uuid import UUID, uuid4
+from database import db
 
 class Recipe(BaseModel):
     """
@@ -75,3 +76,45 @@ class Recipe(BaseModel):
             k: (str(v) if isinstance(v, datetime) else v)
             for k, v in self.dict().items()
         }
+
+
+class RecipeRecord(db.Model):
+    """
+    配方資料表，取代每次讀寫整個 recipes.xlsx
+    欄位與 Recipe 相同，寫入前一律先經過 Recipe 驗證
+    """
+    __tablename__ = 'recipes'
+
+    id = db.Column(db.String(36), primary_key=True)
+    parameter_name = db.Column(db.String(50), nullable=False, unique=True, index=True)
+    main_gas_flow = db.Column(db.Float, nullable=False)
+    main_gas = db.Column(db.String(50), nullable=False)
+    carrier_gas_flow = db.Column(db.Float, nullable=False)
+    carrier_gas = db.Column(db.String(50), nullable=False)
+    laser_power = db.Column(db.Float, nullable=False)
+    temperature = db.Column(db.Float, nullable=False)
+    voltage = db.Column(db.Float, nullable=False)
+    created_time = db.Column(db.DateTime, nullable=False)
+    created_by = db.Column(db.String(50), nullable=False)
+    last_modified = db.Column(db.DateTime)
+    modified_by = db.Column(db.String(50))
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    description = db.Column(db.Text)
+    notes = db.Column(db.Text)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    def to_recipe(self) -> Recipe:
+        return Recipe(**{field: getattr(self, field) for field in Recipe.model_fields})
+
+    def apply(self, recipe: Recipe):
+        """以驗證過的 Recipe 覆寫欄位"""
+        for field, value in recipe.model_dump().items():
+            if field == "id":
+                value = str(value or uuid4())
+            setattr(self, field, value)
+
+    @staticmethod
+    def from_recipe(recipe: Recipe) -> "RecipeRecord":
+        record = RecipeRecord()
+        record.apply(recipe)
+        return record
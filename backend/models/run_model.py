@@ -0,0 +1,39 @@
+import os
+from database import db
+
+
+class RunRecord(db.Model):
+    """鍍膜製程紀錄的索引，資料本身存在 RUN_RECORDER_DIR 下的單一欄式檔案"""
+    __tablename__ = 'runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(40), nullable=False, unique=True, index=True)
+    recipe_name = db.Column(db.String(50), index=True)
+    note = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='recording')   # recording / completed / failed
+    started_at = db.Column(db.DateTime, nullable=False)
+    ended_at = db.Column(db.DateTime)
+    interval = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    columns = db.Column(db.Integer, nullable=False, default=0)
+    file_format = db.Column(db.String(20))
+    file_path = db.Column(db.String(255))
+    file_size = db.Column(db.Integer)
+    message = db.Column(db.Text)
+
+    def to_dict(self):
+        return {
+            'run_id': self.run_id,
+            'recipe_name': self.recipe_name,
+            'note': self.note,
+            'status': self.status,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'ended_at': self.ended_at.strftime('%Y-%m-%d %H:%M:%S') if self.ended_at else None,
+            'interval': self.interval,
+            'samples': self.samples,
+            'columns': self.columns,
+            'file_format': self.file_format,
+            'file_name': os.path.basename(self.file_path) if self.file_path else None,
+            'file_size': self.file_size,
+            'message': self.message
+        }
@@ -0,0 +1,99 @@
+import json
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+from transmittance_to_figure import render_plot
+
+
+class PlotRenderer:
+    """
+    透射率圖表繪製服務
+    matplotlib 在多執行緒的伺服器下不安全，繪圖統一交給專用的單一進程依序執行；
+    相同參數 (fileData、selectedFiles、標籤、plotFlag) 的 PNG 以雜湊為鍵放在 LRU 快取，
+    雜湊同時作為 ETag，相同參數畫出的圖一定相同，前端重複請求時可直接回 304
+    """
+
+    def __init__(self, max_entries: int = 64, timeout: float = 60.0):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()  # 進程池無法使用時在本進程依序繪製
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kind: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({"kind": kind, **params}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def render(self, kind: str, params: Dict[str, Any]) -> Tuple[str, bytes]:
+        """回傳 (ETag, PNG bytes)，快取命中時不重新繪圖"""
+        key = self.make_key(kind, params)
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key, png
+            self.misses += 1
+
+        png = self._render(kind, params)
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return key, png
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=1)
+            return self._pool
+
+    def _reset_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _render(self, kind: str, params: Dict[str, Any]) -> bytes:
+        try:
+            future = self._get_pool().submit(render_plot, kind, params)
+        except Exception as e:
+            print(f"繪圖進程無法使用，改為在本進程繪製: {e}")
+            self._reset_pool()
+            with self._render_lock:
+                return render_plot(kind, params)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except (BrokenProcessPool, FutureTimeoutError) as e:
+            # 資料本身的錯誤 (例如缺少欄位) 直接拋出；進程異常結束或逾時才重建進程池
+            print(f"繪圖進程異常，重新建立: {e}")
+            self._reset_pool()
+            with self._render_lock:
+                return render_plot(kind, params)
+
+    def shutdown(self):
+        self._reset_pool()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+plot_renderer = PlotRenderer()
+atexit.register(plot_renderer.shutdown)
@@ -0,0 +1,197 @@
+import struct
+from typing import Optional, Sequence, Tuple
+
+
+def _build_crc16_table() -> Tuple[int, ...]:
+    """預先計算 CRC-16/Modbus (多項式 0xA001) 的 256 項查表"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 0x0001 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _build_crc16_table()
+
+
+def crc16_modbus(data) -> int:
+    """查表計算 CRC-16/Modbus，每個位元組只需一次查表"""
+    crc = 0xFFFF
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+MODBUS_EXCEPTION_MESSAGES = {
+    1: "非法功能",
+    2: "非法數據地址",
+    3: "非法數據值",
+    4: "設備故障",
+    5: "確認",
+    6: "設備忙",
+}
+
+# 異常碼 0x02: 請求的寄存器位址 (或區段內某個位址) 設備不接受
+ILLEGAL_DATA_ADDRESS = 2
+
+
+class ModbusExceptionResponse(Exception):
+    """設備回傳 Modbus 異常回應，code 為異常碼"""
+
+    def __init__(self, code: int):
+        self.code = code
+        super().__init__(f"Modbus 異常: {MODBUS_EXCEPTION_MESSAGES.get(code, f'未知錯誤碼: {code}')}")
+
+
+class ModbusRtuCodec:
+    """
+    Modbus RTU 幀編碼 / 解碼
+    編碼使用預先配置的 bytearray 與 memoryview，避免每個幀重新組合 bytearray；
+    每個設備實例各自持有一個編碼器，不可跨執行緒共用
+    """
+
+    READ_HOLDING_REGISTERS = 0x03
+    WRITE_SINGLE_REGISTER = 0x06
+    WRITE_MULTIPLE_REGISTERS = 0x10
+
+    MAX_FRAME_SIZE = 256
+
+    _REQUEST_HEADER = struct.Struct(">BBHH")  # 站號 + 功能碼 + 地址 + 數量/數值
+    _CRC = struct.Struct("<H")
+
+    def __init__(self, unit_id: int):
+        self.unit_id = int(unit_id) & 0xFF
+        self._buffer = bytearray(self.MAX_FRAME_SIZE)
+        self._view = memoryview(self._buffer)
+
+    def _finish(self, length: int) -> bytes:
+        """在緩衝區尾端補上 CRC 並輸出完整幀"""
+        self._CRC.pack_into(self._buffer, length, crc16_modbus(self._view[:length]))
+        return bytes(self._view[:length + 2])
+
+    def encode_read(self, address: int, count: int = 1) -> bytes:
+        """0x03 讀取 count 個保持寄存器"""
+        self._REQUEST_HEADER.pack_into(self._buffer, 0, self.unit_id, self.READ_HOLDING_REGISTERS, address, count)
+        return self._finish(6)
+
+    def encode_write_single(self, address: int, value: int) -> bytes:
+        """0x06 寫入單一寄存器"""
+        self._REQUEST_HEADER.pack_into(self._buffer, 0, self.unit_id, self.WRITE_SINGLE_REGISTER, address, value & 0xFFFF)
+        return self._finish(6)
+
+    def encode_write_multiple(self, address: int, values: Sequence[int]) -> bytes:
+        """0x10 寫入多個連續寄存器"""
+        count = len(values)
+        self._REQUEST_HEADER.pack_into(self._buffer, 0, self.unit_id, self.WRITE_MULTIPLE_REGISTERS, address, count)
+        self._buffer[6] = 2 * count
+        struct.pack_into(f">{count}H", self._buffer, 7, *(value & 0xFFFF for value in values))
+        return self._finish(7 + 2 * count)
+
+    @staticmethod
+    def response_length(function_code: int, count: int = 1) -> int:
+        """依功能碼計算正常回應的幀長度 (含 CRC)"""
+        if function_code == ModbusRtuCodec.READ_HOLDING_REGISTERS:
+            return 5 + 2 * count  # 站號 + 功能碼 + 位元組數 + 數據 + CRC
+        return 8  # 0x06 / 0x10 回應固定為 站號 + 功能碼 + 地址 + 值/數量 + CRC
+
+    @staticmethod
+    def check_crc(frame) -> bool:
+        """驗證幀尾 CRC (低位在前)"""
+        if len(frame) < 3:  # 至少需要3字節才能有效驗證
+            return False
+        view = memoryview(frame)
+        return crc16_modbus(view[:-2]) == (view[-2] | (view[-1] << 8))
+
+    @staticmethod
+    def exception_code(frame, function_code: int) -> Optional[int]:
+        """若為異常回應 (功能碼最高位為 1) 回傳異常碼，否則回傳 None"""
+        if len(frame) >= 3 and frame[1] == (function_code | 0x80):
+            return frame[2]
+        return None
+
+    @staticmethod
+    def exception_message(error_code: int) -> str:
+        return MODBUS_EXCEPTION_MESSAGES.get(error_code, f"未知錯誤碼: {error_code}")
+
+    @staticmethod
+    def decode_registers(frame, count: int) -> Optional[Tuple[int, ...]]:
+        """解析 0x03 回應的寄存器值，長度或位元組數不符時回傳 None"""
+        if len(frame) >= 5 + 2 * count and frame[2] == 2 * count:
+            return struct.unpack_from(f">{count}H", frame, 3)
+        return None
+
+
+class SpikCodec:
+    """
+    SPIK 電源供應器協定幀編碼 / 解碼
+    幀格式: 10 bytes 標頭 + 數據 + DLE + ETX + BCC (所有位元組 XOR)，
+    固定欄位只在建立時寫入緩衝區一次，BCC 由變動欄位直接累算，不必逐位元組掃描整個幀
+    """
+
+    STX = 0x02
+    ETX = 0x03
+    DLE = 0x10
+    NAK = 0x15
+
+    READ_COMMAND = 0x45   # 'E'
+    WRITE_COMMAND = 0x41  # 'A'
+
+    # 固定欄位: [0:2]=0, [3]=0x44, [4]=0, [6]=0, [8:10]=0xFF 0xFF，其 XOR 為 0x44
+    _FIXED_BCC = 0x44 ^ DLE ^ ETX
+
+    def __init__(self):
+        self._buffer = bytearray(32)
+        self._buffer[3] = 0x44
+        self._buffer[8:10] = b"\xff\xff"
+        self._view = memoryview(self._buffer)
+
+    def _encode(self, command: int, address: int, word_count: int, words: Sequence[int]) -> bytes:
+        buffer = self._buffer
+        address &= 0xFF
+        buffer[2] = command
+        buffer[5] = address
+        buffer[7] = word_count
+        bcc = self._FIXED_BCC ^ command ^ address ^ word_count
+
+        end = 10
+        for word in words:
+            high = (word >> 8) & 0xFF
+            low = word & 0xFF
+            buffer[end] = high
+            buffer[end + 1] = low
+            bcc ^= high ^ low
+            end += 2
+
+        buffer[end] = self.DLE
+        buffer[end + 1] = self.ETX
+        buffer[end + 2] = bcc
+        return bytes(self._view[:end + 3])
+
+    def encode_write(self, data: Sequence[int]) -> Optional[bytes]:
+        """
+        組合寫入幀，不支援的類型回傳 None
+        - data[0] == 1 → 設定模式 + ON/OFF
+        - data[0] == 2 → 設定時脈
+        - data[0] == 3 → 單一寄存器寫入
+        """
+        if data[0] == 1:
+            return self._encode(self.WRITE_COMMAND, 0, 2, (data[1] & 0xFF, data[2] & 0xFF))
+        if data[0] == 2:
+            return self._encode(self.WRITE_COMMAND, 4, 4, data[1:5])
+        if data[0] == 3:
+            return self._encode(self.WRITE_COMMAND, data[1], 1, (data[2],))
+        return None
+
+    def encode_read(self, address: int) -> bytes:
+        """組合讀取單一寄存器的請求幀"""
+        return self._encode(self.READ_COMMAND, address, 1, ())
+
+    @staticmethod
+    def decode_read_value(frame) -> Optional[int]:
+        """由讀取回應尾端 (數據 + DLE + ETX + BCC) 取出 16 位元數值"""
+        if len(frame) < 9:
+            return None
+        return (frame[-4] << 8) | frame[-3]
@@ -2,11 +2,47 @@ from flask import Blueprint, jsonify, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from services.connect_log_services import ConnectionLogService
 from models.alicat_model import FlowControllerModel
+from services.alicat_bus_services import AlicatBusService
+from services.recipe_apply_services import within
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
 import serial
 
 alicat_bp = Blueprint('alicat', __name__)
 flow_controller = None  # 全局流量控制器實例
+alicat_bus = AlicatBusService()  # RS-485 多站號設備登錄表
+
+def poll_status():
+    """供輪詢排程器使用，未連線時回傳 None"""
+    if not flow_controller:
+        return None
+    return flow_controller.read_status()
+
+def poll_bus_status():
+    """供輪詢排程器使用，一次讀取登錄表上所有站號，沒有設備時回傳 None"""
+    return alicat_bus.poll_all()
+
+def apply_recipe(recipe):
+    """供配方套用引擎使用: 切換載氣種類 (與目前不同時) 並設定載氣流量，未連線時回傳 None"""
+    if not flow_controller:
+        return None
+    status = flow_controller.read_status()
+    gas_changed = False
+    if recipe.carrier_gas and status.get("gas") != recipe.carrier_gas:
+        result = flow_controller.set_gas(recipe.carrier_gas)
+        if result.get("status") != "success":
+            raise Exception(result.get("message", "切換氣體失敗"))
+        gas_changed = True
+
+    target = round(float(recipe.carrier_gas_flow), 3)
+    status = flow_controller.set_flow_rate(target) or flow_controller.read_status()
+    readback = status.get("setpoint")
+    return {
+        "setpoint": target,
+        "readback": readback,
+        "gas": status.get("gas"),
+        "gas_changed": gas_changed,
+        "confirmed": within(target, readback, 0.005) and (not recipe.carrier_gas or status.get("gas") == recipe.carrier_gas)
+    }
 
 @alicat_bp.route('/connect', methods=['POST'])
 def connect():
@@ -143,6 +179,7 @@ def disconnect():
     try:
         flow_controller.disconnect()
         flow_controller = None
+        current_app.device_poller.invalidate('alicat')
 
         current_app.emit_device_status('alicat', 'disconnected', {
             "message": f"Alicat 載氣MFC中斷連線成功，port: {connected_port}",
@@ -190,7 +227,11 @@ def get_status():
         return jsonify({"status": "failure", "message": "設備未連接"}), 400
 
     try:
-        status = flow_controller.read_status()
+        # 串流模式直接回傳最新數據幀 (過期或串流中斷時由 read_status 處理)；
+        # 否則優先使用排程器最新的資料，避免每個前端分頁都各自讀取串口
+        status = None if flow_controller.streaming else current_app.device_poller.get_latest('alicat')
+        if status is None:
+            status = flow_controller.read_status()
         current_app.emit_device_status('alicat', 'connected', {
             "message": f"Alicat 載氣MFC取得資料成功",
             "data": status
@@ -202,6 +243,52 @@ def get_status():
     except Exception as e:
         return jsonify({"status": "failure", "message": str(e)}), 500
 
+@alicat_bp.route('/streaming', methods=['POST'])
+def set_streaming():
+    """開始或停止串流模式"""
+    if not flow_controller:
+        return jsonify({"status": "failure", "message": "設備未連接"}), 400
+
+    data = request.get_json() or {}
+    enable = data.get('enable')
+    interval_ms = data.get('interval_ms')
+
+    if enable is None:
+        return jsonify({"status": "failure", "message": "需要提供 enable"}), 400
+
+    try:
+        if enable:
+            flow_controller.start_streaming(int(interval_ms) if interval_ms else None)
+        else:
+            flow_controller.stop_streaming()
+        current_app.device_poller.invalidate('alicat')
+        return jsonify({
+            "status": "success",
+            "message": "串流模式已開啟" if enable else "串流模式已關閉",
+            "streaming": flow_controller.streaming
+        }), 200
+    except ValueError:
+        return jsonify({"status": "failure", "message": "interval_ms 格式錯誤"}), 400
+    except Exception as e:
+        return jsonify({"status": "failure", "message": str(e)}), 500
+
+@alicat_bp.route('/samples', methods=['GET'])
+def get_samples():
+    """獲取串流模式最近 N 筆資料"""
+    if not flow_controller:
+        return jsonify({"status": "failure", "message": "設備未連接"}), 400
+
+    try:
+        count = int(request.args.get('n', 100))
+    except ValueError:
+        return jsonify({"status": "failure", "message": "n 格式錯誤"}), 400
+
+    return jsonify({
+        "status": "success",
+        "streaming": flow_controller.streaming,
+        "data": flow_controller.get_samples(count)
+    }), 200
+
 @alicat_bp.route('/set_flow_rate', methods=['POST'])
 def set_flow_rate():
     """設定流量"""
@@ -226,6 +313,7 @@ def set_flow_rate():
     try:
         flow_rate = float(flow_rate)
         flow_controller.set_flow_rate(flow_rate)
+        current_app.device_poller.invalidate('alicat')
         current_app.emit_device_status('alicat', 'connected', {
             "message": "載氣流量修改成功",
             "data": flow_controller.read_status()
@@ -244,9 +332,11 @@ def get_all_gases():
 
     # 獲取搜尋參數（可選）
     search_term = request.args.get('search', None)
+    # refresh=true 時忽略快取，重新掃描混合氣體
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
 
     try:
-        gases_data = flow_controller.get_all_gases(search_term)
+        gases_data = flow_controller.get_all_gases(search_term, refresh=refresh)
         return jsonify({
             "status": "success",
             "data": gases_data
@@ -271,6 +361,7 @@ def set_gas():
         if isinstance(gas, str) and gas.isdigit():
             gas = int(gas)
         result = flow_controller.set_gas(gas)
+        current_app.device_poller.invalidate('alicat')
         return jsonify({"status": "success", "message": f"Gas set to {gas}"}), 200
     except Exception as e:
         return jsonify({"status": "failure", "message": str(e)}), 500
@@ -295,6 +386,7 @@ def create_mix():
 
     try:
         result = flow_controller.create_mix(mix_no, name, gases)
+        current_app.device_poller.invalidate('alicat')
         return jsonify({
             "status": "success", 
             "message": f"成功創建混合氣體 {name} (編號 {mix_no})"
@@ -324,6 +416,98 @@ def delete_mix():
 
     try:
         flow_controller.delete_mix(mix_no)
+        current_app.device_poller.invalidate('alicat')
         return jsonify({"status": "success", "message": f"Mix {mix_no} deleted"}), 200
     except Exception as e:
-        return jsonify({"status": "failure", "message": str(e)}), 500
\ No newline at end of file
+        return jsonify({"status": "failure", "message": str(e)}), 500
+
+@alicat_bp.route('/devices', methods=['GET'])
+def list_bus_devices():
+    """獲取多站號設備登錄表"""
+    return jsonify({"status": "success", "data": alicat_bus.list_devices()}), 200
+
+def log_bus_event(port, address, status):
+    """記錄多站號設備的連線日誌，每個站號以 carrierGas:<port>:<站號> 區分"""
+    try:
+        current_user_id = get_jwt_identity()
+    except:
+        current_user_id = None
+    ConnectionLogService.create_log(
+        device_id=f"carrierGas:{alicat_bus.device_key(port, address.upper())}",
+        device_name=f"Alicat 載氣MFC 站號 {address.upper()}",
+        port=port,
+        address=address.upper(),
+        status=status,
+        created_by=current_user_id
+    )
+
+@alicat_bp.route('/devices/add', methods=['POST'])
+def add_bus_device():
+    """在 RS-485 串口上新增一個站號 (同一串口的站號共用連線)"""
+    data = request.get_json() or {}
+    port = data.get('port')
+    address = data.get('address')
+
+    if not port or not address:
+        return jsonify({"status": "failure", "message": "需要提供 port 和 address"}), 400
+
+    try:
+        initial_status = alicat_bus.add_device(port, address, data.get('name'))
+        current_app.device_poller.invalidate('alicat_bus')
+        log_bus_event(port, address, 'connected')
+        return jsonify({
+            "status": "success",
+            "message": f"Alicat 站號 {address.upper()} 連接成功，port: {port}",
+            "data": initial_status
+        }), 200
+    except ValueError as ve:
+        return jsonify({"status": "failure", "message": str(ve)}), 400
+    except Exception as e:
+        log_bus_event(port, address, 'connect failed')
+        return jsonify({"status": "failure", "message": str(e)}), 500
+
+@alicat_bp.route('/devices/remove', methods=['POST'])
+def remove_bus_device():
+    """移除站號，串口上最後一個站號移除時關閉串口"""
+    data = request.get_json() or {}
+    port = data.get('port')
+    address = data.get('address')
+
+    if not port or not address:
+        return jsonify({"status": "failure", "message": "需要提供 port 和 address"}), 400
+
+    try:
+        if not alicat_bus.remove_device(port, address):
+            return jsonify({"status": "failure", "message": "設備未登錄"}), 404
+        current_app.device_poller.invalidate('alicat_bus')
+        log_bus_event(port, address, 'disconnected')
+        return jsonify({"status": "success", "message": "disconnected"}), 200
+    except Exception as e:
+        log_bus_event(port, address, 'disconnected failed')
+        return jsonify({"status": "failure", "message": str(e)}), 500
+
+@alicat_bp.route('/devices/status', methods=['GET'])
+def get_bus_status():
+    """獲取所有站號的狀態 (優先使用排程器最新一次輪詢的結果)"""
+    status = current_app.device_poller.get_latest('alicat_bus')
+    if status is None:
+        status = alicat_bus.poll_all() or {}
+    return jsonify({"status": "success", "data": status}), 200
+
+@alicat_bp.route('/devices/set_flow_rate', methods=['POST'])
+def set_bus_flow_rate():
+    """設定指定站號的流量"""
+    data = request.get_json() or {}
+    model = alicat_bus.get_model(data.get('port'), data.get('address'))
+    if not model:
+        return jsonify({"status": "failure", "message": "設備未登錄"}), 400
+
+    try:
+        flow_rate = float(data.get('flow_rate'))
+        model.set_flow_rate(flow_rate)
+        current_app.device_poller.invalidate('alicat_bus')
+        return jsonify({"status": "success", "message": f"{flow_rate:.3f} slm"}), 200
+    except (TypeError, ValueError):
+        return jsonify({"status": "failure", "message": "Invalid flow rate format"}), 400
+    except Exception as e:
+        return jsonify({"status": "failure", "message": str(e)}), 500
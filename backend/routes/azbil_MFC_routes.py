@@ -2,8 +2,8 @@ from flask import Blueprint, request, jsonify, current_app
 from services.azbil_MFC_services import AzbilMFCService
 from services.connect_log_services import ConnectionLogService
 from flask_jwt_extended import get_jwt_identity
-from threading import Lock, Thread
-import asyncio
+from threading import Lock
+from async_loop import background_loop
 
 # 創建服務實例
 azbil_service = AzbilMFCService()
@@ -11,27 +11,63 @@ azbil_MFC_bp = Blueprint("azbilMfc", __name__)
 
 write_lock = Lock()
 
-# 輔助函數：在單獨的線程中執行異步操作
+# 輔助函數：把異步操作交給常駐的背景 event loop 執行
 def run_async_task(coroutine):
-    """在新線程中執行異步任務並返回結果"""
-    result_container = []
-    
-    def thread_target():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(coroutine)
-            result_container.append(result)
-        finally:
-            loop.close()
-    
-    thread = Thread(target=thread_target)
-    thread.start()
-    thread.join()
-    
-    if result_container:
-        return result_container[0]
-    return None, 500
+    """在背景 event loop 執行異步任務並返回結果"""
+    try:
+        return background_loop.run(coroutine)
+    except Exception as e:
+        print(f"異步任務執行失敗: {str(e)}")
+        return {"status": "failure", "message": str(e)}, 500
+
+def poll_status():
+    """供輪詢排程器使用，未連線時回傳 None"""
+    if not azbil_service.device or not azbil_service.device.is_connected():
+        return None
+    result, status_code = run_async_task(azbil_service.get_main_status())
+    if status_code != 200:
+        return None
+    return result["data"]
+
+# FLOW_RATE / SETTING_SP_FLOW 寄存器固定以 0.1 L/min 為單位 (前端顯示時才依 FLOW_UNIT 換算成 mL/min 或 m^3/h)
+FLOW_RATE_SCALE = 10
+
+def flow_to_register(flow_l_min):
+    """把主氣流量 (L/min) 換算成 FLOW_RATE 寄存器值"""
+    return int(round(float(flow_l_min) * FLOW_RATE_SCALE))
+
+def apply_recipe(recipe):
+    """
+    供配方套用引擎使用: 把配方的主氣流量 (L/min) 換算成寄存器值後寫入，再讀回 FLOW_RATE 確認，
+    未連線時回傳 None；讀不到設備的流量單位設定時視為通訊異常，不寫入
+    """
+    device = azbil_service.device
+    if not device or not device.is_connected():
+        return None
+
+    with write_lock:
+        settings = background_loop.run(device.read_register_map(("FLOW_UNIT", "FLOW_DECIMAL")))
+        missing = [key for key in ("FLOW_UNIT", "FLOW_DECIMAL") if key not in settings]
+        if missing:
+            raise Exception(f"讀取 {', '.join(missing)} 失敗，未寫入主氣流量")
+
+        raw_value = flow_to_register(recipe.main_gas_flow)
+        low, high = device.REGISTER_RANGES["FLOW_RATE"]
+        if not low <= raw_value <= high:
+            raise ValueError(f"主氣流量換算後為 {raw_value}，超出範圍 {low}~{high}")
+
+        result, status_code = background_loop.run(azbil_service.set_flow(raw_value))
+        if status_code != 200:
+            raise Exception(result.get("message", "設定流量失敗"))
+        readback = background_loop.run(device.read_register_map(("FLOW_RATE",))).get("FLOW_RATE")
+
+    return {
+        "setpoint": float(recipe.main_gas_flow),
+        "raw_value": raw_value,
+        "flow_unit": settings["FLOW_UNIT"],
+        "readback": readback,
+        "confirmed": readback == raw_value
+    }
 
 @azbil_MFC_bp.route("/connect", methods=["POST"])
 def connect_device():
@@ -162,6 +198,7 @@ def disconnect_device():
         result, status_code = run_async_task(azbil_service.disconnect())
         
         if status_code == 200:
+            current_app.device_poller.invalidate('azbil')
             try:
                 current_app.emit_device_status('azbil', 'disconnected', {
                     "message": f"Azbil主氣中斷連線成功，{port} {device_id}",
@@ -247,6 +284,7 @@ def set_flow():
         
         # 發送 Socket.IO 事件
         if status_code == 200:
+            current_app.device_poller.invalidate('azbil')
             try:
                 current_app.emit_device_status('azbil', 'connected', {
                     "message": f"Azbil主氣流量設定成功: {flow_rate}",
@@ -286,6 +324,11 @@ def get_status():
 @azbil_MFC_bp.route("/get_main_status", methods=["GET"])
 def get_main_status():
     """獲取主狀態 - 同步版本"""
+    # 優先使用排程器最新的資料，避免每個前端分頁都各自讀取串口
+    cached = current_app.device_poller.get_latest('azbil')
+    if cached is not None:
+        return jsonify({"status": "success", "data": cached}), 200
+
     result, status_code = run_async_task(azbil_service.get_main_status())
     return jsonify(result), status_code
   
@@ -300,6 +343,7 @@ def flow_turn_on():
         )
         
         if status_code == 200:
+            current_app.device_poller.invalidate('azbil')
             try:
                 current_app.emit_device_status('azbil', 'connected', {
                     "message": "Azbil主氣流量已開啟",
@@ -321,6 +365,7 @@ def flow_turn_off():
         )
         
         if status_code == 200:
+            current_app.device_poller.invalidate('azbil')
             try:
                 current_app.emit_device_status('azbil', 'connected', {
                     "message": "Azbil主氣流量已關閉",
@@ -342,6 +387,7 @@ def flow_turn_full():
         )
         
         if status_code == 200:
+            current_app.device_poller.invalidate('azbil')
             try:
                 current_app.emit_device_status('azbil', 'connected', {
                     "message": "Azbil主氣流量已設為最大",
@@ -359,6 +405,7 @@ def update():
     result, status_code = run_async_task(azbil_service.set_setting_update(data))
     
     if status_code == 200:
+        current_app.device_poller.invalidate('azbil')
         try:
             current_app.emit_device_status('azbil', 'connected', {
                 "message": "Azbil主氣設定已更新",
@@ -376,6 +423,7 @@ def restart_accumlated_flow():
         result, status_code = run_async_task(azbil_service.restart_accumlated_flow())
         
         if status_code == 200:
+            current_app.device_poller.invalidate('azbil')
             try:
                 current_app.emit_device_status('azbil', 'connected', {
                     "message": "Azbil主氣累計流量已重置"
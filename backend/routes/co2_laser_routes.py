@@ -1,11 +1,40 @@
 from flask import Blueprint, jsonify, request, current_app
 from services.co2_laser_services import UC2000Service
+from services.recipe_apply_services import within
 from services.connect_log_services import ConnectionLogService
 from flask_jwt_extended import get_jwt_identity
 
 uc2000_bp = Blueprint('uc2000', __name__)
 controller_service = UC2000Service()
 
+def poll_status():
+    """供輪詢排程器使用，未連線時回傳 None"""
+    if not controller_service.controller.ser or not controller_service.controller.ser.is_open:
+        return None
+    data, status_code = controller_service.get_status()
+    if status_code != 200:
+        return None
+    return data["data"]
+
+def apply_recipe(recipe):
+    """供配方套用引擎使用: 設定雷射 PWM 佔空比並讀回確認，未連線時回傳 None"""
+    if not controller_service.controller.ser or not controller_service.controller.ser.is_open:
+        return None
+    percentage = float(recipe.laser_power)
+    if not 0 <= percentage <= 99:
+        raise ValueError("Percentage 必須在 0-99 之間")
+
+    result, status_code = controller_service.set_pwm_percentage(percentage)
+    if status_code != 200:
+        raise Exception(result.get("message", "設定失敗"))
+    data, data_status_code = controller_service.get_status()
+    readback = data["data"].get("pwm_percentage") if data_status_code == 200 else None
+    return {
+        "setpoint": percentage,
+        "readback": readback,
+        "confirmed": within(int(percentage * 2) / 2, readback, 1e-9)  # UC-2000 解析度為 0.5%
+    }
+
 @uc2000_bp.route('/connect', methods=['POST'])
 def connect():
     """連接 UC-2000 設備"""
@@ -112,6 +141,7 @@ def disconnect():
         result, status_code = controller_service.disconnect()
         
         if status_code == 200:
+            current_app.device_poller.invalidate('co2laser')
             current_app.emit_device_status('co2laser', 'disconnected', {
                 "message": f"CO2 laser中斷連線成功，{port}",
                 "port": port,
@@ -168,7 +198,12 @@ def disconnect():
 @uc2000_bp.route('/status', methods=['GET'])
 def get_status():
     """獲取 UC-2000 狀態"""
-    data, data_status_code = controller_service.get_status()
+    # 優先使用排程器最新的資料，避免每個前端分頁都各自讀取串口
+    cached = current_app.device_poller.get_latest('co2laser')
+    if cached is not None:
+        data, data_status_code = {"status": "success", "data": cached}, 200
+    else:
+        data, data_status_code = controller_service.get_status()
     
     current_app.emit_device_status('co2laser', 'connected', {
         "message": "Co2 laser 修改成功",
@@ -176,6 +211,12 @@ def get_status():
     })
     return data
 
+def invalidate_on_success(result):
+    """寫入成功後捨棄排程器的舊資料，下一次讀取狀態會直接讀設備"""
+    if result[1] == 200:
+        current_app.device_poller.invalidate('co2laser')
+    return result
+
 @uc2000_bp.route('/set_pwm_freq', methods=['POST'])
 def set_pwm_frequency():
     """設定 PWM 頻率"""
@@ -186,6 +227,8 @@ def set_pwm_frequency():
         return jsonify({"status": "error", "message": "請提供 freq"}), 400
     
     result = controller_service.set_pwm_frequency(freq)
+    if result[1] == 200:
+        current_app.device_poller.invalidate('co2laser')
     
     data, data_status_code = controller_service.get_status()
     
@@ -206,6 +249,8 @@ def set_laser():
         return jsonify({"status": "error", "message": "請提供 enable"}), 400
     
     start_data, start_status_code = controller_service.set_laser_enabled(enable)
+    if start_status_code == 200:
+        current_app.device_poller.invalidate('co2laser')
     
     data, data_status_code = controller_service.get_status()
     
@@ -237,6 +282,8 @@ def set_pwm():
         return jsonify({"status": "error", "message": "Percentage 必須在 0-99 之間"}), 400
     
     set_pwm_data, set_pwm_status_code = controller_service.set_pwm_percentage(percentage)
+    if set_pwm_status_code == 200:
+        current_app.device_poller.invalidate('co2laser')
     
     data, data_status_code = controller_service.get_status()
     
@@ -275,7 +322,7 @@ def set_mode():
             "message": f"無效的模式: {mode}. 有效的模式為: manual, anc, anv, manual_closed, anv_closed"
         }), 400
         
-    return controller_service.set_mode(mode)
+    return invalidate_on_success(controller_service.set_mode(mode))
 
 @uc2000_bp.route('/set_lase_on_powerup', methods=['POST'])
 def set_lase_on_powerup():
@@ -284,7 +331,7 @@ def set_lase_on_powerup():
     enable = data.get('enable')
     if enable is None:
         return jsonify({"status": "error", "message": "請提供 enable 參數"}), 400
-    return controller_service.set_lase_on_powerup(enable)
+    return invalidate_on_success(controller_service.set_lase_on_powerup(enable))
 
 @uc2000_bp.route('/set_max_pwm_95', methods=['POST'])
 def set_max_pwm_95():
@@ -293,7 +340,7 @@ def set_max_pwm_95():
     enable = data.get('enable')
     if enable is None:
         return jsonify({"status": "error", "message": "請提供 enable 參數"}), 400
-    return controller_service.set_max_pwm_95(enable)
+    return invalidate_on_success(controller_service.set_max_pwm_95(enable))
 
 @uc2000_bp.route('/set_gate_pull_up', methods=['POST'])
 def set_gate_pull_up():
@@ -302,7 +349,7 @@ def set_gate_pull_up():
     enable = data.get('enable')
     if enable is None:
         return jsonify({"status": "error", "message": "請提供 enable 參數"}), 400
-    return controller_service.set_gate_pull_up(enable)
+    return invalidate_on_success(controller_service.set_gate_pull_up(enable))
 
 @uc2000_bp.route('/update_settings', methods=['POST'])
 def update_settings():
@@ -311,4 +358,7 @@ def update_settings():
     if not data:
         return jsonify({"status": "error", "message": "請提供設定資料"}), 400
         
-    return controller_service.update_all_settings(data)
\ No newline at end of file
+    # 多步驟設定中途失敗時設備狀態也可能已改變 (例如雷射已關閉)，一律捨棄排程器的舊資料
+    result = controller_service.update_all_settings(data)
+    current_app.device_poller.invalidate('co2laser')
+    return result
\ No newline at end of file
@@ -0,0 +1,82 @@
+from flask import Blueprint, jsonify, request, Response, stream_with_context, current_app
+from services.connect_log_services import ConnectionLogService, connection_log_writer
+
+connect_log_bp = Blueprint('connect_log', __name__)
+
+def _filters():
+    return {
+        "device_id": request.args.get('device_id'),
+        "status": request.args.get('status'),
+        "start": request.args.get('start'),
+        "end": request.args.get('end')
+    }
+
+@connect_log_bp.route('/', methods=['GET'])
+def get_logs():
+    """分頁查詢連線日誌 (由新到舊)，下一頁帶入回傳的 next_cursor"""
+    try:
+        data = ConnectionLogService.get_logs_page(
+            **_filters(),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 100)
+        )
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "failure", "message": str(e)}), 500
+    return jsonify({"status": "success", "data": data}), 200
+
+@connect_log_bp.route('/export', methods=['GET'])
+def export_logs():
+    """以 NDJSON 串流匯出符合條件的全部日誌"""
+    try:
+        lines = ConnectionLogService.iter_logs_ndjson(**_filters())
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+    return Response(
+        stream_with_context(lines),
+        mimetype='application/x-ndjson',
+        headers={"Content-Disposition": "attachment; filename=connection_logs.ndjson"}
+    )
+
+@connect_log_bp.route('/writer', methods=['GET'])
+def get_writer_status():
+    """取得連線日誌寫入器狀態 (佇列深度、已寫入筆數、最近一批的耗時)"""
+    return jsonify({
+        "status": "success",
+        "data": connection_log_writer.get_stats()
+    }), 200
+
+@connect_log_bp.route('/daily', methods=['GET'])
+def get_daily_summaries():
+    """查詢過期日誌彙總後的每日統計"""
+    try:
+        data = ConnectionLogService.get_daily_summaries(
+            device_id=request.args.get('device_id'),
+            start=request.args.get('start'),
+            end=request.args.get('end')
+        )
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+    return jsonify({"status": "success", "data": data}), 200
+
+@connect_log_bp.route('/maintenance', methods=['GET'])
+def get_maintenance_status():
+    """取得日誌維護排程狀態與最近一次的結果"""
+    return jsonify({
+        "status": "success",
+        "data": current_app.connection_log_maintenance.get_status()
+    }), 200
+
+@connect_log_bp.route('/maintenance/run', methods=['POST'])
+def run_maintenance():
+    """立即執行一次日誌彙總、刪除與資料庫整理"""
+    data = request.get_json(silent=True) or {}
+    try:
+        connection_log_writer.flush()
+        result = current_app.connection_log_maintenance.run_once(data.get('retention_days'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "failure", "message": str(e)}), 500
+    return jsonify({"status": "success", "data": result}), 200
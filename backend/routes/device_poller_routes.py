@@ -0,0 +1,43 @@
+from flask import Blueprint, jsonify, request, current_app
+
+device_poller_bp = Blueprint('device_poller', __name__)
+
+@device_poller_bp.route('/status', methods=['GET'])
+def get_poller_status():
+    """取得輪詢排程器狀態"""
+    return jsonify({
+        "status": "success",
+        "data": current_app.device_poller.get_summary()
+    }), 200
+
+@device_poller_bp.route('/latest', methods=['GET'])
+def get_latest():
+    """取得所有設備最新的輪詢資料"""
+    poller = current_app.device_poller
+    data = {}
+    for device_type in poller.get_summary()["devices"]:
+        latest = poller.get_latest(device_type)
+        if latest is not None:
+            data[device_type] = latest
+    return jsonify({"status": "success", "data": data}), 200
+
+@device_poller_bp.route('/interval', methods=['POST'])
+def set_interval():
+    """調整單一設備的輪詢週期"""
+    data = request.get_json() or {}
+    device_type = data.get('device_type')
+    interval = data.get('interval')
+
+    if not device_type or interval is None:
+        return jsonify({"status": "failure", "message": "需要提供 device_type 和 interval"}), 400
+
+    try:
+        current_app.device_poller.set_interval(device_type, interval)
+        return jsonify({
+            "status": "success",
+            "message": f"{device_type} 輪詢週期已設為 {float(interval)} 秒"
+        }), 200
+    except KeyError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
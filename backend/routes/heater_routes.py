@@ -8,6 +8,33 @@ from flask_jwt_extended import get_jwt_identity
 modbus_service = ModbusService()
 heater_bp = Blueprint("heater", __name__)
 
+def poll_status():
+    """供輪詢排程器使用，未連線時回傳 None"""
+    if not modbus_service.client:
+        return None
+    data = modbus_service.read_modbus_data()
+    if data is None:
+        return None
+    return data["data"]
+
+def apply_recipe(recipe):
+    """供配方套用引擎使用: 依小數點設定換算溫度後寫入 SV 並讀回確認，未連線時回傳 None"""
+    if not modbus_service.client:
+        return None
+    decimal_point = modbus_service.read_register(0x0019) or 0
+    sv = int(round(float(recipe.temperature) * (10 if decimal_point == 1 else 1)))
+
+    result = modbus_service.update_modbus_data(ModbusData(SV=sv))
+    if result.get("status") != "success":
+        raise Exception(result.get("message", "設定溫度失敗"))
+    readback = modbus_service.read_register(0x0023)
+    return {
+        "setpoint": float(recipe.temperature),
+        "raw_value": sv,
+        "readback": readback,
+        "confirmed": readback == sv
+    }
+
 @heater_bp.route("/connect", methods=["POST"])
 def connect():
     """ 連線到 Modbus 設備 """
@@ -105,6 +132,7 @@ def disconnect():
     
     """ 斷開 Modbus 連線 """
     modbus_service.disconnect()
+    current_app.device_poller.invalidate('heater')
     return jsonify({"status": "success"})
 
 @heater_bp.route("/status", methods=["GET"])
@@ -121,7 +149,9 @@ def get_modbus_data():
                 "message": "Heater尚未連線"
             }), 400
             
-        data = modbus_service.read_modbus_data()
+        # 優先使用排程器最新的資料，避免每個前端分頁都各自讀取串口
+        cached = current_app.device_poller.get_latest('heater')
+        data = {"data": cached, "status": "success"} if cached is not None else modbus_service.read_modbus_data()
         if data is None:
             current_app.emit_device_status('heater', 'connected', {
                 "message": "Heater讀取失敗",
@@ -157,6 +187,8 @@ def update_modbus_data():
         # 只傳入存在的參數
         modbus_data = ModbusData(**{k: v for k, v in data.items() if k in ModbusData.__annotations__})
         result = modbus_service.update_modbus_data(modbus_data)
+        # 部分參數寫入失敗時其他參數可能已寫入，一律捨棄排程器的舊資料
+        current_app.device_poller.invalidate('heater')
 
         current_app.emit_device_status('heater', 'connected', {
             "message": "Heater修改成功",
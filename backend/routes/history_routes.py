@@ -0,0 +1,58 @@
+from flask import Blueprint, jsonify, request, current_app
+from datetime import datetime, timezone, timedelta
+
+history_bp = Blueprint('history', __name__)
+
+# 未指定時區的時間視為台灣時間，與連線日誌相同
+TW_TIMEZONE = timezone(timedelta(hours=8))
+
+def parse_timestamp(value):
+    """接受 Unix 時間 (秒) 或 ISO 8601 時間，空值回傳 None"""
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"時間格式錯誤: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=TW_TIMEZONE)
+    return parsed.timestamp()
+
+@history_bp.route('/', methods=['GET'])
+def list_channels():
+    """列出所有設備的歷史通道與最新的值"""
+    return jsonify({
+        "status": "success",
+        "data": current_app.historian.list_channels()
+    }), 200
+
+@history_bp.route('/status', methods=['GET'])
+def get_historian_status():
+    """取得歷史資料記錄器狀態"""
+    return jsonify({
+        "status": "success",
+        "data": current_app.historian.get_stats()
+    }), 200
+
+@history_bp.route('/<device>/<path:channel>', methods=['GET'])
+def get_history(device, channel):
+    """取得單一通道的歷史序列，點數超過 max_points 時在後端降採樣"""
+    try:
+        start = parse_timestamp(request.args.get('from'))
+        end = parse_timestamp(request.args.get('to'))
+        max_points = int(request.args.get('max_points', current_app.config.get("HISTORIAN_MAX_POINTS", 2000)))
+        if max_points < 0:
+            raise ValueError("max_points 不可小於 0")
+        if start is not None and end is not None and end <= start:
+            raise ValueError("to 必須晚於 from")
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+
+    data = current_app.historian.query(device, channel, start, end, max_points)
+    if data is None:
+        return jsonify({"status": "failure", "message": f"找不到 {device} 的通道 {channel}"}), 404
+    return jsonify({"status": "success", "data": data}), 200
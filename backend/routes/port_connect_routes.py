@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify
 from services.port_connect_services import PortScannerService
+from serial_transport import SerialTransportService
 
 port_scanner_bp = Blueprint('port_scanner', __name__)
 scanner_service = PortScannerService()
@@ -12,4 +13,12 @@ async def get_ports():
 @port_scanner_bp.route('/ports/<port_name>', methods=['GET'])
 async def check_port(port_name):
     """檢查特定串口的狀態"""
-    return await scanner_service.check_port_status(port_name)
\ No newline at end of file
+    return await scanner_service.check_port_status(port_name)
+
+@port_scanner_bp.route('/metrics', methods=['GET'])
+def get_port_metrics():
+    """獲取各串口工作執行緒的佇列指標"""
+    return jsonify({
+        "status": "success",
+        "data": SerialTransportService.get_metrics()
+    }), 200
@@ -1,14 +1,43 @@
 from flask import Blueprint, request, jsonify, current_app
-import asyncio
 import traceback
 from services.power_supply_services import SpikService
+from async_loop import background_loop
+from services.recipe_apply_services import within
 
 power_supply_service = SpikService()
 
 power_supply_bp = Blueprint("power_supply", __name__)
 
+def poll_status():
+    """供輪詢排程器使用，未連線時回傳 None"""
+    if not power_supply_service.client or not power_supply_service.client.is_open:
+        return None
+    return background_loop.run(power_supply_service.read_status())
+
+def apply_recipe(recipe):
+    """
+    供配方套用引擎使用: 寫入電壓並讀回確認，未連線時回傳 None；
+    與前端相同，DC1 升壓或 Power 開啟時不套用
+    """
+    if not power_supply_service.client or not power_supply_service.client.is_open:
+        return None
+    status = background_loop.run(power_supply_service.read_status())
+    if status.get("dc1_on") or status.get("power_on"):
+        return {"skipped": True, "message": "DC1 升壓或 Power 開啟中，不套用電壓"}
+
+    voltage = float(recipe.voltage)
+    result, status_code = background_loop.run(power_supply_service.write_voltage(voltage))
+    if status_code != 200:
+        raise Exception(result.get("message", "寫入電壓失敗"))
+    readback, err = background_loop.run(power_supply_service.read_voltage())
+    return {
+        "setpoint": voltage,
+        "readback": readback,
+        "confirmed": err == 1 and within(int(voltage * 5) * 0.2, readback, 1e-6)  # 內部值解析度為 0.2 V
+    }
+
 @power_supply_bp.route("/connect", methods=["POST"])
-async def connect_device():
+def connect_device():
     try:
         # 使用 get_json() 並提供默認值和強制解析
         data = request.get_json(force=True, silent=True) or {}
@@ -18,7 +47,7 @@ async def connect_device():
         power_supply_service.device.port = port
         power_supply_service.device.baudrate = baudrate
         
-        connected = await asyncio.to_thread(power_supply_service.connect)
+        connected = power_supply_service.connect()
         if connected:
             current_app.emit_device_status('powersupply', 'connected', {
                 "message": f"脈衝電源控制器連線成功，{port}",
@@ -46,10 +75,11 @@ async def connect_device():
         }), 500
 
 @power_supply_bp.route("/disconnect", methods=["POST"])
-async def disconnect_device():
+def disconnect_device():
     try:
-        disconnected = await asyncio.to_thread(power_supply_service.disconnect)
+        disconnected = power_supply_service.disconnect()
         if disconnected:
+            current_app.device_poller.invalidate('powersupply')
             current_app.emit_device_status('powersupply', 'disconnected', {
                 "message": f"脈衝電源控制器中斷連線成功",
                 "status_data": 'connected'
@@ -73,7 +103,7 @@ async def disconnect_device():
         }), 500
 
 @power_supply_bp.route("/write_voltage", methods=["POST"])
-async def write_voltage_route():
+def write_voltage_route():
     try:
         data = request.get_json(force=True, silent=True) or {}
         voltage = data.get("voltage")
@@ -81,7 +111,9 @@ async def write_voltage_route():
         if voltage is None:
             return jsonify({"status": "failure", "message": "請提供 voltage 值"}), 400
         
-        result, status_code = await power_supply_service.write_voltage(float(voltage))
+        result, status_code = background_loop.run(power_supply_service.write_voltage(float(voltage)))
+        if status_code == 200:
+            current_app.device_poller.invalidate('powersupply')
         return jsonify(result), status_code
     except ValueError:
         return jsonify({"status": "failure", "message": "voltage 值必須為數字"}), 400
@@ -93,7 +125,7 @@ async def write_voltage_route():
         }), 500
 
 @power_supply_bp.route("/write_current", methods=["POST"])
-async def write_current_route():
+def write_current_route():
     try:
         data = request.get_json(force=True, silent=True) or {}
         current = data.get("current")
@@ -101,7 +133,9 @@ async def write_current_route():
         if current is None:
             return jsonify({"status": "failure", "message": "請提供 current 值"}), 400
         
-        result, status_code = await power_supply_service.write_current(float(current))
+        result, status_code = background_loop.run(power_supply_service.write_current(float(current)))
+        if status_code == 200:
+            current_app.device_poller.invalidate('powersupply')
         return jsonify(result), status_code
     except ValueError:
         return jsonify({"status": "failure", "message": "current 值必須為數字"}), 400
@@ -113,86 +147,94 @@ async def write_current_route():
         }), 500
 
 @power_supply_bp.route("/read_mode", methods=["GET"])
-async def read_mode_route():
-    mode, err = await power_supply_service.read_mode()
+def read_mode_route():
+    mode, err = background_loop.run(power_supply_service.read_mode())
     if err == 1:
         return jsonify({"status": "success", "mode": mode}), 200
     else:
         return jsonify({"status": "failure", "message": f"讀取 Mode 失敗，錯誤碼: {err}"}), 400
 
 @power_supply_bp.route("/read_voltage", methods=["GET"])
-async def read_voltage_route():
-    voltage, err = await power_supply_service.read_voltage()
+def read_voltage_route():
+    voltage, err = background_loop.run(power_supply_service.read_voltage())
     if err == 1:
         return jsonify({"status": "success", "voltage": voltage}), 200
     else:
         return jsonify({"status": "failure", "message": f"讀取電壓失敗，錯誤碼: {err}"}), 400
 
 @power_supply_bp.route("/read_current", methods=["GET"])
-async def read_current_route():
-    current, err = await power_supply_service.read_current()
+def read_current_route():
+    current, err = background_loop.run(power_supply_service.read_current())
     if err == 1:
         return jsonify({"status": "success", "current": current}), 200
     else:
         return jsonify({"status": "failure", "message": f"讀取電流失敗，錯誤碼: {err}"}), 400
 
 @power_supply_bp.route("/dc1_turn_on", methods=["POST"])
-async def turn_on_dc1():
+def turn_on_dc1():
     """
     開啟 DC1
     """
-    err = await power_supply_service.set_dc1_on()
+    err = background_loop.run(power_supply_service.set_dc1_on())
     if err == 1:
+        current_app.device_poller.invalidate('powersupply')
         return jsonify({"status": "success", "message": "DC1 已開啟"}), 200
     return jsonify({"status": "failure", "message": "DC1 開啟失敗"}), 400
 
 @power_supply_bp.route("/dc1_turn_off", methods=["POST"])
-async def turn_off_dc1():
+def turn_off_dc1():
     """
     關閉 DC1
     """
-    err = await power_supply_service.set_dc1_off()
+    err = background_loop.run(power_supply_service.set_dc1_off())
     if err == 1:
+        current_app.device_poller.invalidate('powersupply')
         return jsonify({"status": "success", "message": "DC1 已關閉"}), 200
     return jsonify({"status": "failure", "message": "DC1 關閉失敗"}), 400
 
 @power_supply_bp.route("/set_clear_error", methods=["POST"])
-async def clear_error():
+def clear_error():
     """
     清除error
     """
-    err = await power_supply_service.clear_error()
+    err = background_loop.run(power_supply_service.clear_error())
     if err == 1:
+        current_app.device_poller.invalidate('powersupply')
         return jsonify({"status": "success", "message": "error cleared"}), 200
     return jsonify({"status": "failure", "message": "error clear failed"}), 400
 
 @power_supply_bp.route("/power_on", methods=["POST"])
-async def power_on():
+def power_on():
     """
     開啟電源
     """
-    err = await power_supply_service.set_running_on()
+    err = background_loop.run(power_supply_service.set_running_on())
     if err == 1:
+        current_app.device_poller.invalidate('powersupply')
         return jsonify({"status": "success", "message": "電源已開啟"}), 200
     return jsonify({"status": "failure", "message": "電源開啟失敗"}), 400
 
 @power_supply_bp.route("/power_off", methods=["POST"])
-async def power_off():
+def power_off():
     """
     關閉電源
     """
-    err = await power_supply_service.set_running_off()
+    err = background_loop.run(power_supply_service.set_running_off())
     if err == 1:
+        current_app.device_poller.invalidate('powersupply')
         return jsonify({"status": "success", "message": "電源已關閉"}), 200
     return jsonify({"status": "failure", "message": "電源關閉失敗"}), 400
 
 @power_supply_bp.route("/status", methods=["GET"])
-async def status():
+def status():
     """
     讀取電源狀態
     """
     try:
-        status = await power_supply_service.read_status()
+        # 優先使用排程器最新的資料，避免每個前端分頁都各自讀取串口
+        status = current_app.device_poller.get_latest('powersupply')
+        if status is None:
+            status = background_loop.run(power_supply_service.read_status())
         current_app.emit_device_status('powersupply', 'connected', {
             "message": f"讀取脈衝電源供應器資料成功",
             "data": status,
@@ -1,33 +1,44 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, send_file
 from services.recipe_services import RecipeService
 import traceback
-import uuid
 
 recipe_bp = Blueprint('recipe', __name__)
 recipe_service = RecipeService()
+_last_broadcast_version = None
 
 @recipe_bp.route('/get_recipes', methods=['GET'])
 def get_recipes():
+    global _last_broadcast_version
     try:
+        # 服務層已快取驗證過、可直接序列化的清單
         recipes = recipe_service.get_all_recipes()
         
-        serializable_recipes = []
-        for recipe in recipes:
-            # 假設 recipe 是一個字典，其中某些值可能是 UUID
-            serializable_recipe = {}
-            for key, value in recipe.items():
-                if isinstance(value, uuid.UUID):
-                    serializable_recipe[key] = str(value)
-                else:
-                    serializable_recipe[key] = value
-            serializable_recipes.append(serializable_recipe)
+        # 配方有變更時才廣播給其他分頁，重複查詢不再每次送出全部配方
+        version = recipe_service.cache_version
+        if version != _last_broadcast_version:
+            _last_broadcast_version = version
+            current_app.emit_device_status('recipe', 'success', {
+                "message": '取得recipe資料成功',
+                "recipes": recipes
+            })
         
+        return jsonify({"status": "success", "data": recipes}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@recipe_bp.route('/reload', methods=['POST'])
+def reload_recipes():
+    """配方資料庫被其他程式修改後，捨棄快取重新讀取並廣播"""
+    global _last_broadcast_version
+    try:
+        recipes = recipe_service.reload()
+        _last_broadcast_version = recipe_service.cache_version
         current_app.emit_device_status('recipe', 'success', {
             "message": '取得recipe資料成功',
-            "recipes": serializable_recipes
+            "recipes": recipes
         })
-        
-        return jsonify({"status": "success", "data": serializable_recipes}), 200
+        return jsonify({"status": "success", "data": recipes}), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -49,3 +60,70 @@ def update_recipe(parameter_name):
         return jsonify({"status": "success", "data": updated_recipe}), 200
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
+
+@recipe_bp.route('/import_excel', methods=['POST'])
+def import_excel():
+    """
+    由 Excel 匯入配方，上傳檔案欄位為 file；沒有上傳檔案時匯入舊版的 recipes.xlsx
+    parameter_name 相同的配方會被覆寫
+    """
+    try:
+        upload = request.files.get('file')
+        source = upload.stream if upload else recipe_service.excel_path
+        result = recipe_service.import_excel(source)
+        return jsonify({
+            "status": "success",
+            "message": f"已匯入 {result['imported']} 筆配方",
+            "data": result
+        }), 200
+    except FileNotFoundError:
+        return jsonify({"status": "failure", "message": "找不到 recipes.xlsx，請上傳 Excel 檔案"}), 404
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@recipe_bp.route('/export_excel', methods=['GET'])
+def export_excel():
+    """將所有配方匯出成 Excel"""
+    try:
+        output = recipe_service.export_excel()
+        return send_file(
+            output,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name='recipes.xlsx'
+        )
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@recipe_bp.route('/<parameter_name>/apply', methods=['POST'])
+def apply_recipe(parameter_name):
+    """
+    將配方同時套用到所有已連線的設備 (主氣、載氣、CO2 雷射、加熱器、脈衝電源)，
+    各設備寫入後回讀確認，回傳每個設備的結果與耗時；可用 devices 指定只套用部分設備
+    """
+    data = request.get_json(silent=True) or {}
+    devices = data.get('devices')
+    try:
+        recipe = recipe_service.get_recipe(parameter_name)
+        if recipe is None:
+            return jsonify({"status": "failure", "message": f"找不到配方 {parameter_name}"}), 404
+
+        report = current_app.recipe_applier.apply(recipe, devices)
+
+        # 設定值已變更，讓輪詢排程器下一輪立即重新讀取
+        for device_type, result in report["devices"].items():
+            if result["status"] != "skipped":
+                current_app.device_poller.invalidate(device_type)
+
+        current_app.emit_device_status('recipe', 'applied', report)
+
+        if report["success"]:
+            return jsonify({"status": "success", "message": f"配方 {parameter_name} 套用成功", "data": report}), 200
+        return jsonify({"status": "failure", "message": f"配方 {parameter_name} 部分設備套用失敗", "data": report}), 500
+    except KeyError as e:
+        return jsonify({"status": "failure", "message": e.args[0]}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -7,6 +7,11 @@ robot_bp = Blueprint('robot', __name__, url_prefix='/api/robot')
 # 初始化服務
 robot_service = RobotArmService()
 
+def poll_status():
+    """供輪詢排程器使用，未連線或讀取失敗時回傳 None"""
+    success, _, data = robot_service.read_status(record_history=False)
+    return data if success else None
+
 @robot_bp.route('/connect', methods=['POST'])
 def connect():
     """連接機械手臂"""
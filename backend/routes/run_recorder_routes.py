@@ -0,0 +1,74 @@
+from flask import Blueprint, jsonify, request, current_app, send_file
+from routes.recipe_routes import recipe_service
+
+run_recorder_bp = Blueprint('run_recorder', __name__)
+
+@run_recorder_bp.route('/start', methods=['POST'])
+def start_run():
+    """開始錄製製程，所有已連線設備以共同時脈取樣"""
+    data = request.get_json(silent=True) or {}
+    recipe_name = data.get('recipe_name') or None
+
+    recipe = None
+    if recipe_name:
+        recipe_obj = recipe_service.get_recipe(recipe_name)
+        if recipe_obj is None:
+            return jsonify({"status": "failure", "message": f"找不到配方 {recipe_name}"}), 404
+        recipe = recipe_obj.to_dict()
+
+    try:
+        run = current_app.run_recorder.start(
+            recipe_name=recipe_name,
+            recipe=recipe,
+            interval=data.get('interval'),
+            note=data.get('note')
+        )
+    except RuntimeError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 409
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+
+    current_app.emit_device_status('run_recorder', 'started', run)
+    return jsonify({"status": "success", "message": f"製程 {run['run_id']} 開始錄製", "data": run}), 200
+
+@run_recorder_bp.route('/stop', methods=['POST'])
+def stop_run():
+    """停止錄製並寫出製程紀錄檔"""
+    try:
+        run = current_app.run_recorder.stop()
+    except RuntimeError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 409
+
+    current_app.emit_device_status('run_recorder', 'stopped', run)
+    status_code = 200 if run["status"] == 'completed' else 500
+    return jsonify({
+        "status": "success" if status_code == 200 else "failure",
+        "message": run["message"] or f"製程 {run['run_id']} 錄製完成",
+        "data": run
+    }), status_code
+
+@run_recorder_bp.route('/current', methods=['GET'])
+def get_current_run():
+    """取得錄製中的製程 (沒有時 data 為 null)"""
+    return jsonify({"status": "success", "data": current_app.run_recorder.get_current()}), 200
+
+@run_recorder_bp.route('/', methods=['GET'])
+def list_runs():
+    """列出製程紀錄 (由新到舊)，可依配方名稱篩選"""
+    runs = current_app.run_recorder.list_runs(request.args.get('recipe_name'))
+    return jsonify({"status": "success", "data": runs}), 200
+
+@run_recorder_bp.route('/<run_id>', methods=['GET'])
+def get_run(run_id):
+    record = current_app.run_recorder.get_run(run_id)
+    if record is None:
+        return jsonify({"status": "failure", "message": f"找不到製程 {run_id}"}), 404
+    return jsonify({"status": "success", "data": record.to_dict()}), 200
+
+@run_recorder_bp.route('/<run_id>/download', methods=['GET'])
+def download_run(run_id):
+    """下載製程紀錄檔 (Parquet，未安裝 pyarrow 時為 .npz)"""
+    record = current_app.run_recorder.get_run(run_id)
+    if record is None or not record.file_path:
+        return jsonify({"status": "failure", "message": f"製程 {run_id} 沒有紀錄檔"}), 404
+    return send_file(record.file_path, as_attachment=True, download_name=record.to_dict()["file_name"])
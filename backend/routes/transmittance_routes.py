@@ -1,5 +1,7 @@
-from flask import Blueprint, request, send_file, jsonify
+import io
+from flask import Blueprint, request, send_file, jsonify, current_app, Response
 from services.transmittance_services import TransmittanceService
+from txt_to_transmittance_data import AVAILABLE_STATS
 
 transmittance_bp = Blueprint('transmittance', __name__)
 
@@ -12,12 +14,30 @@ def get_transmittance():
         file_number = data.get('fileNumber')
         max_spectrum = data.get('maxSpectrum')
         min_spectrum = data.get('minSpectrum')
+        # 可選: 多個波長範圍 [{"minSpectrum": 400, "maxSpectrum": 700}, ...] (或 [[400, 700], ...]) 與統計量 ["mean", "std", ...]
+        windows = data.get('windows')
+        stats = data.get('stats')
         
         print(f"開始處理: {file_path}")
-        print(f"指定範圍: {min_spectrum} - {max_spectrum}")
+        print(f"指定範圍: {windows or f'{min_spectrum} - {max_spectrum}'}")
         print(f"group_number: {group_number}, file_number: {file_number}")
 
-        if not all([file_path, group_number, file_number, max_spectrum, min_spectrum]):
+        if windows:
+            try:
+                windows = [
+                    (float(window['minSpectrum']), float(window['maxSpectrum'])) if isinstance(window, dict)
+                    else (float(window[0]), float(window[1]))
+                    for window in windows
+                ]
+            except (KeyError, IndexError, TypeError, ValueError):
+                return jsonify({'error': 'windows 格式錯誤，需要 [{"minSpectrum": 數值, "maxSpectrum": 數值}] 或 [[最小值, 最大值]]'}), 400
+            if any(low >= high for low, high in windows):
+                return jsonify({'error': 'windows 的 minSpectrum 必須小於 maxSpectrum'}), 400
+            if stats and any(stat not in AVAILABLE_STATS for stat in stats):
+                return jsonify({'error': f'stats 只能是 {", ".join(AVAILABLE_STATS)}'}), 400
+            if not all([file_path, group_number, file_number]):
+                return jsonify({'error': '缺少必要參數'}), 400
+        elif not all([file_path, group_number, file_number, max_spectrum, min_spectrum]):
             return jsonify({'error': '缺少必要參數'}), 400
 
         averages_list = TransmittanceService.calculate_transmittance(
@@ -25,7 +45,9 @@ def get_transmittance():
             group_number=group_number,
             file_number=file_number,
             max_spectrum=max_spectrum,
-            min_spectrum=min_spectrum
+            min_spectrum=min_spectrum,
+            windows=windows,
+            stats=stats
         )
 
         return jsonify(averages_list)
@@ -33,6 +55,101 @@ def get_transmittance():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@transmittance_bp.route('/archive', methods=['GET'])
+def list_archives():
+    """列出已封存的光譜資料夾"""
+    try:
+        return jsonify({"status": "success", "data": TransmittanceService.list_archives()}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@transmittance_bp.route('/archive', methods=['POST'])
+def archive_folder():
+    """將資料夾的光譜轉成封存檔，之後 transmittanceData 會直接使用封存檔計算"""
+    data = request.get_json() or {}
+    file_path = data.get('filePath')
+    group_number = data.get('groupNumber')
+    file_number = data.get('fileNumber')
+
+    if not all([file_path, group_number, file_number]):
+        return jsonify({"status": "failure", "message": "缺少必要參數"}), 400
+
+    try:
+        archive = TransmittanceService.archive_folder(file_path, group_number, file_number)
+        return jsonify({
+            "status": "success",
+            "message": f"已封存 {archive['fileCount']} 個光譜",
+            "data": archive
+        }), 200
+    except FileNotFoundError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@transmittance_bp.route('/series', methods=['POST'])
+def get_series():
+    """
+    回傳 fileData 的序列資料供前端繪圖，可用 maxPoints 以 LTTB 降採樣；
+    format 為 binary 時回傳 float32 二進位資料
+    """
+    try:
+        data = request.get_json() or {}
+        file_data = data.get('fileData', [])
+        selected_files = data.get('selectedFiles', [])
+        fields = data.get('fields')
+        output_format = data.get('format', 'json')
+
+        try:
+            max_points = int(data.get('maxPoints') or 0)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'maxPoints 必須是整數'}), 400
+        if max_points < 0 or 0 < max_points < 3:
+            return jsonify({'error': 'maxPoints 至少為 3 (0 表示不降採樣)'}), 400
+        if output_format not in ('json', 'binary'):
+            return jsonify({'error': 'format 只能是 json 或 binary'}), 400
+
+        try:
+            result = TransmittanceService.build_series(file_data, selected_files, fields, max_points)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'數據格式錯誤: {e}'}), 400
+
+        if output_format == 'binary':
+            payload, layout = TransmittanceService.encode_series_binary(result)
+            response = Response(payload, mimetype='application/octet-stream')
+            response.headers['X-Series-Layout'] = layout
+            response.headers['X-Series-Total'] = str(result['total'])
+            response.headers['Access-Control-Expose-Headers'] = 'X-Series-Layout, X-Series-Total'
+            return response
+
+        file_data = result["fileData"]
+        return jsonify({
+            "total": result["total"],
+            "series": {
+                field: {
+                    "index": series["index"].tolist(),
+                    "fileNames": [file_data[i].get('fileName') for i in series["index"]],
+                    "values": series["values"].tolist()
+                }
+                for field, series in result["series"].items()
+            }
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _send_png(etag, png):
+    """回傳 PNG 並附上 ETag，相同參數再次請求時前端可帶 If-None-Match"""
+    response = send_file(io.BytesIO(png), mimetype='image/png')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
 @transmittance_bp.route('/transmittancePlot', methods=['POST'])
 def plot():
     try:
@@ -42,14 +159,18 @@ def plot():
         x_label = data.get('xLabel', 'File Name')
         y_label = data.get('yLabel', 'Transmittance %')
         
-        img = TransmittanceService.generate_plot(
+        etag = TransmittanceService.plot_etag(file_data, selected_files, x_label, y_label)
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+
+        etag, png = TransmittanceService.generate_plot(
             file_data=file_data,
             selected_files=selected_files,
             x_label=x_label,
             y_label=y_label
         )
         
-        return send_file(img, mimetype='image/png')
+        return _send_png(etag, png)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -60,8 +181,67 @@ def plot_filter():
         file_data = data.get('fileData', [])
         plot_flag = data.get('plotFlag', [])
         
-        img = TransmittanceService.generate_filter_plot(file_data, plot_flag)
+        etag = TransmittanceService.filter_plot_etag(file_data, plot_flag)
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+
+        etag, png = TransmittanceService.generate_filter_plot(file_data, plot_flag)
         
-        return send_file(img, mimetype='image/png')
+        return _send_png(etag, png)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@transmittance_bp.route('/watch', methods=['GET'])
+def list_watches():
+    """列出監看中的資料夾"""
+    return jsonify({
+        "status": "success",
+        "data": current_app.transmittance_watcher.list_watches()
+    }), 200
+
+@transmittance_bp.route('/watch/start', methods=['POST'])
+def start_watch():
+    """登記資料夾，之後新出現的光譜檔會以 transmittance_update 事件推送"""
+    data = request.get_json() or {}
+    file_path = data.get('filePath')
+    group_number = data.get('groupNumber')
+    file_number = data.get('fileNumber')
+    max_spectrum = data.get('maxSpectrum')
+    min_spectrum = data.get('minSpectrum')
+
+    if not all([file_path, group_number, file_number, max_spectrum, min_spectrum]):
+        return jsonify({"status": "failure", "message": "缺少必要參數"}), 400
+
+    try:
+        watch = current_app.transmittance_watcher.add_watch(
+            file_path, group_number, file_number, max_spectrum, min_spectrum
+        )
+        return jsonify({"status": "success", "message": f"開始監看 {file_path}", "data": watch}), 200
+    except FileNotFoundError as e:
+        return jsonify({"status": "failure", "message": str(e)}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@transmittance_bp.route('/watch/stop', methods=['POST'])
+def stop_watch():
+    """停止監看資料夾"""
+    data = request.get_json() or {}
+    file_path = data.get('filePath')
+    if not file_path:
+        return jsonify({"status": "failure", "message": "缺少 filePath"}), 400
+
+    if current_app.transmittance_watcher.remove_watch(file_path):
+        return jsonify({"status": "success", "message": f"已停止監看 {file_path}"}), 200
+    return jsonify({"status": "failure", "message": f"{file_path} 沒有在監看中"}), 404
+
+@transmittance_bp.route('/watch/series', methods=['GET'])
+def get_watch_series():
+    """取得監看資料夾目前累積的透射率序列，斷線重連後用來補齊"""
+    file_path = request.args.get('filePath')
+    if not file_path:
+        return jsonify({"status": "failure", "message": "缺少 filePath"}), 400
+
+    watch = current_app.transmittance_watcher.get_watch(file_path)
+    if watch is None:
+        return jsonify({"status": "failure", "message": f"{file_path} 沒有在監看中"}), 404
+    return jsonify({"status": "success", "data": watch}), 200
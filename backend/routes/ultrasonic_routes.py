@@ -7,6 +7,15 @@ from flask_jwt_extended import get_jwt_identity
 modbus_bp = Blueprint("ultrasonic", __name__)
 modbus_service = ModbusService()
 
+def poll_status():
+    """供輪詢排程器使用，未連線時回傳 None"""
+    if not modbus_service.device or not modbus_service.device.is_connected():
+        return None
+    result = modbus_service.get_status()
+    if result["status"] != "success":
+        return None
+    return result["data"]
+
 @modbus_bp.route("/connect", methods=["POST"])
 def connect_modbus() -> Dict[str, Any]:
     """API: 連接霧化器"""
@@ -119,6 +128,7 @@ def disconnect_modbus() -> Dict[str, Any]:
         current_user_id = None
     
     if result["status"] == "success":
+        current_app.device_poller.invalidate('ultrasonic')
         
         current_app.emit_device_status('ultrasonic', 'disconnected', {
             "message": f"霧化器中斷連線成功，{port}: {device_id}",
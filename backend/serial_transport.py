@@ -0,0 +1,178 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+# 指令優先權，數字越小越先執行
+PRIORITY_SAFETY = 0   # 安全指令 (關閉雷射、關閉電源、關閉閥門)
+PRIORITY_WRITE = 1    # 設定值寫入
+PRIORITY_READ = 2     # 狀態讀取
+
+DEFAULT_COMMAND_TIMEOUT = 5.0
+
+
+class SerialPortWorker:
+    """
+    單一串口的 I/O 工作執行緒
+    所有對該串口的讀寫都包成一個交易 (寫入 + 讀取) 排入優先佇列，
+    由同一條執行緒依序執行，避免不同 HTTP 執行緒之間讀寫交錯
+    """
+
+    def __init__(self, port: str):
+        self.port = port
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._stopped = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "max_queue_depth": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "total_exec_time": 0.0,
+            "max_exec_time": 0.0
+        }
+        self._thread = threading.Thread(target=self._run, name=f"serial-{port}", daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable[..., Any], *args, priority: int = PRIORITY_READ,
+               timeout: Optional[float] = DEFAULT_COMMAND_TIMEOUT, **kwargs) -> Future:
+        """排入一個串口交易，回傳 Future；超過 timeout 仍未開始執行的交易會被放棄"""
+        future: Future = Future()
+        if self._stopped.is_set():
+            future.set_exception(Exception(f"串口 {self.port} 已關閉"))
+            return future
+
+        now = time.monotonic()
+        deadline = now + timeout if timeout is not None else None
+        self._queue.put((priority, next(self._seq), (future, func, args, kwargs, now, deadline)))
+
+        with self._metrics_lock:
+            self._metrics["submitted"] += 1
+            self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self._queue.qsize())
+        return future
+
+    def call(self, func: Callable[..., Any], *args, priority: int = PRIORITY_READ,
+             timeout: Optional[float] = DEFAULT_COMMAND_TIMEOUT, **kwargs) -> Any:
+        """同步執行串口交易並等待結果"""
+        future = self.submit(func, *args, priority=priority, timeout=timeout, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._metrics_lock:
+                self._metrics["timed_out"] += 1
+            raise TimeoutError(f"串口 {self.port} 指令逾時 ({timeout} 秒)")
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        finished = metrics["completed"] + metrics["failed"]
+        return {
+            "port": self.port,
+            "running": self._thread.is_alive(),
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": metrics["max_queue_depth"],
+            "submitted": metrics["submitted"],
+            "completed": metrics["completed"],
+            "failed": metrics["failed"],
+            "timed_out": metrics["timed_out"],
+            "avg_wait_ms": round(metrics["total_wait_time"] / finished * 1000, 3) if finished else 0.0,
+            "max_wait_ms": round(metrics["max_wait_time"] * 1000, 3),
+            "avg_exec_ms": round(metrics["total_exec_time"] / finished * 1000, 3) if finished else 0.0,
+            "max_exec_ms": round(metrics["max_exec_time"] * 1000, 3)
+        }
+
+    def stop(self, timeout: float = 2.0):
+        """停止工作執行緒，尚未執行的交易全部以錯誤結束"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._queue.put((-1, next(self._seq), None))
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                break
+            self._execute(job)
+
+        # 清空佇列中剩下的交易
+        while True:
+            try:
+                _, _, job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None and job[0].set_running_or_notify_cancel():
+                job[0].set_exception(Exception(f"串口 {self.port} 已關閉"))
+
+    def _execute(self, job):
+        future, func, args, kwargs, enqueued_at, deadline = job
+        if not future.set_running_or_notify_cancel():
+            return
+
+        started_at = time.monotonic()
+        if deadline is not None and started_at > deadline:
+            with self._metrics_lock:
+                self._metrics["timed_out"] += 1
+            future.set_exception(TimeoutError(f"串口 {self.port} 指令在佇列中等待逾時"))
+            return
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._record(started_at - enqueued_at, time.monotonic() - started_at, success=False)
+            future.set_exception(e)
+        else:
+            self._record(started_at - enqueued_at, time.monotonic() - started_at, success=True)
+            future.set_result(result)
+
+    def _record(self, wait_time: float, exec_time: float, success: bool):
+        with self._metrics_lock:
+            self._metrics["completed" if success else "failed"] += 1
+            self._metrics["total_wait_time"] += wait_time
+            self._metrics["max_wait_time"] = max(self._metrics["max_wait_time"], wait_time)
+            self._metrics["total_exec_time"] += exec_time
+            self._metrics["max_exec_time"] = max(self._metrics["max_exec_time"], exec_time)
+
+
+class SerialTransportService:
+    """管理所有串口的工作執行緒，同一個 port 只會有一條執行緒"""
+
+    _workers: Dict[str, SerialPortWorker] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def open_worker(cls, port: str) -> SerialPortWorker:
+        """取得 (或建立) 指定串口的工作執行緒"""
+        with cls._lock:
+            worker = cls._workers.get(port)
+            if worker is None or not worker.get_metrics()["running"]:
+                worker = SerialPortWorker(port)
+                cls._workers[port] = worker
+            return worker
+
+    @classmethod
+    def close_worker(cls, port: str):
+        """停止並移除指定串口的工作執行緒"""
+        with cls._lock:
+            worker = cls._workers.pop(port, None)
+        if worker:
+            worker.stop()
+
+    @classmethod
+    def get_metrics(cls) -> Dict[str, Dict[str, Any]]:
+        """取得所有串口的佇列指標"""
+        with cls._lock:
+            workers = list(cls._workers.values())
+        return {worker.port: worker.get_metrics() for worker in workers}
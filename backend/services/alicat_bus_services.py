@@ -0,0 +1,110 @@
+import string
+import threading
+from typing import Any, Dict, List, Optional
+from models.alicat_model import FlowControllerModel
+
+
+class AlicatBusService:
+    """
+    多站號 Alicat 設備登錄表
+    同一個 RS-485 串口可掛載多個站號 (A~Z)，所有站號在一次輪詢中批次讀取：
+    同一串口的讀取一次全部排入工作執行緒，不同串口之間平行進行
+    """
+
+    VALID_ADDRESSES = set(string.ascii_uppercase)
+
+    def __init__(self):
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def device_key(port: str, address: str) -> str:
+        return f"{port}:{address}"
+
+    def add_device(self, port: str, address: str, name: Optional[str] = None) -> Dict[str, Any]:
+        """連接並登錄一個站號，回傳初始狀態"""
+        address = (address or "").upper()
+        if address not in self.VALID_ADDRESSES:
+            raise ValueError(f"站號必須是 A~Z: {address}")
+
+        key = self.device_key(port, address)
+        with self.lock:
+            if key in self.devices:
+                raise ValueError(f"{key} 已登錄")
+
+        model = FlowControllerModel(port, address)
+        initial_status = model.connect()
+
+        with self.lock:
+            self.devices[key] = {
+                "model": model,
+                "name": name or key
+            }
+        return initial_status
+
+    def remove_device(self, port: str, address: str) -> bool:
+        """斷線並移除站號"""
+        key = self.device_key(port, (address or "").upper())
+        with self.lock:
+            entry = self.devices.pop(key, None)
+        if entry is None:
+            return False
+        entry["model"].disconnect()
+        return True
+
+    def get_model(self, port: str, address: str) -> Optional[FlowControllerModel]:
+        with self.lock:
+            entry = self.devices.get(self.device_key(port, (address or "").upper()))
+        return entry["model"] if entry else None
+
+    def list_devices(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [
+                {
+                    "key": key,
+                    "name": entry["name"],
+                    "port": entry["model"].port,
+                    "address": entry["model"].address,
+                    "streaming": entry["model"].streaming
+                }
+                for key, entry in self.devices.items()
+            ]
+
+    def poll_all(self) -> Optional[Dict[str, Any]]:
+        """
+        一次輪詢所有站號，沒有登錄任何設備時回傳 None
+        先把所有讀取排入各串口的工作執行緒，再依序收集結果
+        """
+        with self.lock:
+            models = {key: entry["model"] for key, entry in self.devices.items()}
+        if not models:
+            return None
+
+        pending = {}
+        results: Dict[str, Any] = {}
+        for key, model in models.items():
+            try:
+                if model.streaming:
+                    results[key] = model.read_status()
+                else:
+                    pending[key] = (model, model.submit_status_read())
+            except Exception as e:
+                results[key] = {"error": str(e)}
+
+        for key, (model, future) in pending.items():
+            try:
+                results[key] = model.parse_status(future.result(timeout=model.timeout * 5))
+            except Exception as e:
+                results[key] = {"error": str(e)}
+        return results
+
+    def shutdown(self):
+        """斷開所有站號"""
+        with self.lock:
+            entries = list(self.devices.values())
+            self.devices.clear()
+        for entry in entries:
+            try:
+                entry["model"].disconnect()
+            except Exception as e:
+                print(f"斷開 Alicat 站號失敗: {e}")
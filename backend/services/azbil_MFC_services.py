@@ -1,6 +1,5 @@
 from models.azbil_MFC_model import AzbilMFC
 from typing import Optional, Dict, Any, Tuple
-import asyncio
 
 GAS_TYPE_MAP = {
     0: "用戶設定",
@@ -102,7 +101,6 @@ KEY_DIRECTION_MAP = {
 class AzbilMFCService:
     def __init__(self):
         self.device: Optional[AzbilMFC] = None
-        self.loop = asyncio.get_event_loop()
 
     async def connect(self, port: str, baudrate: int, device_id: int) -> Tuple[Dict[str, Any], int]:
         self.device = AzbilMFC(port, baudrate, device_id)
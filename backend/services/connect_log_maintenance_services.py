@@ -0,0 +1,235 @@
+import os
+import time
+import threading
+import traceback
+from datetime import date, datetime, timedelta, time as dt_time
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func
+from database import db
+from models.connect_log_model import ConnectionLog, ConnectionLogDaily
+
+# SQLite PRAGMA auto_vacuum 的值
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class ConnectionLogMaintenanceService:
+    """
+    連線日誌維護排程
+    超過 retention_days 天的原始日誌依 (日期, 設備) 彙總成 ConnectionLogDaily 後刪除，
+    再以 incremental VACUUM 歸還空間，長時間運作的實驗室電腦上資料庫不會無限制成長
+
+    每一天的彙總與刪除在同一個交易內完成，中途中斷也不會重複計算或遺失紀錄
+    """
+
+    def __init__(self, app, retention_days: int = 30, interval: float = 6 * 3600, initial_delay: float = 60.0):
+        self.app = app
+        self.retention_days = int(retention_days)
+        self.interval = float(interval)
+        self.initial_delay = float(initial_delay)
+
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Optional[float] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        """retention_days <= 0 時不啟動，原始日誌全部保留"""
+        if self.is_running() or self.retention_days <= 0:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="connection-log-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        self._thread = None
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self.is_running(),
+            "retention_days": self.retention_days,
+            "interval": self.interval,
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+            "last_error": self.last_error
+        }
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop_event.wait(delay):
+            delay = self.interval
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"連線日誌維護失敗: {e}")
+                traceback.print_exc()
+
+    def run_once(self, retention_days: Optional[int] = None) -> Dict[str, Any]:
+        """彙總並刪除過期的原始日誌，再整理資料庫檔案；同一時間只會執行一次"""
+        retention_days = self.retention_days if retention_days is None else int(retention_days)
+        if retention_days < 1:
+            raise ValueError("retention_days 必須大於 0")
+
+        with self._run_lock:
+            start = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    try:
+                        size_before = self._db_size()
+                        cutoff_day = ConnectionLog.get_tw_time().date() - timedelta(days=retention_days)
+                        days, deleted = self._rollup_before(cutoff_day)
+                        compaction = self._compact() if deleted else None
+                        result = {
+                            "cutoff": cutoff_day.strftime('%Y-%m-%d'),
+                            "days_rolled_up": days,
+                            "rows_deleted": deleted,
+                            "compaction": compaction,
+                            "size_before": size_before,
+                            "size_after": self._db_size(),
+                            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+                        }
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.last_run = time.time()
+            self.last_result = result
+            self.last_error = None
+            if deleted:
+                print(f"連線日誌維護完成: 彙總 {days} 天、刪除 {deleted} 筆原始日誌")
+            return result
+
+    def _rollup_before(self, cutoff_day: date):
+        """由最舊的一天開始，逐日彙總並刪除 cutoff_day 之前的原始日誌"""
+        cutoff = datetime.combine(cutoff_day, dt_time.min)
+        days = deleted = 0
+        while not self._stop_event.is_set():
+            first = db.session.query(func.min(ConnectionLog.connected_time))\
+                .filter(ConnectionLog.connected_time < cutoff)\
+                .scalar()
+            if first is None:
+                break
+            try:
+                deleted += self._rollup_day(first.date())
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            days += 1
+        return days, deleted
+
+    def _rollup_day(self, day: date) -> int:
+        day_start = datetime.combine(day, dt_time.min)
+        day_end = day_start + timedelta(days=1)
+        rows = db.session.query(
+            ConnectionLog.device_id, ConnectionLog.device_name,
+            ConnectionLog.status, ConnectionLog.connected_time
+        ).filter(
+            ConnectionLog.connected_time >= day_start,
+            ConnectionLog.connected_time < day_end
+        ).order_by(ConnectionLog.device_id, ConnectionLog.connected_time, ConnectionLog.id).all()
+
+        by_device: Dict[str, List[Any]] = {}
+        for row in rows:
+            by_device.setdefault(row.device_id, []).append(row)
+
+        for device_id, events in by_device.items():
+            previous = ConnectionLogDaily.query\
+                .filter(ConnectionLogDaily.device_id == device_id, ConnectionLogDaily.day < day)\
+                .order_by(ConnectionLogDaily.day.desc())\
+                .first()
+            still_open = bool(previous and previous.open_at_end)
+            if still_open:
+                # 中間沒有任何事件的日子整天都在連線中
+                gap_day = previous.day + timedelta(days=1)
+                while gap_day < day:
+                    db.session.add(ConnectionLogDaily(
+                        day=gap_day, device_id=device_id, device_name=previous.device_name,
+                        events=0, connects=0, disconnects=0, failures=0,
+                        connected_seconds=86400.0, open_at_end=True
+                    ))
+                    gap_day += timedelta(days=1)
+
+            summary = self.summarize(events, day_start, day_end, still_open)
+            record = ConnectionLogDaily.query.filter_by(day=day, device_id=device_id).first()
+            if record is None:
+                db.session.add(ConnectionLogDaily(day=day, device_id=device_id, **summary))
+            else:
+                record.device_name = summary["device_name"]
+                for field in ("events", "connects", "disconnects", "failures", "connected_seconds"):
+                    setattr(record, field, getattr(record, field) + summary[field])
+                record.open_at_end = summary["open_at_end"]
+
+        return ConnectionLog.query.filter(
+            ConnectionLog.connected_time >= day_start,
+            ConnectionLog.connected_time < day_end
+        ).delete(synchronize_session=False)
+
+    @staticmethod
+    def summarize(events, day_start: datetime, day_end: datetime, open_at_start: bool = False) -> Dict[str, Any]:
+        """
+        彙總單一設備一天內的事件 (依時間排序)
+        connected 到下一個 disconnected (或再次 connected) 之間算連線時間，
+        失敗的事件只計入 failures，不影響連線狀態；當天結束時仍連線的部分算到 0 點
+        """
+        summary = {
+            "device_name": events[-1].device_name if events else "",
+            "events": len(events), "connects": 0, "disconnects": 0, "failures": 0,
+            "connected_seconds": 0.0, "open_at_end": False
+        }
+        since = day_start if open_at_start else None
+        for event in events:
+            if 'failed' in event.status:
+                summary["failures"] += 1
+                continue
+            if event.status == 'connected':
+                summary["connects"] += 1
+                if since is not None:
+                    summary["connected_seconds"] += (event.connected_time - since).total_seconds()
+                since = event.connected_time
+            elif event.status == 'disconnected':
+                summary["disconnects"] += 1
+                if since is not None:
+                    summary["connected_seconds"] += (event.connected_time - since).total_seconds()
+                since = None
+        if since is not None:
+            summary["connected_seconds"] += (day_end - since).total_seconds()
+            summary["open_at_end"] = True
+        return summary
+
+    @staticmethod
+    def _db_size() -> Optional[int]:
+        path = db.engine.url.database
+        try:
+            return sum(os.path.getsize(file) for file in (path, f"{path}-wal") if os.path.exists(file))
+        except (OSError, TypeError):
+            return None
+
+    @staticmethod
+    def _compact() -> Dict[str, Any]:
+        """
+        歸還刪除後的空頁；資料庫尚未啟用 incremental auto_vacuum 時，
+        第一次會切換模式並執行一次完整 VACUUM，之後只需要 incremental_vacuum
+        """
+        with db.engine.connect() as connection:
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+            mode = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode != AUTO_VACUUM_INCREMENTAL:
+                connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+                connection.exec_driver_sql("VACUUM")
+                method = "vacuum"
+            else:
+                # incremental_vacuum 每釋放一頁回傳一列，要讀完才會全部執行
+                connection.exec_driver_sql("PRAGMA incremental_vacuum").fetchall()
+                method = "incremental_vacuum"
+            return {"method": method, "free_pages": free_pages}
@@ -1,20 +1,222 @@
 # services/connection_log_service.py
-from models.connect_log_model import ConnectionLog
+import json
+import time
+import queue
+import base64
+import threading
+import traceback
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import joinedload
+from models.connect_log_model import ConnectionLog, ConnectionLogDaily
 from database import db
 
+
+class ConnectionLogWriter:
+    """
+    連線日誌的背景寫入器
+    連線/斷線的路由只把日誌放進記憶體佇列就返回，不必等 SQLite 每次 commit 的 fsync；
+    背景執行緒每 flush_interval 秒或累積 batch_size 筆時，以單一交易批次寫入
+    佇列滿了 (例如大量重連) 或寫入器未啟動時，改回在呼叫端直接寫入；
+    批次寫入失敗時重試後改為逐筆寫入，日誌不會因為一次 commit 失敗而整批遺失
+    """
+
+    # 批次寫入失敗時的重試次數與間隔 (秒，逐次加長)
+    RETRY_ATTEMPTS = 3
+    RETRY_DELAY = 0.5
+
+    def __init__(self, flush_interval: float = 0.2, batch_size: int = 100, max_queue: int = 10000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._app = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_flush_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self, app, flush_interval: Optional[float] = None, batch_size: Optional[int] = None):
+        """以 app 的 context 啟動背景執行緒，重複呼叫不會啟動第二個"""
+        if self.is_running():
+            return
+        self._app = app
+        if flush_interval is not None:
+            self.flush_interval = float(flush_interval)
+        if batch_size is not None:
+            self.batch_size = max(int(batch_size), 1)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="connection-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止背景執行緒，佇列中剩下的日誌全部寫入後才返回"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        self._thread = None
+
+    def submit(self, entry: Dict[str, Any]) -> bool:
+        """放入佇列，寫入器未啟動或佇列已滿時回傳 False，由呼叫端直接寫入"""
+        if not self.is_running():
+            return False
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待目前已排入的日誌全部寫入，查詢日誌前呼叫以確保讀得到剛產生的紀錄"""
+        # 佇列空了不代表已寫入: 背景執行緒可能已取出一批、仍在收集或寫入中，所以一律排入標記等它處理到
+        if not self.is_running():
+            return True
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "running": self.is_running(),
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "flush_interval": self.flush_interval,
+                "batch_size": self.batch_size,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches,
+                "last_batch_size": self.last_batch_size,
+                "last_flush_ms": self.last_flush_ms,
+                "last_error": self.last_error
+            }
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    break
+                continue
+
+            # 收到第一筆後，在 flush_interval 內盡量收集同一批
+            batch: List[Dict[str, Any]] = []
+            markers: List[threading.Event] = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if self._stop_event.is_set():
+                    remaining = 0
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write_batch(batch)
+            for marker in markers:
+                marker.set()
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        """
+        以單一交易寫入一批；失敗 (例如 database is locked) 時稍後重試，
+        重試仍失敗則逐筆寫入，只有本身無法寫入的那幾筆會被記為 failed
+        """
+        start = time.perf_counter()
+        error = None
+        for attempt in range(self.RETRY_ATTEMPTS):
+            if attempt:
+                time.sleep(self.RETRY_DELAY * attempt)
+            try:
+                self._insert(batch)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                print(f"批次寫入連線日誌失敗 ({len(batch)} 筆，第 {attempt + 1} 次): {e}")
+
+        written = len(batch)
+        if error is not None:
+            written = 0
+            for entry in batch:
+                try:
+                    self._insert([entry])
+                    written += 1
+                except Exception as e:
+                    error = e
+                    print(f"寫入連線日誌失敗，已捨棄: {entry} ({e})")
+                    traceback.print_exc()
+
+        with self._stats_lock:
+            self.written += written
+            self.failed += len(batch) - written
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 1)
+            if error is not None:
+                self.last_error = str(error)
+
+    def _insert(self, rows: List[Dict[str, Any]]):
+        with self._app.app_context():
+            try:
+                db.session.execute(insert(ConnectionLog), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+
+connection_log_writer = ConnectionLogWriter()
+
+# 單頁筆數上限
+MAX_PAGE_SIZE = 1000
+
+
 class ConnectionLogService:
     @staticmethod
     def create_log(device_id, device_name, port, address, status, created_by=None):
+        """
+        建立連線日誌，時間在呼叫當下決定；寫入器啟動時只排入佇列，
+        回傳 (日誌欄位, None)，寫入器未啟動時直接寫入並回傳 (ConnectionLog, None)
+        """
+        entry = {
+            "device_id": device_id,
+            "device_name": device_name,
+            "port": port,
+            "address": address,
+            "status": status,
+            "created_by": created_by,
+            "connected_time": ConnectionLog.get_tw_time()
+        }
+        if connection_log_writer.submit(entry):
+            return entry, None
+
         print(f"正在創建連線日誌... 設備: {device_id}")  # 添加除錯訊息
         try:
-            log = ConnectionLog(
-                device_id=device_id,
-                device_name=device_name,
-                port=port,
-                address=address,
-                status=status,
-                created_by=created_by
-            )
+            log = ConnectionLog(**entry)
             db.session.add(log)
             db.session.commit()
             print(f"日誌創建成功，ID: {log.id}")  # 添加除錯訊息
@@ -24,20 +226,126 @@ class ConnectionLogService:
             print(f"日誌創建失敗: {str(e)}")  # 添加除錯訊息
             return None, str(e)
 
+    @staticmethod
+    def encode_cursor(log) -> str:
+        """以最後一筆的 (connected_time, id) 作為下一頁的游標"""
+        payload = json.dumps([log.connected_time.isoformat(), log.id])
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        try:
+            connected_time, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(connected_time), int(log_id)
+        except Exception:
+            raise ValueError("cursor 格式錯誤")
+
+    @staticmethod
+    def parse_time(value) -> Optional[datetime]:
+        """解析 YYYY-MM-DD HH:MM:SS 或 ISO 8601 時間，空值回傳 None"""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"時間格式錯誤: {value}")
+        # 資料庫內的時間為台灣時間、不含時區
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(ConnectionLog.get_tw_time().tzinfo).replace(tzinfo=None)
+        return parsed
+
+    @staticmethod
+    def _filtered_query(device_id=None, status=None, start=None, end=None):
+        query = ConnectionLog.query.options(joinedload(ConnectionLog.user))
+        if device_id:
+            query = query.filter(ConnectionLog.device_id == device_id)
+        if status:
+            query = query.filter(ConnectionLog.status == status)
+        if start is not None:
+            query = query.filter(ConnectionLog.connected_time >= start)
+        if end is not None:
+            query = query.filter(ConnectionLog.connected_time < end)
+        return query
+
+    @staticmethod
+    def _page(query, after=None, limit=100):
+        """由新到舊取一頁，after 為上一頁最後一筆的 (connected_time, id)"""
+        if after is not None:
+            query = query.filter(tuple_(ConnectionLog.connected_time, ConnectionLog.id) < tuple_(*after))
+        return query.order_by(ConnectionLog.connected_time.desc(), ConnectionLog.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def get_logs_page(device_id=None, status=None, start=None, end=None, cursor=None, limit=100):
+        """
+        以 (connected_time, id) 游標分頁查詢連線日誌，由新到舊
+        回傳 {"items": [...], "next_cursor": 下一頁游標或 None}；參數錯誤時拋出 ValueError
+        """
+        limit = int(limit)
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit 必須介於 1 到 {MAX_PAGE_SIZE}")
+        after = ConnectionLogService.decode_cursor(cursor) if cursor else None
+        query = ConnectionLogService._filtered_query(
+            device_id, status, ConnectionLogService.parse_time(start), ConnectionLogService.parse_time(end)
+        )
+
+        connection_log_writer.flush()
+        # 多取一筆判斷是否還有下一頁
+        logs = ConnectionLogService._page(query, after, limit + 1)
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+        return {
+            "items": [log.to_dict() for log in logs],
+            "next_cursor": ConnectionLogService.encode_cursor(logs[-1]) if has_more else None
+        }
+
+    @staticmethod
+    def iter_logs_ndjson(device_id=None, status=None, start=None, end=None, chunk_size=MAX_PAGE_SIZE) -> Iterator[str]:
+        """
+        逐批匯出符合條件的日誌，每行一筆 JSON (NDJSON)；
+        每批以游標接續查詢，不論範圍多大記憶體內最多只有一批
+        參數在第一次迭代前就驗證，錯誤時直接拋出 ValueError
+        """
+        query = ConnectionLogService._filtered_query(
+            device_id, status, ConnectionLogService.parse_time(start), ConnectionLogService.parse_time(end)
+        )
+        connection_log_writer.flush()
+
+        def generate():
+            after = None
+            while True:
+                logs = ConnectionLogService._page(query, after, chunk_size)
+                if not logs:
+                    break
+                yield "".join(json.dumps(log.to_dict(), ensure_ascii=False) + "\n" for log in logs)
+                if len(logs) < chunk_size:
+                    break
+                after = (logs[-1].connected_time, logs[-1].id)
+                db.session.expunge_all()
+
+        return generate()
+
+    @staticmethod
+    def get_daily_summaries(device_id=None, start=None, end=None):
+        """查詢已彙總的每日連線統計 (start、end 為 YYYY-MM-DD，含頭尾)，由新到舊"""
+        query = ConnectionLogDaily.query
+        if device_id:
+            query = query.filter(ConnectionLogDaily.device_id == device_id)
+        if start:
+            query = query.filter(ConnectionLogDaily.day >= ConnectionLogService.parse_time(start).date())
+        if end:
+            query = query.filter(ConnectionLogDaily.day <= ConnectionLogService.parse_time(end).date())
+        records = query.order_by(ConnectionLogDaily.day.desc(), ConnectionLogDaily.device_id).all()
+        return [record.to_dict() for record in records]
+
     @staticmethod
     def get_logs(device_id=None, status=None):
         """查詢連線日誌，可以根據設備ID和狀態篩選"""
         try:
-            query = ConnectionLog.query
-            
-            if device_id:
-                query = query.filter(ConnectionLog.device_id == device_id)
-            if status:
-                query = query.filter(ConnectionLog.status == status)
-                
+            connection_log_writer.flush()
+            query = ConnectionLogService._filtered_query(device_id, status)
             logs = query.order_by(ConnectionLog.connected_time.desc()).all()
             return [log.to_dict() for log in logs], None
-            
+
         except Exception as e:
             return None, str(e)
 
@@ -45,7 +353,9 @@ class ConnectionLogService:
     def get_device_logs(device_id, limit=10):
         """獲取特定設備的最近連線記錄"""
         try:
+            connection_log_writer.flush()
             logs = ConnectionLog.query\
+                .options(joinedload(ConnectionLog.user))\
                 .filter_by(device_id=device_id)\
                 .order_by(ConnectionLog.connected_time.desc())\
                 .limit(limit)\
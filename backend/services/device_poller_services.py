@@ -0,0 +1,207 @@
+import json
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class DevicePollerService:
+    """
+    設備輪詢排程器
+    由後端統一依各設備的週期讀取已連線的設備，並以單一 `device_status_update` 事件廣播，
+    前端開多少個分頁都不會增加串口的讀取次數
+    """
+
+    def __init__(self, socketio, intervals: Optional[Dict[str, float]] = None, tick: float = 0.2):
+        self.socketio = socketio
+        self.intervals: Dict[str, float] = dict(intervals or {})
+        self.default_interval = 3.0
+        self.tick = tick
+
+        self._readers: Dict[str, Callable[[], Optional[Dict[str, Any]]]] = {}
+        self._next_due: Dict[str, float] = {}
+        self._in_flight: Dict[str, Any] = {}
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._listeners: List[Callable[[Dict[str, Any], float], None]] = []
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, device_type: str, reader: Callable[[], Optional[Dict[str, Any]]], interval: Optional[float] = None):
+        """註冊設備讀取函數，reader 在設備未連線時應回傳 None"""
+        with self._lock:
+            self._readers[device_type] = reader
+            if interval is not None:
+                self.intervals[device_type] = float(interval)
+            self._next_due[device_type] = 0.0
+
+    def add_listener(self, listener: Callable[[Dict[str, Any], float], None]):
+        """註冊監聽函數，每輪有新資料時以 (更新的設備資料, 時間戳) 呼叫，例如歷史資料記錄器"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def get_interval(self, device_type: str) -> float:
+        return float(self.intervals.get(device_type, self.default_interval))
+
+    def set_interval(self, device_type: str, interval: float):
+        """調整單一設備的輪詢週期 (秒)"""
+        interval = float(interval)
+        if interval <= 0:
+            raise ValueError("輪詢週期必須大於 0")
+        with self._lock:
+            if device_type not in self._readers:
+                raise KeyError(f"未註冊的設備: {device_type}")
+            self.intervals[device_type] = interval
+            self._next_due[device_type] = min(self._next_due.get(device_type, 0.0), time.monotonic() + interval)
+
+    def get_latest(self, device_type: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        取得排程器最近一次讀到的資料
+        max_age 未指定時，以該設備輪詢週期的 1.5 倍作為有效期限
+        """
+        with self._lock:
+            entry = self._latest.get(device_type)
+        if not entry:
+            return None
+        if max_age is None:
+            max_age = self.get_interval(device_type) * 1.5
+        if time.monotonic() - entry["monotonic"] > max_age:
+            return None
+        return entry["data"]
+
+    def get_latest_entries(self) -> Dict[str, Dict[str, Any]]:
+        """取得所有設備仍在有效期限內的最新資料與讀取時間 {設備: {"data", "timestamp"}}"""
+        now = time.monotonic()
+        with self._lock:
+            entries = dict(self._latest)
+        return {
+            device_type: {"data": entry["data"], "timestamp": entry["timestamp"]}
+            for device_type, entry in entries.items()
+            if now - entry["monotonic"] <= self.get_interval(device_type) * 1.5
+        }
+
+    def invalidate(self, device_type: str):
+        """設備斷線或設定變更後清除快取，並讓下一輪立即重新讀取"""
+        with self._lock:
+            self._latest.pop(device_type, None)
+            if device_type in self._next_due:
+                self._next_due[device_type] = 0.0
+
+    def get_summary(self) -> Dict[str, Any]:
+        """回傳排程器狀態，供 API 查詢"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "running": self.is_running(),
+                "devices": {
+                    device_type: {
+                        "interval": self.get_interval(device_type),
+                        "last_update": self._latest[device_type]["timestamp"] if device_type in self._latest else None,
+                        "age": round(now - self._latest[device_type]["monotonic"], 3) if device_type in self._latest else None,
+                        "in_flight": device_type in self._in_flight,
+                    }
+                    for device_type in self._readers
+                }
+            }
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        """啟動背景輪詢執行緒"""
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self._readers), 1), thread_name_prefix="device-poller")
+        self._thread = threading.Thread(target=self._run, name="device-poller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止背景輪詢"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _read_device(self, device_type: str, reader: Callable[[], Optional[Dict[str, Any]]]):
+        try:
+            return reader()
+        except Exception as e:
+            print(f"輪詢 {device_type} 失敗: {e}")
+            traceback.print_exc()
+            return None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+
+            # 1. 派送到期的設備讀取 (上一輪還沒完成的設備不重複派送)
+            with self._lock:
+                due = [
+                    (device_type, reader)
+                    for device_type, reader in self._readers.items()
+                    if device_type not in self._in_flight and self._next_due.get(device_type, 0.0) <= now
+                ]
+                for device_type, reader in due:
+                    self._in_flight[device_type] = self._executor.submit(self._read_device, device_type, reader)
+                    self._next_due[device_type] = now + self.get_interval(device_type)
+
+            # 2. 收集已完成的讀取結果
+            updated = {}
+            with self._lock:
+                for device_type, future in list(self._in_flight.items()):
+                    if not future.done():
+                        continue
+                    del self._in_flight[device_type]
+                    data = future.result()
+                    if data is None:
+                        self._latest.pop(device_type, None)
+                        continue
+                    self._latest[device_type] = {
+                        "data": data,
+                        "timestamp": time.time(),
+                        "monotonic": time.monotonic()
+                    }
+                    updated[device_type] = data
+
+            # 3. 有更新才廣播一次合併後的狀態
+            if updated:
+                self._emit(updated)
+                self._notify(updated)
+
+            self._stop_event.wait(self.tick)
+
+    def _notify(self, updated: Dict[str, Any]):
+        with self._lock:
+            listeners = list(self._listeners)
+            timestamp = max(self._latest[device_type]["timestamp"] for device_type in updated)
+        for listener in listeners:
+            try:
+                listener(updated, timestamp)
+            except Exception as e:
+                print(f"輪詢監聽函數執行失敗: {e}")
+                traceback.print_exc()
+
+    def _emit(self, updated: Dict[str, Any]):
+        try:
+            with self._lock:
+                snapshot = {
+                    device_type: entry["data"] for device_type, entry in self._latest.items()
+                }
+            event_data = json.loads(json.dumps(snapshot, default=str))
+            self.socketio.emit('device_status_update', {
+                'device_type': 'all',
+                'status': 'polling',
+                'updated': sorted(updated.keys()),
+                'timestamp': time.time(),
+                'data': event_data
+            })
+        except Exception as e:
+            print(f"輪詢狀態廣播失敗: {e}")
+            traceback.print_exc()
@@ -0,0 +1,323 @@
+import time
+import threading
+import traceback
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from database import db
+from downsample import lttb_indices
+from models.history_model import HistoryChannel, HistorySample
+
+
+def flatten_numeric(data: Any, prefix: str = "") -> Dict[str, float]:
+    """
+    把輪詢資料攤平成 {通道名稱: 數值}，巢狀欄位以 `.` 連接 (例如 raw_status.status_register)；
+    布林值記為 0/1，字串等非數值欄位略過
+    """
+    channels: Dict[str, float] = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            channels.update(flatten_numeric(value, f"{prefix}{key}."))
+    elif isinstance(data, bool):
+        channels[prefix[:-1]] = float(data)
+    elif isinstance(data, (int, float, np.integer, np.floating)):
+        value = float(data)
+        if np.isfinite(value):
+            channels[prefix[:-1]] = value
+    return channels
+
+
+class RingBuffer:
+    """固定大小的 (時間, 數值) 環狀緩衝區，寫滿後覆蓋最舊的點"""
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self.timestamps = np.empty(self.capacity, dtype=np.float64)
+        self.values = np.empty(self.capacity, dtype=np.float64)
+        self.head = 0       # 下一個寫入位置
+        self.count = 0
+
+    def append(self, timestamp: float, value: float):
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def oldest(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        return float(self.timestamps[(self.head - self.count) % self.capacity])
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        if self.count == 0:
+            return None
+        index = (self.head - 1) % self.capacity
+        return float(self.timestamps[index]), float(self.values[index])
+
+    def snapshot(self, start: Optional[float] = None, end: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """依時間順序複製出 start <= t < end 的點"""
+        order = (np.arange(self.count) + self.head - self.count) % self.capacity
+        timestamps, values = self.timestamps[order], self.values[order]
+        low = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        high = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return timestamps[low:high], values[low:high]
+
+
+class ChannelState:
+    def __init__(self, capacity: int):
+        self.buffer = RingBuffer(capacity)
+        self.channel_id: Optional[int] = None
+        # 最後一個寫入磁碟的點，值沒變且未超過 heartbeat 秒時不重複寫入
+        self.last_persisted: Optional[Tuple[float, float]] = None
+
+
+class HistorianService:
+    """
+    設備歷史資料記錄器
+    由輪詢排程器取得每次讀到的資料，各通道最近的點放在 NumPy 環狀緩衝區，
+    背景執行緒每 flush_interval 秒把新的點批次附加到 SQLite；
+    值與上一次寫入相同時最多每 heartbeat 秒寫一次，設定值、開關狀態這類很少變動的通道不會塞滿資料庫
+    查詢時較舊的部分讀資料庫、最近的部分讀記憶體，再依 max_points 以 LTTB 降採樣
+    """
+
+    def __init__(self, app, buffer_size: int = 4096, flush_interval: float = 5.0,
+                 heartbeat: float = 60.0, retention_days: float = 7.0):
+        self.app = app
+        self.buffer_size = int(buffer_size)
+        self.flush_interval = float(flush_interval)
+        self.heartbeat = float(heartbeat)
+        self.retention_days = float(retention_days)
+
+        self._channels: Dict[Tuple[str, str], ChannelState] = {}
+        self._pending: List[Tuple[ChannelState, str, str, float, float]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_prune = 0.0
+        self.persisted = 0
+        self.last_error: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # 記錄
+    # ------------------------------------------------------------------
+    def record(self, device: str, data: Any, timestamp: Optional[float] = None):
+        """記錄一台設備一次讀到的資料"""
+        timestamp = time.time() if timestamp is None else float(timestamp)
+        channels = flatten_numeric(data)
+        with self._lock:
+            for channel, value in channels.items():
+                state = self._channels.get((device, channel))
+                if state is None:
+                    state = self._channels[(device, channel)] = ChannelState(self.buffer_size)
+                latest = state.buffer.latest()
+                if latest is not None and timestamp <= latest[0]:
+                    continue
+                state.buffer.append(timestamp, value)
+
+                persisted = state.last_persisted
+                if persisted is None or persisted[1] != value or timestamp - persisted[0] >= self.heartbeat:
+                    state.last_persisted = (timestamp, value)
+                    self._pending.append((state, device, channel, timestamp, value))
+
+    def record_poll(self, updated: Dict[str, Any], timestamp: float):
+        """輪詢排程器的監聽函數"""
+        for device, data in updated.items():
+            self.record(device, data, timestamp)
+
+    # ------------------------------------------------------------------
+    # 背景寫入
+    # ------------------------------------------------------------------
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="historian", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """停止背景執行緒並寫入剩下的點"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"歷史資料寫入失敗: {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self.retention_days > 0 and time.time() - self._last_prune >= 3600:
+                    self.prune()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"歷史資料寫入失敗: {e}")
+                traceback.print_exc()
+
+    def flush(self) -> int:
+        """把待寫入的點以單一交易附加到資料庫，回傳寫入筆數"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+
+            with self.app.app_context():
+                try:
+                    rows = []
+                    # 新通道的 id 在提交成功後才記到 ChannelState，失敗時不會留下已回滾的 id
+                    new_channels: Dict[Tuple[str, str], Tuple[ChannelState, int]] = {}
+                    for state, device, channel, timestamp, value in pending:
+                        channel_id = state.channel_id
+                        if channel_id is None:
+                            if (device, channel) not in new_channels:
+                                new_channels[(device, channel)] = (state, self._get_channel_id(device, channel))
+                            channel_id = new_channels[(device, channel)][1]
+                        rows.append({"channel_id": channel_id, "timestamp": timestamp, "value": value})
+                    db.session.execute(insert(HistorySample), rows)
+                    db.session.commit()
+                    for state, channel_id in new_channels.values():
+                        state.channel_id = channel_id
+                except Exception:
+                    db.session.rollback()
+                    # 寫入失敗的點放回佇列，下一輪再試
+                    with self._lock:
+                        self._pending[:0] = pending
+                    raise
+                finally:
+                    db.session.remove()
+            self.persisted += len(rows)
+            self.last_error = None
+            return len(rows)
+
+    @staticmethod
+    def _get_channel_id(device: str, channel: str) -> int:
+        record = HistoryChannel.query.filter_by(device=device, channel=channel).first()
+        if record is None:
+            record = HistoryChannel(device=device, channel=channel)
+            db.session.add(record)
+            db.session.flush()
+        return record.id
+
+    def prune(self) -> int:
+        """刪除超過保存天數的樣本"""
+        self._last_prune = time.time()
+        cutoff = time.time() - self.retention_days * 86400
+        with self.app.app_context():
+            try:
+                deleted = HistorySample.query.filter(HistorySample.timestamp < cutoff).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+        if deleted:
+            print(f"已刪除 {deleted} 筆過期的歷史資料")
+        return deleted
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+    def list_channels(self) -> Dict[str, Dict[str, Any]]:
+        """列出所有通道 (含只存在資料庫內的) 與記憶體內最新的值"""
+        devices: Dict[str, Dict[str, Any]] = {}
+        with self.app.app_context():
+            try:
+                for record in HistoryChannel.query.order_by(HistoryChannel.device, HistoryChannel.channel).all():
+                    devices.setdefault(record.device, {})[record.channel] = None
+            finally:
+                db.session.remove()
+        with self._lock:
+            for (device, channel), state in self._channels.items():
+                latest = state.buffer.latest()
+                devices.setdefault(device, {})[channel] = (
+                    {"timestamp": latest[0], "value": latest[1]} if latest else None
+                )
+        return devices
+
+    def query(self, device: str, channel: str, start: Optional[float] = None, end: Optional[float] = None,
+              max_points: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        取得 start <= t < end 的序列，通道不存在時回傳 None
+        max_points 大於 0 且點數超過時以 LTTB 降採樣，保留峰谷
+        """
+        with self._lock:
+            state = self._channels.get((device, channel))
+            if state is not None:
+                memory_start = state.buffer.oldest()
+                memory = state.buffer.snapshot(start, end)
+            else:
+                memory_start, memory = None, None
+
+        # 記憶體內沒有涵蓋的較早時段由資料庫補齊
+        disk = None
+        if memory_start is None or start is None or start < memory_start:
+            disk_end = end if memory_start is None else (memory_start if end is None else min(end, memory_start))
+            disk = self._query_disk(device, channel, start, disk_end)
+            if disk is None and state is None:
+                return None
+
+        parts = [part for part in (disk, memory) if part is not None]
+        if parts:
+            timestamps = np.concatenate([part[0] for part in parts])
+            values = np.concatenate([part[1] for part in parts])
+        else:
+            timestamps = values = np.empty(0)
+
+        total = len(timestamps)
+        if max_points and total > max_points:
+            keep = lttb_indices(timestamps, values, int(max_points))
+            timestamps, values = timestamps[keep], values[keep]
+
+        return {
+            "device": device,
+            "channel": channel,
+            "from": start,
+            "to": end,
+            "total_points": total,
+            "count": len(timestamps),
+            "timestamps": timestamps.tolist(),
+            "values": values.tolist()
+        }
+
+    def _query_disk(self, device: str, channel: str, start: Optional[float], end: Optional[float]):
+        """讀取資料庫內的樣本，通道不存在時回傳 None"""
+        self.flush()
+        with self.app.app_context():
+            try:
+                record = HistoryChannel.query.filter_by(device=device, channel=channel).first()
+                if record is None:
+                    return None
+                query = db.session.query(HistorySample.timestamp, HistorySample.value)\
+                    .filter(HistorySample.channel_id == record.id)
+                if start is not None:
+                    query = query.filter(HistorySample.timestamp >= start)
+                if end is not None:
+                    query = query.filter(HistorySample.timestamp < end)
+                rows = query.order_by(HistorySample.timestamp).all()
+            finally:
+                db.session.remove()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self.is_running(),
+                "channels": len(self._channels),
+                "pending": len(self._pending),
+                "persisted": self.persisted,
+                "buffer_size": self.buffer_size,
+                "flush_interval": self.flush_interval,
+                "heartbeat": self.heartbeat,
+                "retention_days": self.retention_days,
+                "last_error": self.last_error
+            }
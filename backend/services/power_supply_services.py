@@ -2,8 +2,10 @@ import time
 import asyncio
 import serial
 from typing import Optional
-import threading
 from models.power_supply_model import SpikDevice
+from async_loop import background_loop
+from protocol_codec import SpikCodec
+from serial_transport import SerialTransportService, PRIORITY_SAFETY, PRIORITY_READ, PRIORITY_WRITE
 
 MAX_RETRIES = 10
 
@@ -14,8 +16,10 @@ class SpikService:
     def __init__(self, port: str = "COM12", baudrate: int = 19200, timeout: float = 1.5):
         self.device = SpikDevice(port=port, baudrate=baudrate, timeout=timeout)
         self.client = None
-        # 建立一個 Lock，保證同一時間只有一個操作進行
-        self.lock = threading.Lock()
+        # 串口工作執行緒，保證同一時間只有一個 SPIK 交易進行
+        self.worker = None
+        # SPIK 幀編碼器 (只在串口工作執行緒上使用)
+        self.codec = SpikCodec()
 
     def connect(self) -> bool:
         try:
@@ -28,11 +32,12 @@ class SpikService:
                 timeout=self.device.timeout
             )
             self.device.client = self.client
+            self.worker = SerialTransportService.open_worker(self.device.port)
 
-            # 🔹 使用 asyncio.run() 來執行異步讀取電壓
-            voltage_data = asyncio.run(self.read_voltage())  
+            # 🔹 交給常駐的背景 event loop 執行異步讀取電壓
+            voltage_data = background_loop.run(self.read_voltage())
             voltage, err = voltage_data  # 解包返回的 (voltage, err) 
-            current_data = asyncio.run(self.read_current())
+            current_data = background_loop.run(self.read_current())
             current, err2 = current_data
 
             if err == 1:  # 讀取成功
@@ -43,27 +48,45 @@ class SpikService:
                 return True
             else:  # 讀取失敗
                 print(f"連接 {self.device.port} 但讀取失敗，錯誤碼: {err, err2}")
-                self.client.close()  # 關閉錯誤的 Port
+                self._close()  # 關閉錯誤的 Port
                 return False
 
         except Exception as e:
             print("Power supply 連線錯誤:", e)
             return False
 
-    def disconnect(self) -> bool:
+    def _close(self):
+        """停止串口工作執行緒並關閉串口"""
+        if self.worker:
+            SerialTransportService.close_worker(self.device.port)
+            self.worker = None
         if self.client and self.client.is_open:
             self.client.close()
+
+    def disconnect(self) -> bool:
+        if self.client and self.client.is_open:
+            self._close()
             return True
         return False
 
     #--------------------------------------------------
-    # 低層讀寫函式，所有操作都加上 Lock 保護
+    # 低層讀寫函式，所有操作都經由串口工作執行緒排隊
     #--------------------------------------------------
-    def spik_write(self, data):
+    def _call_worker(self, func, *args, priority=PRIORITY_READ, failure=-99):
+        """把一次 SPIK 交易交給串口工作執行緒執行"""
+        if self.worker is None:
+            print("❌ 串口未開啟")
+            return failure
+        try:
+            return self.worker.call(func, *args, priority=priority)
+        except Exception as ex:
+            print("❌ 串口交易失敗:", ex)
+            return failure
+
+    def spik_write(self, data, priority=PRIORITY_WRITE):
         """寫入命令，重試5次"""
         for _ in range(5):
-            with self.lock:
-                err = self._spik_writing(data)
+            err = self._call_worker(self._spik_writing, data, priority=priority, failure=-99)
             if err == 1:
                 return 1
             time_delay(50)
@@ -99,48 +122,12 @@ class SpikService:
             if 16 in in_bytes:
                 break
 
-        # 組合 outbyte2 (不同模式)
-        if data[0] == 1:
-            outbyte2 = bytearray(17)  # 設定模式 + ON/OFF
-            outbyte2[5] = 0
-            outbyte2[7] = 2
-            outbyte2[10] = 0
-            outbyte2[11] = data[1] & 0xFF  # 模式
-            outbyte2[12] = 0
-            outbyte2[13] = data[2] & 0xFF  # ON/OFF
-        elif data[0] == 2:
-            outbyte2 = bytearray(21)  # 設定時脈
-            outbyte2[5] = 4
-            outbyte2[7] = 4
-            outbyte2[10] = (data[1] >> 8) & 0xFF
-            outbyte2[11] = data[1] & 0xFF
-            outbyte2[12] = (data[2] >> 8) & 0xFF
-            outbyte2[13] = data[2] & 0xFF
-            outbyte2[14] = (data[3] >> 8) & 0xFF
-            outbyte2[15] = data[3] & 0xFF
-            outbyte2[16] = (data[4] >> 8) & 0xFF
-            outbyte2[17] = data[4] & 0xFF
-        elif data[0] == 3:
-            outbyte2 = bytearray(15)  # 設定單一寄存器
-            outbyte2[5] = data[1] & 0xFF  # 寄存器地址
-            outbyte2[7] = 1
-            outbyte2[10] = (data[2] >> 8) & 0xFF
-            outbyte2[11] = data[2] & 0xFF
-        else:
+        # 組合 outbyte2 (不同模式，含 DLE + ETX + BCC)
+        outbyte2 = self.codec.encode_write(data)
+        if outbyte2 is None:
             print("❌ 不支援的寫入類型:", data[0])
             return -99
 
-        # 設定固定欄位
-        outbyte2[0:5] = bytes([0, 0, 65, 68, 0])
-        outbyte2[6] = 0
-        outbyte2[8:10] = bytes([0xFF, 0xFF])
-        outbyte2[-3] = 16  # DLE
-        outbyte2[-2] = 3   # ETX
-        bcc = 0
-        for b in outbyte2[:-1]:
-            bcc ^= b
-        outbyte2[-1] = bcc
-
         try:
             self.client.write(outbyte2)
         except Exception as ex:
@@ -151,9 +138,8 @@ class SpikService:
 
     def spik_read(self, spik_address, valid_range=(0,4000)):
         for _ in range(12):
-            with self.lock:
-                result, err = self._spik_reading(spik_address)
-                print(result)
+            result, err = self._call_worker(self._spik_reading, spik_address, priority=PRIORITY_READ, failure=(0, -99))
+            print(result)
             if err == 1 and valid_range[0] <= result <= valid_range[1]:
                 return result, 1
             time_delay(500)
@@ -186,14 +172,7 @@ class SpikService:
             if 16 in in_bytes:
                 break
 
-        outbyte2 = bytearray(13)
-        outbyte2[0:6] = bytes([0, 0, 0x45, 0x44, 0, spik_address & 0xFF])
-        outbyte2[6:10] = bytes([0, 1, 0xFF, 0xFF])
-        outbyte2[10:12] = bytes([16, 3])
-        bcc = 0
-        for i in range(12):
-            bcc ^= outbyte2[i]
-        outbyte2[12] = bcc
+        outbyte2 = self.codec.encode_read(spik_address)
 
         try:
             self.client.reset_input_buffer()
@@ -237,13 +216,8 @@ class SpikService:
                 in_bytes2.extend(self.client.read(self.client.in_waiting))
                 break
         in_bytes.extend(in_bytes2)
-        total_count = len(in_bytes)
-        if total_count < 9:
-            return 0, -5
-        try:
-            result = in_bytes[total_count - 3] + (in_bytes[total_count - 4] << 8)
-        except Exception as ex:
-            print("解析回應錯誤:", ex)
+        result = SpikCodec.decode_read_value(in_bytes)
+        if result is None:
             return 0, -5
 
         try:
@@ -330,7 +304,7 @@ class SpikService:
         data[2] 表示 ON/OFF 狀態
         """
         # 此處假設使用 data = [1, 1, 1] 來表示「DC1 ON」
-        return self.spik_write([3, 1, 33])
+        return await asyncio.to_thread(self.spik_write, [3, 1, 33])
 
     async def set_dc1_off(self) -> int:
         """
@@ -338,20 +312,20 @@ class SpikService:
         data[1] 表示模式（例如：1 表示 Bipolar），
         data[2] 表示 ON/OFF 狀態
         """
-        return self.spik_write([3, 1, 32])
+        return await asyncio.to_thread(self.spik_write, [3, 1, 32], PRIORITY_SAFETY)
 
     async def set_running_on(self, mode: int=2) -> int:
         """
         設定運行狀態為 ON，並指定模式
         mode: 運行模式，例如 0x01 (Bipolar), 0x02 (Unipolar neg), 0x03 (Unipolar pos)
         """
-        return self.spik_write([1, mode, 2])
+        return await asyncio.to_thread(self.spik_write, [1, mode, 2])
 
     async def set_running_off(self, mode: int=2) -> int:
         """
         設定運行狀態為 OFF，並指定模式
         """
-        return self.spik_write([1, mode, 1])
+        return await asyncio.to_thread(self.spik_write, [1, mode, 1], PRIORITY_SAFETY)
 
     async def clear_error(self) -> dict:
         """
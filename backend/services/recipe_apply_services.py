@@ -0,0 +1,122 @@
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+def within(target: float, value: Optional[float], tolerance: float) -> bool:
+    """回讀值與設定值的差距是否在容許範圍內"""
+    return value is not None and abs(float(value) - float(target)) <= tolerance
+
+
+class RecipeApplyService:
+    """
+    配方套用引擎
+    各設備在不同的串口上，設定值同時送出並各自回讀確認，
+    套用時間為最慢設備的時間，而不是所有設備時間的總和
+
+    applier(recipe) 的回傳值:
+    - None: 設備未連線，略過
+    - {"skipped": True, "message": ...}: 設備狀態不允許套用，略過
+    - {"setpoint": ..., "readback": ..., "confirmed": bool, ...}: 已寫入並回讀
+    寫入失敗時直接拋出例外
+    """
+
+    def __init__(self, timeout: float = 15.0):
+        self.timeout = timeout
+        self._appliers: Dict[str, Callable[[Any], Optional[Dict[str, Any]]]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 同一時間只套用一個配方，避免兩個配方的設定值交錯寫入
+        self._apply_lock = threading.Lock()
+
+    def register(self, device_type: str, applier: Callable[[Any], Optional[Dict[str, Any]]]):
+        with self._lock:
+            self._appliers[device_type] = applier
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def get_devices(self):
+        with self._lock:
+            return list(self._appliers)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(len(self._appliers), 1),
+                    thread_name_prefix="recipe-apply"
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    @staticmethod
+    def _run_applier(device_type: str, applier, recipe) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            result = applier(recipe)
+            if result is None:
+                report = {"status": "skipped", "message": "設備未連線"}
+            elif result.pop("skipped", False):
+                report = {"status": "skipped", **result}
+            else:
+                confirmed = result.get("confirmed", True)
+                report = {
+                    "status": "success" if confirmed else "failure",
+                    **result
+                }
+                if not confirmed:
+                    report.setdefault("message", "回讀值與設定值不符")
+        except Exception as e:
+            print(f"套用配方到 {device_type} 失敗: {e}")
+            traceback.print_exc()
+            report = {"status": "failure", "message": str(e)}
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return report
+
+    def apply(self, recipe, devices: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """同時套用到所有 (或指定的) 設備，回傳各設備的結果與耗時"""
+        with self._lock:
+            appliers = dict(self._appliers)
+        if devices is not None:
+            devices = list(devices)
+            unknown = [device for device in devices if device not in appliers]
+            if unknown:
+                raise KeyError(f"未註冊的設備: {', '.join(unknown)}")
+            appliers = {device: appliers[device] for device in devices}
+
+        with self._apply_lock:
+            start = time.perf_counter()
+            executor = self._get_executor()
+            futures = {
+                device_type: executor.submit(self._run_applier, device_type, applier, recipe)
+                for device_type, applier in appliers.items()
+            }
+
+            results = {}
+            deadline = time.monotonic() + self.timeout
+            for device_type, future in futures.items():
+                try:
+                    results[device_type] = future.result(timeout=max(deadline - time.monotonic(), 0))
+                except FutureTimeoutError:
+                    results[device_type] = {
+                        "status": "failure",
+                        "message": f"超過 {self.timeout} 秒仍未完成",
+                        "elapsed_ms": round(self.timeout * 1000, 1)
+                    }
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+
+        return {
+            "parameter_name": recipe.parameter_name,
+            "elapsed_ms": elapsed_ms,
+            "sequential_ms": round(sum(result["elapsed_ms"] for result in results.values()), 1),
+            "success": all(result["status"] != "failure" for result in results.values()),
+            "devices": results
+        }
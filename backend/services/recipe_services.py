@@ -1,90 +1,204 @@
+import io
 import os
+import math
+import threading
 import pandas as pd
-from datetime import datetime
 
-from models.recipe_model import Recipe
+from database import db
+from models.recipe_model import Recipe, RecipeRecord
+
+# 匯出 Excel 的欄位順序
+EXCEL_COLUMNS = [
+    "parameter_name", "main_gas_flow", "main_gas",
+    "carrier_gas_flow", "carrier_gas", "laser_power",
+    "temperature", "voltage", "created_time", "created_by",
+    "last_modified", "modified_by", "is_active",
+    "description", "notes", "version", "id"
+]
 
 class RecipeService:
     def __init__(self):
-        # 確保 `recipes.xlsx` 位於可寫入的 `process.resourcesPath`
+        # 舊版存放配方的 `recipes.xlsx`，資料表是空的時候會自動匯入一次
         self.excel_path = os.path.join(os.path.dirname(__file__), '..', 'recipes.xlsx')
-        self._ensure_excel_exists()
-
-    def _ensure_excel_exists(self):
-        if not os.path.exists(self.excel_path):
-            print(f"創建新的 Excel 檔案: {self.excel_path}")
-            df = pd.DataFrame(columns=["ID", "Name", "Ingredients"])
-            df.to_excel(self.excel_path, index=False)  # ✅ 確保只在檔案不存在時寫入
-        else:
-            print(f"Excel 檔案已存在: {self.excel_path}")
-            
-    def _create_empty_excel(self):
-        # """若無檔案則初始化一個空的 DataFrame，並寫入指定的欄位。"""
-        columns = [
-            "parameter_name", "main_gas_flow", "main_gas", 
-            "carrier_gas_flow", "carrier_gas", "laser_power", 
-            "temperature", "voltage", "created_time", "created_by",
-            "last_modified", "modified_by", "is_active", 
-            "description", "notes", "version", "id"
-        ]
-        df = pd.DataFrame(columns=columns)
-        df.to_excel(self.excel_path, index=False)
+        self._legacy_checked = False
+        self._legacy_lock = threading.Lock()
+
+        # 已驗證、可直接序列化的配方清單快取: (版本, 清單)
+        # 版本為本服務的寫入次數；其他程式直接修改資料庫時，需呼叫 reload (POST /reload) 重新讀取
+        self._cache = None
+        self._generation = 0
+        self._load_lock = threading.Lock()
+
+    def _ensure_legacy_imported(self):
+        """第一次使用時，若資料表沒有配方而 recipes.xlsx 有，先把舊資料匯入"""
+        if self._legacy_checked:
+            return
+        with self._legacy_lock:
+            if self._legacy_checked:
+                return
+            if os.path.exists(self.excel_path) and RecipeRecord.query.first() is None:
+                try:
+                    result = self.import_excel(self.excel_path)
+                    print(f"已從 {self.excel_path} 匯入 {result['imported']} 筆配方")
+                except Exception as e:
+                    print(f"匯入舊版 recipes.xlsx 失敗: {e}")
+            self._legacy_checked = True
+
+    def _current_version(self):
+        return self._generation
+
+    @property
+    def cache_version(self):
+        """目前快取的版本，配方有變更時才會不同"""
+        cache = self._cache
+        return cache[0] if cache else None
+
+    def invalidate_cache(self):
+        self._generation += 1
+
+    def reload(self):
+        """捨棄快取並重新讀取配方，供資料庫被其他程式修改後使用"""
+        self.invalidate_cache()
+        return self.get_all_recipes()
 
     def get_all_recipes(self):
-        df = pd.read_excel(self.excel_path, dtype=str)   # 全部先讀字串
-        raw_records = df.to_dict("records")
-        
+        """
+        回傳配方清單 (已驗證、可直接 jsonify)，版本相同時直接使用記憶體內的清單；
+        多個請求同時遇到快取失效時只有一個會讀取資料庫，其他等待同一份結果
+        回傳的清單為共用物件，呼叫端不可修改
+        """
+        self._ensure_legacy_imported()
+        cache = self._cache
+        if cache is not None and cache[0] == self._current_version():
+            return cache[1]
+
+        with self._load_lock:
+            version = self._current_version()
+            cache = self._cache
+            if cache is not None and cache[0] == version:
+                return cache[1]
+            recipes = self._load_recipes()
+            self._cache = (version, recipes)
+            return recipes
+
+    @staticmethod
+    def _load_recipes():
+        records = RecipeRecord.query.order_by(RecipeRecord.created_time).all()
+
         converted_records = []
-        for row in raw_records:
-            # 用 Recipe Model 驗證並轉型（若有欄位不合，會在這裡報錯）
-            recipe_obj = Recipe(**row)
+        for record in records:
+            recipe_obj = record.to_recipe()
             converted_records.append(recipe_obj.dict())
+            converted_records[-1]["id"] = str(recipe_obj.id) if recipe_obj.id else None
             # 將 created_time 轉成 YYYY-MM-DD HH:mm:ss 格式
             converted_records[-1]["created_time"] = recipe_obj.created_time.strftime("%Y-%m-%d %H:%M:%S")
-        
+
         return converted_records
 
+    def get_recipe(self, parameter_name):
+        """依 parameter_name 取得單一配方 (Recipe)，找不到回傳 None"""
+        self._ensure_legacy_imported()
+        record = RecipeRecord.query.filter_by(parameter_name=parameter_name).first()
+        return record.to_recipe() if record else None
+
     def add_recipe(self, recipe_data):
         # """
-        # 新增一筆配方。
-        # recipe_data 通常直接是 JSON (dict)，可考慮在此利用 Recipe 驗證/轉換。
+        # 新增一筆配方，先經過 Recipe 驗證，只寫入這一筆
         # """
-        # 先做資料驗證
+        self._ensure_legacy_imported()
         recipe = Recipe(**recipe_data)
-        row_dict = recipe.to_dict()
+        if RecipeRecord.query.filter_by(parameter_name=recipe.parameter_name).first() is not None:
+            raise ValueError(f"Recipe with parameter_name={recipe.parameter_name} already exists.")
 
-        # 讀取 excel，再 append
-        df = pd.read_excel(self.excel_path)
-        # append 在新版 pandas 已較不建議，可用 concat
-        df = pd.concat([df, pd.DataFrame([row_dict])], ignore_index=True)
-        #　create_time 為當下時間
-        df.to_excel(self.excel_path, index=False)
+        try:
+            db.session.add(RecipeRecord.from_recipe(recipe))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            self.invalidate_cache()
 
-        return row_dict
+        return recipe.to_dict()
 
     def update_recipe(self, parameter_name, recipe_data):
         # """
-        # 依照 parameter_name 更新一筆資料。 
+        # 依照 parameter_name 更新一筆資料。
         # 如果找不到，就視需求看要拋錯或是直接回傳 None 表示沒更新到。
         # """
-        df = pd.read_excel(self.excel_path)
-        # 找出目標列
-        mask = df['parameter_name'] == parameter_name
-        if not mask.any():
+        self._ensure_legacy_imported()
+        record = RecipeRecord.query.filter_by(parameter_name=parameter_name).first()
+        if record is None:
             raise ValueError(f"Recipe with parameter_name={parameter_name} not found.")
 
-        # 先將舊資料讀出，做合併
-        old_data = df[mask].to_dict('records')[0]
-        # 合併欄位，更新時間
-        old_recipe = Recipe(**old_data)
+        # 合併欄位後重新驗證，更新時間
+        old_recipe = record.to_recipe()
         old_recipe.update(recipe_data)    # 這會更新 last_modified
-        # 假如要更新 modified_by，可在外面傳入
-        # old_recipe.modified_by = recipe_data.get('modified_by', 'system')
+        recipe = Recipe(**old_recipe.model_dump())
 
-        # 將新的資料寫回 dataframe
-        updated_row = old_recipe.to_dict()
-        for col, val in updated_row.items():
-            df.loc[mask, col] = val
+        if recipe.parameter_name != parameter_name and \
+                RecipeRecord.query.filter_by(parameter_name=recipe.parameter_name).first() is not None:
+            raise ValueError(f"Recipe with parameter_name={recipe.parameter_name} already exists.")
 
-        df.to_excel(self.excel_path, index=False)
-        return updated_row
+        try:
+            record.apply(recipe)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            self.invalidate_cache()
+        return recipe.to_dict()
+
+    @staticmethod
+    def _read_excel_rows(source):
+        df = pd.read_excel(source, dtype=str)   # 全部先讀字串
+        for row in df.to_dict("records"):
+            # 略過空白列
+            if all(value is None or (isinstance(value, float) and math.isnan(value)) for value in row.values()):
+                continue
+            yield row
+
+    def import_excel(self, source):
+        """
+        由 Excel 匯入配方 (路徑或檔案物件)，parameter_name 已存在的配方會被覆寫；
+        每列先經過 Recipe 驗證，有錯誤的列略過並回報，其餘在同一個交易內寫入
+        """
+        imported = 0
+        errors = []
+        try:
+            for index, row in enumerate(self._read_excel_rows(source), start=2):
+                try:
+                    recipe = Recipe(**row)
+                except Exception as e:
+                    errors.append({"row": index, "parameter_name": row.get("parameter_name"), "message": str(e)})
+                    continue
+                record = RecipeRecord.query.filter_by(parameter_name=recipe.parameter_name).first()
+                if record is None:
+                    record = RecipeRecord()
+                    db.session.add(record)
+                else:
+                    # 保留資料庫內的主鍵，避免 Excel 的 ID 與其他配方衝突
+                    recipe = recipe.model_copy(update={"id": record.id})
+                record.apply(recipe)
+                imported += 1
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            self.invalidate_cache()
+        return {"imported": imported, "errors": errors}
+
+    def export_excel(self):
+        """將所有配方輸出成 Excel，回傳 BytesIO"""
+        self._ensure_legacy_imported()
+        rows = [
+            {**record.to_recipe().to_dict(), "id": record.id}
+            for record in RecipeRecord.query.order_by(RecipeRecord.created_time).all()
+        ]
+        df = pd.DataFrame(rows, columns=EXCEL_COLUMNS)
+        output = io.BytesIO()
+        df.to_excel(output, index=False)
+        output.seek(0)
+        return output
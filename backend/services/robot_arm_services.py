@@ -1,11 +1,29 @@
+import threading
+from functools import wraps
 from pymodbus.client import ModbusTcpClient
 from models.robot_arm_model import RobotArmModel
 
+
+def _locked(method):
+    """
+    ModbusTcpClient 不是執行緒安全的: 輪詢排程器讀取狀態時，路由可能同時寫入設定，
+    同一個 socket 上的請求與回應會交錯，所以每個公開操作都持有 client_lock
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.client_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class RobotArmService:
     def __init__(self):
         self.model = RobotArmModel()
         self.client = None
+        # 可重入: 寫入失敗時 reset_robot_signal / start_robot 會在鎖內呼叫 connect 重新連線
+        self.client_lock = threading.RLock()
     
+    @_locked
     def connect(self, ip_address, port=502, slave_id=5):
         """連接到機械手臂的 PLC"""
         try:
@@ -34,6 +52,7 @@ class RobotArmService:
             self.model.add_operation_record("連接", operation_details, False)
             return False, f"連接錯誤: {str(e)}"
     
+    @_locked
     def disconnect(self):
         """中斷連接"""
         if self.client and self.model.is_connected:
@@ -51,6 +70,7 @@ class RobotArmService:
         else:
             return False, "尚未連接"
     
+    @_locked
     def set_adjustment_rate(self, enabled, value=None):
         """設定調整倍率"""
         if not self._check_connection():
@@ -129,6 +149,7 @@ class RobotArmService:
                 
             return False, f"設定調整倍率錯誤: {str(e)}"
     
+    @_locked
     def set_height_adjustment(self, enabled, offset_value=None):
         """設定調整間距高度"""
         if not self._check_connection():
@@ -177,6 +198,7 @@ class RobotArmService:
             self.model.add_operation_record("設定調整間距高度", operation_details, False)
             return False, f"設定調整間距高度錯誤: {str(e)}"
     
+    @_locked
     def set_count_adjustment(self, enabled, count_value=None):
         """設定調整次數"""
         if not self._check_connection():
@@ -225,13 +247,14 @@ class RobotArmService:
             self.model.add_operation_record("設定調整次數", operation_details, False)
             return False, f"設定調整次數錯誤: {str(e)}"
     
-    def read_status(self):
-        """讀取當前機械手臂的狀態"""
+    @_locked
+    def read_status(self, record_history=True):
+        """讀取當前機械手臂的狀態，輪詢時 record_history=False，不把每次讀取都寫進操作歷史"""
         if not self._check_connection():
             return False, "未連接到設備", None
         
         try:
-            self._read_current_settings()
+            self._read_current_settings(record_history)
 
             return True, "讀取狀態成功", self.model.to_dict()
         except Exception as e:
@@ -243,7 +266,7 @@ class RobotArmService:
         """檢查連接狀態"""
         return self.client is not None and self.model.is_connected
     
-    def _read_current_settings(self):
+    def _read_current_settings(self, record_history=True):
         """讀取當前所有設定值"""
         if not self._check_connection():
             return False
@@ -269,8 +292,9 @@ class RobotArmService:
                 self.model.count_adjustment_enabled = bool(registers[17]) # 0x9C51 - R20008
                 self.model.count_adjustment_value = registers[19]        # 0x9C53 - R20009
                 
-                operation_details = "讀取當前設定成功"
-                self.model.add_operation_record("讀取設定", operation_details, True)
+                if record_history:
+                    operation_details = "讀取當前設定成功"
+                    self.model.add_operation_record("讀取設定", operation_details, True)
                 return True
             else:
                 operation_details = "讀取當前設定失敗"
@@ -319,6 +343,7 @@ class RobotArmService:
         except:
             return False
           
+    @_locked
     def reset_robot_signal(self):
         """歸零機械手臂啟動信號"""
         if not self._check_connection():
@@ -351,6 +376,7 @@ class RobotArmService:
             RobotArmService.connect(self, "192.168.0.5")
             return True, f"重置啟動信號錯誤: {str(e)}, 已重新連線"
         
+    @_locked
     def start_robot(self, start=True):
         """啟動或停止機械手臂
         
@@ -0,0 +1,358 @@
+import os
+import glob
+import json
+import math
+import time
+import uuid
+import threading
+import traceback
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from database import db
+from models.connect_log_model import ConnectionLog
+from models.run_model import RunRecord
+from services.historian_services import flatten_numeric
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FIXED_COLUMNS = ("timestamp", "elapsed")
+
+
+def order_columns(names) -> List[str]:
+    """timestamp、elapsed 在前，其餘欄位依名稱排序"""
+    return list(FIXED_COLUMNS) + sorted(name for name in set(names) if name not in FIXED_COLUMNS)
+
+
+def part_paths(base_path: str) -> List[str]:
+    """錄製中寫出的分段檔，依序號排序"""
+    return sorted(glob.glob(f"{glob.escape(base_path)}.part*.parquet") + glob.glob(f"{glob.escape(base_path)}.part*.npz"))
+
+
+def merge_run_parts(base_path: str, parts: List[str], metadata: Dict[str, Any]) -> Tuple[str, int, int]:
+    """
+    把分段檔合併成單一製程紀錄檔，回傳 (檔案路徑, 筆數, 欄位數)，成功後刪除分段檔
+    Parquet 以 ParquetWriter 逐段附加成 row group，記憶體內一次只有一段；缺少的欄位補 NaN；
+    metadata 放在 schema 內 (.npz 為 `__metadata__` JSON 字串)
+    """
+    metadata_json = json.dumps(metadata, ensure_ascii=False, default=str)
+    parquet_parts = [part for part in parts if part.endswith(".parquet")]
+    if parquet_parts and pa is None:
+        raise RuntimeError("未安裝 pyarrow，無法合併 Parquet 分段檔")
+
+    rows = 0
+    if parquet_parts:
+        path = f"{base_path}.parquet"
+        names = order_columns(name for part in parquet_parts for name in pq.read_schema(part).names)
+        schema = pa.schema([(name, pa.float64()) for name in names]).with_metadata({"run": metadata_json})
+        with pq.ParquetWriter(f"{path}.tmp", schema, compression="zstd") as writer:
+            for part in parquet_parts:
+                table = pq.read_table(part)
+                columns = [
+                    table.column(name) if name in table.column_names else pa.array(np.full(table.num_rows, np.nan))
+                    for name in names
+                ]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                rows += table.num_rows
+    else:
+        path = f"{base_path}.npz"
+        chunks = []
+        for part in parts:
+            with np.load(part) as data:
+                chunks.append({name: data[name] for name in data.files})
+        names = order_columns(name for chunk in chunks for name in chunk)
+        rows = sum(len(chunk["timestamp"]) for chunk in chunks)
+        columns = {
+            name: np.concatenate([chunk.get(name, np.full(len(chunk["timestamp"]), np.nan)) for chunk in chunks])
+            if chunks else np.empty(0)
+            for name in names
+        }
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez_compressed(f, **columns, __metadata__=np.array(metadata_json))
+
+    os.replace(f"{path}.tmp", path)
+    for part in parts:
+        os.remove(part)
+    return path, rows, len(names)
+
+
+class RunRecording:
+    """
+    錄製中的製程
+    樣本先累積在記憶體，每 chunk_rows 筆寫出一個完整的分段檔 (Parquet，未安裝 pyarrow 時為 .npz)，
+    伺服器異常結束時最多遺失最後一段；停止時由 merge_run_parts 合併成單一檔案
+    這一輪沒有讀到的欄位 (設備斷線、資料過期或中途才連線) 記為 NaN
+    """
+
+    def __init__(self, run_id: str, interval: float, base_path: str, chunk_rows: int):
+        self.run_id = run_id
+        self.interval = interval
+        self.base_path = base_path
+        self.chunk_rows = max(int(chunk_rows), 1)
+        self.start_time = time.time()
+        self.start_monotonic = time.monotonic()
+        self.names = set(FIXED_COLUMNS)
+        self.rows: List[Dict[str, float]] = []
+        self.parts: List[str] = []
+        self.samples = 0
+
+    def add_sample(self, timestamp: float, values: Dict[str, float]):
+        row = dict(values, timestamp=timestamp, elapsed=timestamp - self.start_time)
+        self.names.update(row)
+        self.rows.append(row)
+        self.samples += 1
+        if len(self.rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """把記憶體內的樣本寫成一個分段檔"""
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        names = order_columns(name for row in rows for name in row)
+        columns = {
+            name: np.fromiter((row.get(name, np.nan) for row in rows), dtype=np.float64, count=len(rows))
+            for name in names
+        }
+        extension = "parquet" if pa is not None else "npz"
+        path = f"{self.base_path}.part{len(self.parts):05d}.{extension}"
+        if pa is not None:
+            pq.write_table(pa.table(columns), f"{path}.tmp", compression="zstd")
+        else:
+            with open(f"{path}.tmp", "wb") as f:
+                np.savez(f, **columns)
+        os.replace(f"{path}.tmp", path)
+        self.parts.append(path)
+
+
+class RunRecorderService:
+    """
+    製程紀錄器
+    開始後以固定的共同時脈 (interval 秒) 取樣所有已連線設備，每個取樣點一列，
+    欄位為 `設備.欄位` (例如 azbil.FLOW_RATE、heater.pv) 與 `設備.age` (資料讀取至今的秒數)；
+    錄製中每 chunk_seconds 秒寫出一個分段檔，停止時合併成一個欄式檔案，並以 run_id 與配方名稱記錄在 runs 資料表
+
+    設備資料取自輪詢排程器的最新讀值，不會另外讀串口；
+    錄製期間各設備的輪詢週期會縮短到不超過 interval，結束後恢復
+    """
+
+    def __init__(self, app, poller, output_dir: str, interval: float = 1.0, chunk_seconds: float = 60.0):
+        self.app = app
+        self.poller = poller
+        self.output_dir = output_dir
+        self.interval = float(interval)
+        self.chunk_seconds = float(chunk_seconds)
+
+        self._recording: Optional[RunRecording] = None
+        self._recipe: Optional[Dict[str, Any]] = None
+        self._saved_intervals: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def mark_interrupted(self) -> int:
+        """
+        啟動時呼叫: 上次伺服器異常結束時仍在錄製的製程標記為失敗，
+        已寫出的分段檔合併成紀錄檔保留下來
+        """
+        records = RunRecord.query.filter_by(status='recording').all()
+        for record in records:
+            record.status = 'failed'
+            record.message = "伺服器異常結束，未寫出檔案"
+            base_path = os.path.join(self.output_dir, record.run_id)
+            parts = part_paths(base_path)
+            if not parts:
+                continue
+            try:
+                path, rows, columns = merge_run_parts(base_path, parts, {
+                    "run_id": record.run_id,
+                    "recipe_name": record.recipe_name,
+                    "note": record.note,
+                    "interval": record.interval,
+                    "started_at": record.started_at,
+                    "ended_at": None
+                })
+            except Exception as e:
+                traceback.print_exc()
+                record.message = f"伺服器異常結束，合併分段檔失敗: {e}"
+                continue
+            record.samples = rows
+            record.columns = columns
+            record.file_path = path
+            record.file_format = os.path.splitext(path)[1].lstrip('.')
+            record.file_size = os.path.getsize(path)
+            record.message = f"伺服器異常結束，已保留中斷前的 {rows} 筆資料"
+        if records:
+            db.session.commit()
+        return len(records)
+
+    @staticmethod
+    def _new_run_id() -> str:
+        return f"{ConnectionLog.get_tw_time():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+    def start(self, recipe_name: Optional[str] = None, recipe: Optional[Dict[str, Any]] = None,
+              interval: Optional[float] = None, note: Optional[str] = None) -> Dict[str, Any]:
+        """開始錄製，已有錄製中的製程時拋出 RuntimeError"""
+        interval = self.interval if interval is None else float(interval)
+        if interval <= 0:
+            raise ValueError("interval 必須大於 0")
+
+        with self._lock:
+            if self._recording is not None:
+                raise RuntimeError(f"製程 {self._recording.run_id} 錄製中，請先停止")
+
+            run_id = self._new_run_id()
+            os.makedirs(self.output_dir, exist_ok=True)
+            recording = RunRecording(
+                run_id, interval, os.path.join(self.output_dir, run_id),
+                chunk_rows=math.ceil(self.chunk_seconds / interval)
+            )
+            record = RunRecord(
+                run_id=recording.run_id,
+                recipe_name=recipe_name,
+                note=note,
+                status='recording',
+                started_at=ConnectionLog.get_tw_time(),
+                interval=interval
+            )
+            db.session.add(record)
+            db.session.commit()
+
+            self._recording = recording
+            self._recipe = recipe
+            self._tighten_poll_intervals(interval)
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, args=(recording,), name="run-recorder", daemon=True)
+            self._thread.start()
+            print(f"開始錄製製程 {recording.run_id} (配方: {recipe_name})")
+            return record.to_dict()
+
+    def stop(self, message: Optional[str] = None) -> Dict[str, Any]:
+        """停止錄製並寫出檔案，沒有錄製中的製程時拋出 RuntimeError"""
+        with self._lock:
+            recording = self._recording
+            if recording is None:
+                raise RuntimeError("目前沒有錄製中的製程")
+            self._stop_event.set()
+            thread = self._thread
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout=max(recording.interval * 2, 5.0))
+            self._thread = None
+            self._recording = None
+            self._restore_poll_intervals()
+
+            with self.app.app_context():
+                try:
+                    return self._finish(recording, message)
+                finally:
+                    db.session.remove()
+
+    def stop_if_recording(self):
+        """伺服器關閉時呼叫，錄製到一半的資料仍會寫出"""
+        try:
+            self.stop("伺服器關閉，自動停止錄製")
+        except RuntimeError:
+            pass
+        except Exception as e:
+            print(f"停止製程錄製失敗: {e}")
+
+    def _finish(self, recording: RunRecording, message: Optional[str]) -> Dict[str, Any]:
+        record = RunRecord.query.filter_by(run_id=recording.run_id).first()
+        record.ended_at = ConnectionLog.get_tw_time()
+        record.samples = recording.samples
+        record.columns = len(recording.names)
+        record.message = message
+        try:
+            recording.flush()
+            metadata = {
+                "run_id": recording.run_id,
+                "recipe_name": record.recipe_name,
+                "recipe": self._recipe,
+                "note": record.note,
+                "interval": recording.interval,
+                "started_at": record.started_at,
+                "ended_at": record.ended_at
+            }
+            path, _, _ = merge_run_parts(recording.base_path, recording.parts, metadata)
+            record.file_path = path
+            record.file_format = os.path.splitext(path)[1].lstrip('.')
+            record.file_size = os.path.getsize(path)
+            record.status = 'completed'
+        except Exception as e:
+            traceback.print_exc()
+            record.status = 'failed'
+            record.message = f"寫入檔案失敗: {e}"
+        db.session.commit()
+        print(f"製程 {recording.run_id} 錄製結束: {record.samples} 筆, {record.status}")
+        return record.to_dict()
+
+    def _tighten_poll_intervals(self, interval: float):
+        """錄製期間把輪詢週期縮短到不超過取樣間隔，結束後恢復"""
+        self._saved_intervals = {}
+        for device_type in self.poller.get_summary()["devices"]:
+            current = self.poller.get_interval(device_type)
+            if current > interval:
+                self._saved_intervals[device_type] = current
+                self.poller.set_interval(device_type, interval)
+
+    def _restore_poll_intervals(self):
+        for device_type, interval in self._saved_intervals.items():
+            try:
+                self.poller.set_interval(device_type, interval)
+            except (KeyError, ValueError):
+                pass
+        self._saved_intervals = {}
+
+    def _run(self, recording: RunRecording):
+        # 以開始時間為基準排定每個取樣點，不會因每輪處理時間而漂移；落後時略過錯過的點
+        next_tick = recording.start_monotonic
+        while True:
+            delay = next_tick - time.monotonic()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+            if self._stop_event.is_set():
+                break
+            try:
+                self._sample(recording)
+            except Exception as e:
+                print(f"製程取樣失敗: {e}")
+                traceback.print_exc()
+            next_tick += recording.interval
+            missed = int((time.monotonic() - next_tick) // recording.interval)
+            if missed > 0:
+                next_tick += missed * recording.interval
+
+    def _sample(self, recording: RunRecording):
+        timestamp = time.time()
+        values: Dict[str, float] = {}
+        for device_type, entry in self.poller.get_latest_entries().items():
+            for channel, value in flatten_numeric(entry["data"]).items():
+                values[f"{device_type}.{channel}"] = value
+            values[f"{device_type}.age"] = max(timestamp - entry["timestamp"], 0.0)
+        recording.add_sample(timestamp, values)
+
+    def get_current(self) -> Optional[Dict[str, Any]]:
+        recording = self._recording
+        if recording is None:
+            return None
+        return {
+            "run_id": recording.run_id,
+            "interval": recording.interval,
+            "elapsed": round(time.time() - recording.start_time, 3),
+            "samples": recording.samples,
+            "columns": order_columns(recording.names)
+        }
+
+    @staticmethod
+    def list_runs(recipe_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = RunRecord.query
+        if recipe_name:
+            query = query.filter(RunRecord.recipe_name == recipe_name)
+        return [record.to_dict() for record in query.order_by(RunRecord.started_at.desc()).all()]
+
+    @staticmethod
+    def get_run(run_id: str) -> Optional[RunRecord]:
+        return RunRecord.query.filter_by(run_id=run_id).first()
@@ -1,34 +1,325 @@
+import os
+import time
+from config import Config
+from database import db
+from downsample import downsample_series
 from models.transmittance_model import TransmittanceData
-from transmittance_to_figure import plot_data, plot_data_filter
-from txt_to_transmittance_data import txt_to_transmittance
+from spectrum_archive import ARCHIVE_VERSION, archive_path, archive_size, write_archive, open_archive, archive_window_stats
+from spectrum_cache import SpectrumCache
+from plot_renderer import PlotRenderer, plot_renderer
+from txt_to_transmittance_data import txt_to_transmittance, discover_spectrum_files, load_spectra, normalize_stats
+
+# 每個資料夾最多保留的計算結果筆數 (不同波長範圍各一筆)
+RESULT_INDEX_LIMIT = 50
 
 class TransmittanceService:
     @staticmethod
-    def calculate_transmittance(file_path, group_number, file_number, max_spectrum, min_spectrum):
-        """計算透射率數據"""
-        
+    def calculate_transmittance(file_path, group_number, file_number, max_spectrum, min_spectrum, windows=None, stats=None):
+        """
+        計算透射率數據
+        windows ([(min, max), ...]) 有值時一次計算多個波長範圍與 stats 統計量
+        """
+
         try:
-            averages_list = txt_to_transmittance(
-                initial_file_path=file_path,
-                group_number=group_number,
-                file_number=file_number,
-                max_spectrum=max_spectrum,
-                min_spectrum=min_spectrum
-            )
+            files = discover_spectrum_files(file_path, group_number, file_number)
+            signatures = {name: SpectrumCache.file_signature(path) for name, path in files}
+
+            # 已封存且檔案都沒有變更時，直接在封存矩陣上計算，不讀 txt
+            archive = TransmittanceService._open_valid_archive(file_path, group_number, file_number, files, signatures)
+
+            if windows:
+                # 多範圍結果不寫入資料庫，重複計算由封存檔或光譜快取加速
+                if archive is not None:
+                    return TransmittanceService._archive_results(files, archive, windows, normalize_stats(stats))
+                return txt_to_transmittance(
+                    initial_file_path=file_path,
+                    group_number=group_number,
+                    file_number=file_number,
+                    max_spectrum=max_spectrum,
+                    min_spectrum=min_spectrum,
+                    windows=windows,
+                    stats=stats
+                )
+
+            # 檔案都沒有變更時直接使用資料庫內的計算結果
+            record = TransmittanceService._find_result(file_path, group_number, file_number, max_spectrum, min_spectrum)
+            if record is not None and TransmittanceService._is_result_valid(record, signatures):
+                return [
+                    {"fileName": entry["fileName"], "averageTransmittance": entry["averageTransmittance"]}
+                    for entry in record.averages
+                ]
+
+            if archive is not None:
+                averages_list = [
+                    {"fileName": entry["fileName"], "averageTransmittance": entry["averageTransmittance"]}
+                    for entry in TransmittanceService._archive_results(
+                        files, archive, [(float(min_spectrum), float(max_spectrum))], ["mean"]
+                    )
+                ]
+            else:
+                averages_list = txt_to_transmittance(
+                    initial_file_path=file_path,
+                    group_number=group_number,
+                    file_number=file_number,
+                    max_spectrum=max_spectrum,
+                    min_spectrum=min_spectrum
+                )
+
+            # 只保存完整的結果 (中途遇到錯誤檔案時不保存)
+            if averages_list and len(averages_list) == len(files):
+                TransmittanceService._save_result(
+                    record, file_path, group_number, file_number, max_spectrum, min_spectrum, averages_list, signatures
+                )
             return averages_list
         except Exception as e:
             raise Exception(f"計算透射率時發生錯誤: {str(e)}")
 
     @staticmethod
-    def generate_plot(file_data, selected_files=None, x_label='File Name', y_label='Transmittance %'):
-        """生成透射率圖表"""
+    def _archive_results(files, archive, windows, stats):
+        """封存矩陣的計算結果轉成與 txt_to_transmittance 相同的格式"""
+        window_results = archive_window_stats(*archive, windows, stats)
+        return [
+            {"fileName": name, "averageTransmittance": results[0]["mean"], "windows": results}
+            for (name, _), results in zip(files, window_results)
+        ]
+
+    @staticmethod
+    def _find_archive(file_path, group_number, file_number):
+        """封存紀錄與計算結果共用 TransmittanceData，以 max_spectrum / min_spectrum 為空區分"""
+        try:
+            return TransmittanceData.query.filter_by(
+                file_path=file_path,
+                group_number=int(group_number),
+                file_number=int(file_number),
+                max_spectrum=None,
+                min_spectrum=None
+            ).order_by(TransmittanceData.id.desc()).first()
+        except Exception as e:
+            print(f"查詢光譜封存紀錄失敗: {e}")
+            return None
+
+    @staticmethod
+    def _open_valid_archive(file_path, group_number, file_number, files, signatures):
+        """檔案清單與 mtime、大小都與封存時相同才使用封存檔，否則回傳 None"""
+        if not files:
+            return None
+        record = TransmittanceService._find_archive(file_path, group_number, file_number)
+        if record is None or not isinstance(record.averages, dict):
+            return None
+        info = record.averages
+        # 舊版封存檔的波長軸為 float32，範圍邊界附近的點數會與 txt 不同，需重新封存
+        if info.get("version") != ARCHIVE_VERSION:
+            return None
+        if info.get("fileNames") != [name for name, _ in files]:
+            return None
+        if any(list(signatures[name]) != signature for name, signature in zip(info["fileNames"], info["signatures"])):
+            return None
+        path = os.path.join(Config.SPECTRUM_ARCHIVE_DIR, info["archive"])
+        try:
+            return open_archive(path)
+        except Exception as e:
+            print(f"開啟光譜封存檔失敗: {path}，{e}")
+            return None
+
+    @staticmethod
+    def archive_folder(file_path, group_number, file_number):
+        """
+        將資料夾內的光譜轉成 float32 封存檔 (波長軸為 float64)，並在 TransmittanceData 登記檔案清單與 mtime、大小；
+        與計算相同，遇到無法解析的檔案時只封存之前的檔案
+        """
+        files = discover_spectrum_files(file_path, group_number, file_number)
+        if not files:
+            raise FileNotFoundError(f"{file_path} 找不到 {group_number}-{file_number}.txt 開始的光譜檔")
+
+        spectra = []
+        error_message = None
+        for (name, path), (spectrum, error) in zip(files, load_spectra([path for _, path in files])):
+            if error is not None:
+                error_message = f"{name}: {error}"
+                break
+            spectra.append(spectrum)
+        files = files[:len(spectra)]
+        if not spectra:
+            raise ValueError(f"無法解析光譜檔 {error_message}")
+
+        path = archive_path(Config.SPECTRUM_ARCHIVE_DIR, file_path, group_number, file_number)
+        file_count, points = write_archive(path, spectra)
+        wavelength = spectra[0][:, 0]
+        info = {
+            "version": ARCHIVE_VERSION,
+            "archive": os.path.basename(path),
+            "fileNames": [name for name, _ in files],
+            "signatures": [list(SpectrumCache.file_signature(file)) for _, file in files],
+            "points": points,
+            "wavelengthRange": [float(wavelength[0]), float(wavelength[-1])],
+            "sizeBytes": archive_size(path),
+            "createdAt": time.time()
+        }
+
+        try:
+            record = TransmittanceService._find_archive(file_path, group_number, file_number)
+            if record is None:
+                record = TransmittanceData(
+                    file_path=file_path,
+                    group_number=int(group_number),
+                    file_number=int(file_number)
+                )
+                db.session.add(record)
+            record.averages = info
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {
+            **TransmittanceService._archive_summary(record),
+            "skipped": error_message
+        }
+
+    @staticmethod
+    def _archive_summary(record):
+        info = record.averages
+        return {
+            "id": record.id,
+            "filePath": record.file_path,
+            "groupNumber": record.group_number,
+            "fileNumber": record.file_number,
+            "fileCount": len(info["fileNames"]),
+            "points": info["points"],
+            "wavelengthRange": info["wavelengthRange"],
+            "sizeBytes": info["sizeBytes"],
+            "createdAt": info["createdAt"]
+        }
+
+    @staticmethod
+    def list_archives():
+        records = TransmittanceData.query.filter(
+            TransmittanceData.max_spectrum.is_(None),
+            TransmittanceData.min_spectrum.is_(None)
+        ).order_by(TransmittanceData.id.desc()).all()
+        return [
+            TransmittanceService._archive_summary(record)
+            for record in records if isinstance(record.averages, dict)
+        ]
+
+    @staticmethod
+    def _find_result(file_path, group_number, file_number, max_spectrum, min_spectrum):
+        try:
+            return TransmittanceData.query.filter_by(
+                file_path=file_path,
+                group_number=int(group_number),
+                file_number=int(file_number),
+                max_spectrum=float(max_spectrum),
+                min_spectrum=float(min_spectrum)
+            ).order_by(TransmittanceData.id.desc()).first()
+        except Exception as e:
+            print(f"查詢透射率計算結果失敗: {e}")
+            return None
+
+    @staticmethod
+    def _is_result_valid(record, signatures) -> bool:
+        """檔案清單與每個檔案的 mtime、大小都和保存時相同才使用"""
+        entries = record.averages or []
+        if len(entries) != len(signatures):
+            return False
+        for entry in entries:
+            signature = signatures.get(entry.get("fileName"))
+            if signature is None or list(signature) != [entry.get("mtimeNs"), entry.get("size")]:
+                return False
+        return True
+
+    @staticmethod
+    def _save_result(record, file_path, group_number, file_number, max_spectrum, min_spectrum, averages_list, signatures):
+        """保存計算結果與各檔案的 mtime、大小，並只保留每個資料夾最近的結果"""
+        try:
+            averages = [
+                {
+                    **entry,
+                    "mtimeNs": signatures[entry["fileName"]][0],
+                    "size": signatures[entry["fileName"]][1]
+                }
+                for entry in averages_list
+            ]
+            if record is None:
+                record = TransmittanceData(
+                    file_path=file_path,
+                    group_number=int(group_number),
+                    file_number=int(file_number),
+                    max_spectrum=float(max_spectrum),
+                    min_spectrum=float(min_spectrum)
+                )
+                db.session.add(record)
+            record.averages = averages
+            db.session.flush()
+
+            # 封存紀錄 (max_spectrum 為空) 不計入保留筆數
+            stale = TransmittanceData.query.filter_by(file_path=file_path) \
+                .filter(TransmittanceData.max_spectrum.isnot(None)) \
+                .order_by(TransmittanceData.id.desc()).offset(RESULT_INDEX_LIMIT).all()
+            for item in stale:
+                db.session.delete(item)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"保存透射率計算結果失敗: {e}")
+
+    @staticmethod
+    def _plot_params(file_data, selected_files=None, x_label='File Name', y_label='Transmittance %'):
         if not selected_files:
             selected_files = [file['fileName'] for file in file_data]
-            
-        print('selected_files:', selected_files)
-        return plot_data(file_data, selected_files, x_label, y_label)
+        return {"fileData": file_data, "selectedFiles": selected_files, "xLabel": x_label, "yLabel": y_label}
+
+    @staticmethod
+    def plot_etag(file_data, selected_files=None, x_label='File Name', y_label='Transmittance %'):
+        """不繪圖直接計算 ETag，用於判斷前端的 If-None-Match"""
+        return PlotRenderer.make_key('plot', TransmittanceService._plot_params(file_data, selected_files, x_label, y_label))
+
+    @staticmethod
+    def filter_plot_etag(file_data, plot_flag):
+        return PlotRenderer.make_key('filter', {"fileData": file_data, "plotFlag": plot_flag})
+
+    @staticmethod
+    def generate_plot(file_data, selected_files=None, x_label='File Name', y_label='Transmittance %'):
+        """生成透射率圖表，回傳 (ETag, PNG bytes)"""
+        params = TransmittanceService._plot_params(file_data, selected_files, x_label, y_label)
+        print('selected_files:', params["selectedFiles"])
+        return plot_renderer.render('plot', params)
 
     @staticmethod
     def generate_filter_plot(file_data, plot_flag):
-        """生成過濾後的透射率圖表"""
-        return plot_data_filter(file_data, plot_flag)
\ No newline at end of file
+        """生成過濾後的透射率圖表，回傳 (ETag, PNG bytes)"""
+        return plot_renderer.render('filter', {"fileData": file_data, "plotFlag": plot_flag})
+
+    @staticmethod
+    def build_series(file_data, selected_files=None, fields=None, max_points=0):
+        """
+        將 fileData (與 plot_data_filter 相同的資料) 轉成前端可直接繪製的序列
+        x 軸為檔案在 (過濾後) fileData 中的索引，每個欄位各自以 LTTB 降採樣到 max_points 點
+        """
+        if selected_files:
+            selected = set(selected_files)
+            file_data = [file for file in file_data if file.get('fileName') in selected]
+        if not fields:
+            fields = ['averageTransmittance']
+            if any(file.get('resistance') is not None for file in file_data):
+                fields.append('resistance')
+
+        series = {}
+        for field in fields:
+            index, values = downsample_series([file.get(field) for file in file_data], max_points)
+            series[field] = {"index": index, "values": values}
+        return {"total": len(file_data), "fileData": file_data, "series": series}
+
+    @staticmethod
+    def encode_series_binary(result):
+        """
+        以 float32 little-endian 輸出: 每個欄位依序為 索引陣列 + 數值陣列，
+        欄位順序與長度放在回應標頭，前端以 Float32Array 直接讀取
+        """
+        chunks = []
+        layout = []
+        for field, data in result["series"].items():
+            chunks.append(data["index"].astype('<f4').tobytes())
+            chunks.append(data["values"].astype('<f4').tobytes())
+            layout.append(f"{field}:{len(data['values'])}")
+        return b''.join(chunks), ','.join(layout)
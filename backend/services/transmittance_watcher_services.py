@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import threading
+import traceback
+from typing import Any, Dict, List, Optional
+from spectrum_cache import SpectrumCache
+from txt_to_transmittance_data import load_spectra, window_average
+
+
+class FolderWatch:
+    """
+    單一資料夾的監看狀態
+    依 {group}-{file}.txt 的編號規則記住下一個要讀的檔案，只解析新出現的檔案並累積成序列
+    """
+
+    def __init__(self, file_path: str, group_number: int, file_number: int, max_spectrum: float, min_spectrum: float):
+        self.file_path = file_path
+        self.start_group = int(group_number)
+        self.start_file = int(file_number)
+        self.max_spectrum = float(max_spectrum)
+        self.min_spectrum = float(min_spectrum)
+
+        self.next_group = self.start_group
+        self.next_file = self.start_file
+        self.series: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self.last_update: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # 登記時的首次掃描與背景執行緒不可同時處理同一個資料夾
+        self.scan_lock = threading.Lock()
+
+    def find_new_files(self, existing: Dict[str, str], settle_seconds: float) -> List[tuple]:
+        """
+        由目前的游標往後找出已寫入完成的新檔案，回傳 [(檔名, 路徑)]
+        規則與 discover_spectrum_files 相同；mtime 太新的檔案可能還在寫入，留到下一輪
+        """
+        files = []
+        group_number, file_number = self.next_group, self.next_file
+        now = time.time()
+        while True:
+            name = f"{group_number}-{file_number}"
+            actual_name = existing.get(f"{name}.txt")
+            if actual_name is not None:
+                path = f'{self.file_path}/{actual_name}'
+                try:
+                    if now - os.stat(path).st_mtime < settle_seconds:
+                        break
+                except OSError:
+                    break
+                files.append((name, path))
+                file_number += 1
+            elif file_number == 1:
+                break
+            elif f"{group_number + 1}-1.txt" in existing:
+                # 下一組已經開始，換組繼續
+                group_number += 1
+                file_number = 1
+            else:
+                break
+        return files
+
+    def advance(self, name: str):
+        group_number, file_number = name.split('-')
+        self.next_group = int(group_number)
+        self.next_file = int(file_number) + 1
+
+    def to_dict(self, include_series: bool = False) -> Dict[str, Any]:
+        data = {
+            "filePath": self.file_path,
+            "groupNumber": self.start_group,
+            "fileNumber": self.start_file,
+            "maxSpectrum": self.max_spectrum,
+            "minSpectrum": self.min_spectrum,
+            "nextFile": f"{self.next_group}-{self.next_file}",
+            "count": len(self.series),
+            "lastUpdate": self.last_update,
+            "lastError": self.last_error
+        }
+        if include_series:
+            data["series"] = list(self.series)
+        return data
+
+
+class TransmittanceWatcherService:
+    """
+    光譜資料夾監看服務
+    鍍膜過程中光譜儀會持續寫入新的 txt，背景執行緒定期列出已登記的資料夾，
+    只解析新檔案並以 `transmittance_update` 事件推送新的點，不必每次重新處理整個資料夾
+    """
+
+    def __init__(self, socketio, interval: float = 1.0, settle_seconds: float = 0.5):
+        self.socketio = socketio
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+
+        self._watches: Dict[str, FolderWatch] = {}
+        self._lock = threading.Lock()
+        # 啟動與停止背景執行緒需互斥，避免同時登記/移除時漏掉或重複啟動執行緒
+        self._lifecycle_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def add_watch(self, file_path, group_number, file_number, max_spectrum, min_spectrum) -> Dict[str, Any]:
+        """登記資料夾並立即處理已存在的檔案，同一資料夾重新登記時會重置序列"""
+        if not os.path.isdir(file_path):
+            raise FileNotFoundError(f"資料夾不存在: {file_path}")
+
+        watch = FolderWatch(file_path, group_number, file_number, max_spectrum, min_spectrum)
+        with self._lock:
+            self._watches[self._key(file_path)] = watch
+        self._scan(watch)
+        self.start()
+        return watch.to_dict(include_series=True)
+
+    def remove_watch(self, file_path: str) -> bool:
+        with self._lock:
+            removed = self._watches.pop(self._key(file_path), None) is not None
+        self._stop_if_idle()
+        return removed
+
+    def get_watch(self, file_path: str, include_series: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            watch = self._watches.get(self._key(file_path))
+            return watch.to_dict(include_series=include_series) if watch else None
+
+    def list_watches(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [watch.to_dict() for watch in self._watches.values()]
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        with self._lifecycle_lock:
+            if self.is_running():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="transmittance-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._lifecycle_lock:
+            self._stop_locked(timeout)
+
+    def _stop_if_idle(self, timeout: float = 5.0):
+        """沒有資料夾需要監看時停止執行緒；檢查與停止在同一把鎖內，期間登記的資料夾會在停止後重新啟動"""
+        with self._lifecycle_lock:
+            with self._lock:
+                if self._watches:
+                    return
+            self._stop_locked(timeout)
+
+    def _stop_locked(self, timeout: float):
+        self._stop_event.set()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                watches = list(self._watches.values())
+            for watch in watches:
+                try:
+                    self._scan(watch)
+                except Exception as e:
+                    watch.last_error = str(e)
+                    print(f"監看資料夾 {watch.file_path} 失敗: {e}")
+                    traceback.print_exc()
+
+    def _scan(self, watch: FolderWatch):
+        with watch.scan_lock:
+            self._scan_locked(watch)
+
+    def _scan_locked(self, watch: FolderWatch):
+        """列出資料夾一次，解析游標之後的新檔案並推送"""
+        try:
+            # Windows 檔名不分大小寫，以小寫比對、保留實際檔名
+            existing = {name.lower(): name for name in os.listdir(watch.file_path)}
+        except OSError as e:
+            watch.last_error = str(e)
+            return
+
+        files = watch.find_new_files(existing, self.settle_seconds)
+        if not files:
+            return
+
+        points = []
+        last_error = None
+        for (name, path), (spectrum, error) in zip(files, load_spectra([path for _, path in files])):
+            if error is not None:
+                # 解析失敗 (例如檔案還沒寫完) 時停在這個檔案，下一輪再試
+                last_error = f"{name}: {error}"
+                print(f"處理檔案時發生錯誤: {path}，錯誤訊息: {error}")
+                break
+            points.append({
+                "fileName": name,
+                "averageTransmittance": window_average(spectrum, watch.max_spectrum, watch.min_spectrum),
+                "mtime": SpectrumCache.file_signature(path)[0] / 1e9
+            })
+            watch.advance(name)
+
+        with self._lock:
+            watch.last_error = last_error
+            if not points:
+                return
+            watch.series.extend(points)
+            watch.last_update = time.time()
+            total = len(watch.series)
+        self._emit(watch, points, total)
+
+    def _emit(self, watch: FolderWatch, points: List[Dict[str, Any]], total: int):
+        try:
+            self.socketio.emit('transmittance_update', {
+                'filePath': watch.file_path,
+                'points': json.loads(json.dumps(points, default=str)),
+                'total': total,
+                'timestamp': time.time()
+            })
+        except Exception as e:
+            print(f"透射率更新廣播失敗: {e}")
+            traceback.print_exc()
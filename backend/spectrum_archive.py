@@ -0,0 +1,89 @@
+import os
+import hashlib
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+# 封存檔格式: float32 .npy 矩陣，第 i 列為第 i 個檔案的 T%；
+# 波長軸 (遞增) 另存為 float64 的 <封存檔>.wavelength.npy，範圍邊界比較與讀 txt 的結果完全一致
+ARCHIVE_DTYPE = np.float32
+WAVELENGTH_DTYPE = np.float64
+ARCHIVE_VERSION = 2
+
+
+def archive_path(archive_dir: str, folder: str, group_number, file_number) -> str:
+    """同一資料夾 + 起始編號對應固定的封存檔，重新封存時覆蓋"""
+    key = f"{os.path.normcase(os.path.abspath(folder))}|{int(group_number)}|{int(file_number)}"
+    return os.path.join(archive_dir, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.npy")
+
+
+def wavelength_path(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}.wavelength.npy"
+
+
+def write_archive(path: str, spectra: Sequence[np.ndarray]) -> Tuple[int, int]:
+    """
+    將多個光譜寫成封存檔，回傳 (檔案數, 每個光譜的點數)
+    所有光譜的波長軸必須相同，否則拋出 ValueError
+    """
+    if not spectra:
+        raise ValueError("沒有可封存的光譜")
+    wavelength = spectra[0][:, 0]
+    for index, spectrum in enumerate(spectra):
+        if spectrum.shape[0] != wavelength.size or not np.allclose(spectrum[:, 0], wavelength):
+            raise ValueError(f"第 {index + 1} 個光譜的波長軸與第一個檔案不同，無法封存")
+
+    matrix = np.empty((len(spectra), wavelength.size), dtype=ARCHIVE_DTYPE)
+    for index, spectrum in enumerate(spectra):
+        matrix[index] = spectrum[:, 1]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for target, data in ((wavelength_path(path), np.asarray(wavelength, dtype=WAVELENGTH_DTYPE)), (path, matrix)):
+        tmp_path = f"{target}.tmp.npy"
+        np.save(tmp_path, data)
+        os.replace(tmp_path, target)
+    return len(spectra), wavelength.size
+
+
+def archive_size(path: str) -> int:
+    return os.path.getsize(path) + os.path.getsize(wavelength_path(path))
+
+
+def open_archive(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """回傳 (波長軸, T% 矩陣)；矩陣以唯讀記憶體映射開啟，只有實際用到的波長範圍會從磁碟讀入"""
+    return np.load(wavelength_path(path)), np.load(path, mmap_mode='r')
+
+
+def archive_window_stats(wavelength: np.ndarray, matrix: np.ndarray, windows: Sequence[Tuple[float, float]], stats: Sequence[str] = ("mean",)) -> List[List[Dict[str, float]]]:
+    """
+    在封存矩陣上一次計算所有檔案、所有波長範圍 (min < 波長 < max) 的統計量，
+    回傳 [檔案][範圍] 的結果，格式與 window_stats 相同；累加以 float64 進行
+    """
+    file_count = matrix.shape[0]
+    results: List[List[Dict[str, float]]] = [[] for _ in range(file_count)]
+    for min_spectrum, max_spectrum in windows:
+        start = int(np.searchsorted(wavelength, min_spectrum, side='right'))
+        end = max(start, int(np.searchsorted(wavelength, max_spectrum, side='left')))
+        count = end - start
+        values = np.asarray(matrix[:, start:end], dtype=np.float64)
+
+        columns = {}
+        for stat in stats:
+            if count == 0:
+                columns[stat] = np.full(file_count, np.nan)
+            elif stat == "mean":
+                columns[stat] = values.sum(axis=1) / count
+            elif stat == "median":
+                columns[stat] = np.median(values, axis=1)
+            elif stat == "min":
+                columns[stat] = values.min(axis=1)
+            elif stat == "max":
+                columns[stat] = values.max(axis=1)
+            elif stat == "std":
+                columns[stat] = values.std(axis=1)
+
+        for row in range(file_count):
+            item = {"minSpectrum": min_spectrum, "maxSpectrum": max_spectrum, "count": count}
+            for stat, column in columns.items():
+                item[stat] = float(column[row])
+            results[row].append(item)
+    return results
@@ -0,0 +1,112 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class SpectrumCache:
+    """
+    已解析光譜的快取
+    以 路徑 + mtime + 檔案大小 為鍵，檔案被修改後自動失效；
+    記憶體內依 LRU 淘汰，設定 disk_dir 時被淘汰的光譜會寫成 .npy，下次直接載入不必重新解析 txt
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, Tuple[int, int, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_signature(path: str) -> Tuple[int, int]:
+        """回傳 (mtime_ns, size)"""
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _disk_path(self, path: str, mtime_ns: int, size: int) -> str:
+        digest = hashlib.sha1(f"{os.path.abspath(path)}|{mtime_ns}|{size}".encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.npy")
+
+    def get(self, path: str, mtime_ns: int, size: int) -> Optional[np.ndarray]:
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == mtime_ns and entry[1] == size:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                # 檔案已變更，移除舊的快取
+                self._remove(key)
+
+        if self.disk_dir:
+            disk_path = self._disk_path(path, mtime_ns, size)
+            if os.path.exists(disk_path):
+                try:
+                    spectrum = np.load(disk_path)
+                    self.put(path, mtime_ns, size, spectrum)
+                    with self._lock:
+                        self.disk_hits += 1
+                    return spectrum
+                except Exception as e:
+                    print(f"讀取光譜磁碟快取失敗: {disk_path}，{e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, path: str, mtime_ns: int, size: int, spectrum: np.ndarray):
+        key = os.path.abspath(path)
+        spectrum.setflags(write=False)  # 快取內的陣列共用，不允許修改
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (mtime_ns, size, spectrum)
+            self._bytes += spectrum.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_entry = self._entries.popitem(last=False)
+                self._bytes -= old_entry[2].nbytes
+                evicted.append((old_key, old_entry))
+
+        if self.disk_dir:
+            for old_key, (old_mtime, old_size, old_spectrum) in evicted:
+                self._spill(old_key, old_mtime, old_size, old_spectrum)
+
+    def _spill(self, path: str, mtime_ns: int, size: int, spectrum: np.ndarray):
+        """被淘汰的光譜寫入磁碟 (已存在的檔案不重複寫入)"""
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            disk_path = self._disk_path(path, mtime_ns, size)
+            if not os.path.exists(disk_path):
+                np.save(disk_path, spectrum)
+        except Exception as e:
+            print(f"寫入光譜磁碟快取失敗: {e}")
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_dir": self.disk_dir
+            }
@@ -0,0 +1,88 @@
+import logging
+from typing import Any, Dict
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+def engine_options(config) -> Dict[str, Any]:
+    """
+    SQLAlchemy engine 參數
+    SocketIO 為 threading 模式，請求、輪詢、日誌寫入器與維護排程各自在不同執行緒取用連線，
+    連線池要足夠大；sqlite3 的 timeout (秒) 與 busy_timeout 一致
+    """
+    return {
+        "pool_size": int(config.get("SQLITE_POOL_SIZE", 10)),
+        "max_overflow": int(config.get("SQLITE_MAX_OVERFLOW", 20)),
+        "pool_timeout": float(config.get("SQLITE_POOL_TIMEOUT", 30)),
+        "connect_args": {
+            "timeout": int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000)) / 1000,
+            "check_same_thread": False
+        }
+    }
+
+
+def pragma_settings(config) -> Dict[str, Any]:
+    """每條新連線都要設定的 PRAGMA，順序即為執行順序"""
+    return {
+        # WAL 模式下讀取不會被寫入擋住，寫入也不必等讀取結束
+        "journal_mode": "WAL",
+        # WAL 搭配 NORMAL 只在 checkpoint 時 fsync，斷電最多遺失最後幾筆交易，資料庫不會損毀
+        "synchronous": "NORMAL",
+        # 負數代表 KiB
+        "cache_size": -int(config.get("SQLITE_CACHE_SIZE_KB", 65536)),
+        "busy_timeout": int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "temp_store": "MEMORY"
+    }
+
+
+def configure_sqlite(engine, config):
+    """在 engine 的 connect 事件上套用 PRAGMA，連線池內的每一條連線設定都相同"""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = pragma_settings(config)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+
+def self_check(engine, config) -> Dict[str, Any]:
+    """
+    啟動時從連線池取一條連線讀回實際生效的設定並記錄；
+    資料庫放在網路磁碟等不支援 WAL 的位置時，journal_mode 會維持原本的模式，這裡會提出警告
+    """
+    if engine.dialect.name != "sqlite":
+        return {}
+    expected = pragma_settings(config)
+    with engine.connect() as connection:
+        settings = {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in ("journal_mode", "synchronous", "cache_size", "busy_timeout", "temp_store", "auto_vacuum")
+        }
+        settings["sqlite_version"] = connection.exec_driver_sql("select sqlite_version()").scalar()
+    settings["pool_size"] = engine.pool.size() if hasattr(engine.pool, "size") else None
+
+    logger.info(f"SQLite 設定: {settings}")
+    if str(settings["journal_mode"]).lower() != expected["journal_mode"].lower():
+        logger.warning(f"SQLite 無法啟用 WAL (目前為 {settings['journal_mode']})，讀取可能會被寫入擋住")
+    # synchronous: 0=OFF 1=NORMAL 2=FULL
+    if settings["synchronous"] != 1:
+        logger.warning(f"SQLite synchronous 不是 NORMAL (目前為 {settings['synchronous']})")
+    return settings
+
+
+def checkpoint(engine):
+    """關閉前把 WAL 內容寫回主檔案並截斷，單獨複製 database.db 時資料才完整"""
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    except Exception as e:
+        logger.error(f"SQLite checkpoint 失敗: {e}")
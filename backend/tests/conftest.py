@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 與 app.py 相同，以 backend 目錄為匯入根目錄
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
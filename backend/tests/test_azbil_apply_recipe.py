@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+import routes.azbil_MFC_routes as azbil_routes
+from models.azbil_MFC_model import AzbilMFC
+
+
+class FakeAzbil:
+    """只模擬 apply_recipe 用到的寄存器讀寫"""
+    REGISTER_RANGES = AzbilMFC.REGISTER_RANGES
+
+    def __init__(self, flow_unit, flow_decimal=1, settings_ok=True):
+        self.registers = {"FLOW_UNIT": flow_unit, "FLOW_DECIMAL": flow_decimal, "FLOW_RATE": 0}
+        self.settings_ok = settings_ok
+        self.writes = []
+
+    def is_connected(self):
+        return True
+
+    async def read_register_map(self, keys):
+        if not self.settings_ok:
+            keys = [key for key in keys if key not in ("FLOW_UNIT", "FLOW_DECIMAL")]
+        return {key: self.registers[key] for key in keys}
+
+    async def set_flow(self, flow_rate):
+        self.writes.append(flow_rate)
+        self.registers["FLOW_RATE"] = flow_rate
+        return {"status": "success", "message": "ok"}
+
+
+@pytest.fixture
+def use_device(monkeypatch):
+    def install(device):
+        monkeypatch.setattr(azbil_routes.azbil_service, "device", device)
+        return device
+    return install
+
+
+# 0: mL/min, 1: L/min, 2: m^3/h；寄存器固定為 0.1 L/min，不隨 FLOW_UNIT / FLOW_DECIMAL 改變
+@pytest.mark.parametrize("flow_unit", [0, 1, 2])
+@pytest.mark.parametrize("flow_decimal", [0, 1, 3])
+def test_register_is_tenths_of_l_per_min(use_device, flow_unit, flow_decimal):
+    device = use_device(FakeAzbil(flow_unit, flow_decimal))
+    result = azbil_routes.apply_recipe(SimpleNamespace(main_gas_flow=1))
+
+    assert device.writes == [10]
+    assert result["raw_value"] == 10
+    assert result["flow_unit"] == flow_unit
+    assert result["confirmed"] is True
+
+
+@pytest.mark.parametrize("flow, raw", [(25, 250), (0.35, 4), (2.04, 20), (0, 0)])
+def test_rounds_to_nearest_register_step(use_device, flow, raw):
+    device = use_device(FakeAzbil(1))
+    azbil_routes.apply_recipe(SimpleNamespace(main_gas_flow=flow))
+    assert device.writes == [raw]
+
+
+def test_missing_settings_fails_without_writing(use_device):
+    device = use_device(FakeAzbil(0, settings_ok=False))
+    with pytest.raises(Exception, match="FLOW_UNIT"):
+        azbil_routes.apply_recipe(SimpleNamespace(main_gas_flow=1))
+    assert device.writes == []
+
+
+def test_out_of_range_is_rejected(use_device):
+    device = use_device(FakeAzbil(1))
+    high = AzbilMFC.REGISTER_RANGES["FLOW_RATE"][1]
+    with pytest.raises(ValueError):
+        azbil_routes.apply_recipe(SimpleNamespace(main_gas_flow=(high + 1) / 10))
+    assert device.writes == []
+
+
+def test_disconnected_device_is_skipped(use_device):
+    use_device(None)
+    assert azbil_routes.apply_recipe(SimpleNamespace(main_gas_flow=1)) is None
@@ -1,10 +1,11 @@
 import matplotlib
 matplotlib.use('Agg')  # 設置後端為 'Agg'，避免啟動 GUI
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import io
 import pandas as pd
 
-plt.rcParams.update({
+matplotlib.rcParams.update({
     'font.size': 16,          # 整體字體大小
     'axes.titlesize': 16,     # 標題字體大小
     'axes.labelsize': 16,     # 軸標籤字體大小
@@ -14,6 +15,25 @@ plt.rcParams.update({
 })
 # plt.style.use(['science', 'ieee'])
 
+# 重複使用的 Figure，不經過 pyplot 的全域狀態；繪圖在專用進程內依序執行
+_figure = None
+
+def _get_figure():
+    """取得清空後的 Figure，避免每次都重新建立"""
+    global _figure
+    if _figure is None:
+        _figure = Figure(figsize=(10, 6))
+        FigureCanvasAgg(_figure)
+    else:
+        _figure.clf()
+    return _figure
+
+def _to_png(fig):
+    img = io.BytesIO()
+    fig.savefig(img, format='png')
+    img.seek(0)
+    return img
+
 # 繪圖函數
 def plot_data(data, selected_files, x_label, y_label):
     df = pd.DataFrame(data)
@@ -21,7 +41,8 @@ def plot_data(data, selected_files, x_label, y_label):
     filtered_df = df[df['fileName'].isin(selected_files)]
     
     # 開始繪圖
-    fig, ax = plt.subplots(figsize=(10, 6))
+    fig = _get_figure()
+    ax = fig.add_subplot()
     
     # 繪製數據
     ax.plot(filtered_df['fileName'], filtered_df['averageTransmittance'], marker='o', linestyle='-', color='b')
@@ -32,19 +53,15 @@ def plot_data(data, selected_files, x_label, y_label):
     ax.set_title(f'{y_label}')
     
     # 保存圖片到內存中
-    img = io.BytesIO()
-    plt.savefig(img, format='png')
-    img.seek(0)
-    plt.close()
-    
-    return img
+    return _to_png(fig)
   
 def plot_data_filter(data, plot_flag):
   df = pd.DataFrame(data)
   # data有3個key, averageTransmittance, fileName和resisitance
   # plot_flag是一個array, 裡面有3~4個object,每個object會有3個key, flag(xLabel, yLabel1, yLabel2), unit(單位), value(個軸的標題), fla='yLabel2'有多一個key, 是isDisabled, true的話就不要考慮這個軸, false的話就要考慮這個軸
   # 開始繪圖
-  fig, ax = plt.subplots(figsize=(10, 6))
+  fig = _get_figure()
+  ax = fig.add_subplot()
   # 設置標籤
   # X軸為要在plot_flag的陣列內尋找flag為xLabel的value
   # Y軸為要在plot_flag的陣列內尋找flag為yLabel1的value
@@ -82,20 +99,24 @@ def plot_data_filter(data, plot_flag):
   ax.set_title(f'{x_label} and {y_label}')
 
   # 如果y_label2不是空的話，就要繪製第二個y軸
+  lines_2, labels_2 = [], []
   if y_label2 != '' and isViewed:
     ax2 = ax.twinx()
     ax2.plot(df['fileName'], df['resistance'], marker='o', linestyle='-', color='r', label=y_label2)
     ax2.set_ylabel(f'{y_label2} ({y2_unit})')
+    lines_2, labels_2 = ax2.get_legend_handles_labels()
     
   # 合併兩個圖例
   lines_1, labels_1 = ax.get_legend_handles_labels()
-  lines_2, labels_2 = ax2.get_legend_handles_labels()
   ax.legend(lines_1 + lines_2, labels_1 + labels_2, loc='best', frameon=True, facecolor='white', edgecolor='black')
     
   # 保存圖片到內存中
-  img = io.BytesIO()
-  plt.savefig(img, format='png')
-  img.seek(0)
-  plt.close()
-  
-  return img
+  return _to_png(fig)
+
+def render_plot(kind, params):
+  """供繪圖進程呼叫，回傳 PNG bytes；kind 為 'plot' 或 'filter'"""
+  if kind == 'filter':
+    img = plot_data_filter(params['fileData'], params['plotFlag'])
+  else:
+    img = plot_data(params['fileData'], params['selectedFiles'], params['xLabel'], params['yLabel'])
+  return img.getvalue()
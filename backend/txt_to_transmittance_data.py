@@ -1,63 +1,243 @@
-import pandas as pd
 import os
+import atexit
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from config import Config
+from spectrum_cache import SpectrumCache
+
+# 檔案數量達到這個門檻才使用多進程，檔案少時進程間傳輸的成本反而比較高
+PARALLEL_MIN_FILES = 32
+MAX_WORKERS = min(os.cpu_count() or 1, 8)
+
+# 多波長範圍計算可選的統計量
+AVAILABLE_STATS = ("mean", "median", "min", "max", "std")
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+# 已解析光譜的快取，只調整波長範圍重新計算時不需要再讀檔
+spectrum_cache = SpectrumCache(
+    max_bytes=Config.SPECTRUM_CACHE_MAX_MB * 1024 * 1024,
+    disk_dir=Config.SPECTRUM_CACHE_DIR
+)
+
+
+def load_spectrum(file_path: str) -> np.ndarray:
+    """
+    讀取光譜 txt 檔，回傳 (N, 2) 陣列: [:, 0] 為 Wavelength nm.，[:, 1] 為 T%
+    與原本 pd.read_csv(skiprows=1) 相同，跳過第一行說明與第二行欄位標題；
+    回傳的陣列依波長遞增排序，之後可以用 searchsorted 取出波長範圍
+    """
+    with open(file_path, 'rb') as f:
+        f.readline()
+        f.readline()
+        raw = f.read()
+
+    first_line = raw.lstrip().split(b'\n', 1)[0]
+    if first_line and first_line.count(b',') != 1:
+        raise ValueError(f"欄位數量不是 2: {first_line[:50]!r}")
+
+    values = np.array(raw.replace(b',', b' ').split(), dtype=float)
+    if values.size % 2:
+        raise ValueError("數據欄位不完整")
+    spectrum = values.reshape(-1, 2)
+
+    wavelength = spectrum[:, 0]
+    if wavelength.size > 1 and np.any(wavelength[1:] < wavelength[:-1]):
+        # 儀器常以遞減波長輸出，反轉即可；其他順序才需要排序
+        if np.all(wavelength[1:] <= wavelength[:-1]):
+            spectrum = spectrum[::-1].copy()
+        else:
+            spectrum = spectrum[np.argsort(wavelength, kind='stable')]
+    return spectrum
+
+
+def window_slice(spectrum: np.ndarray, max_spectrum: float, min_spectrum: float) -> np.ndarray:
+    """以二分搜尋取出 min_spectrum < 波長 < max_spectrum 範圍內的 T% (光譜需依波長遞增排序)"""
+    wavelength = spectrum[:, 0]
+    start = np.searchsorted(wavelength, min_spectrum, side='right')
+    end = np.searchsorted(wavelength, max_spectrum, side='left')
+    return spectrum[start:max(start, end), 1]
+
+
+def window_average(spectrum: np.ndarray, max_spectrum: float, min_spectrum: float) -> float:
+    """計算 min_spectrum < 波長 < max_spectrum 範圍內 T% 的平均值，範圍內沒有數據時為 NaN"""
+    values = window_slice(spectrum, max_spectrum, min_spectrum)
+    if values.size == 0:
+        return float('nan')
+    return float(values.sum() / values.size)
+
+
+def window_stats(spectrum: np.ndarray, windows: Sequence[Tuple[float, float]], stats: Sequence[str] = ("mean",)) -> List[Dict[str, float]]:
+    """
+    一次計算多個波長範圍的統計量，windows 為 [(min_spectrum, max_spectrum), ...]
+    std 為母體標準差 (ddof=0)，範圍內沒有數據時統計量為 NaN
+    """
+    results = []
+    for min_spectrum, max_spectrum in windows:
+        values = window_slice(spectrum, max_spectrum, min_spectrum)
+        item = {"minSpectrum": min_spectrum, "maxSpectrum": max_spectrum, "count": int(values.size)}
+        for stat in stats:
+            if values.size == 0:
+                item[stat] = float('nan')
+            elif stat == "mean":
+                item[stat] = float(values.sum() / values.size)
+            elif stat == "median":
+                item[stat] = float(np.median(values))
+            elif stat == "min":
+                item[stat] = float(values.min())
+            elif stat == "max":
+                item[stat] = float(values.max())
+            elif stat == "std":
+                item[stat] = float(values.std())
+        results.append(item)
+    return results
+
+
+def normalize_stats(stats: Optional[Sequence[str]]) -> List[str]:
+    """多範圍計算一定包含 mean (averageTransmittance 取第一個範圍的平均值)"""
+    stats = list(stats or ["mean"])
+    if "mean" not in stats:
+        stats.insert(0, "mean")
+    return stats
+
+
+def _load_file(file_path: str) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """子進程執行的單檔解析，錯誤以訊息回傳，避免例外物件在進程間序列化"""
+    try:
+        return load_spectrum(file_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def discover_spectrum_files(initial_file_path, group_number, file_number) -> List[Tuple[str, str]]:
+    """
+    依 {group}-{file}.txt 的規則找出所有要處理的檔案，回傳 [(檔名, 路徑)]
+    規則與原本逐檔處理相同: 檔案存在就讀下一個編號，不存在就換下一組，
+    新的一組連第 1 個檔案都不存在時結束；只列一次資料夾，不對每個檔案呼叫 isfile
+    """
+    try:
+        # Windows 檔名不分大小寫，以小寫比對、保留實際檔名
+        existing = {name.lower(): name for name in os.listdir(initial_file_path)}
+    except OSError:
+        return []
+
+    group_number = int(group_number)
+    file_number = int(file_number)
+    files = []
+    while True:
+        name = f"{group_number}-{file_number}"
+        actual_name = existing.get(f"{name}.txt")
+        if actual_name is not None:
+            files.append((name, f'{initial_file_path}/{actual_name}'))
+            file_number += 1
+        elif file_number == 1:
+            break
+        else:
+            group_number += 1
+            file_number = 1
+    return files
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """常駐的進程池，避免每次請求都重新啟動子進程"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+            atexit.register(_process_pool.shutdown, wait=False, cancel_futures=True)
+        return _process_pool
+
+
+def _reset_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+
+
+def load_spectra(file_paths: List[str]) -> List[Tuple[Optional[np.ndarray], Optional[str]]]:
+    """
+    批次載入多個光譜，回傳 [(光譜, 錯誤訊息)]
+    先查快取 (路徑 + mtime + 大小)，只有未命中的檔案需要解析，數量多時分配到進程池平行處理
+    """
+    results: List[Tuple[Optional[np.ndarray], Optional[str]]] = [(None, None)] * len(file_paths)
+    missing = []
+    for index, path in enumerate(file_paths):
+        try:
+            mtime_ns, size = SpectrumCache.file_signature(path)
+        except OSError as e:
+            results[index] = (None, str(e))
+            continue
+        spectrum = spectrum_cache.get(path, mtime_ns, size)
+        if spectrum is not None:
+            results[index] = (spectrum, None)
+        else:
+            missing.append((index, path, mtime_ns, size))
+
+    paths = [path for _, path, _, _ in missing]
+    loaded = None
+    if len(paths) >= PARALLEL_MIN_FILES and MAX_WORKERS > 1:
+        try:
+            chunksize = max(1, len(paths) // (MAX_WORKERS * 4))
+            loaded = list(_get_process_pool().map(_load_file, paths, chunksize=chunksize))
+        except Exception as e:
+            # 進程池無法使用 (例如子進程異常結束) 時改為在目前進程處理
+            print(f"多進程解析失敗，改為單一進程處理: {e}")
+            _reset_process_pool()
+    if loaded is None:
+        loaded = [_load_file(path) for path in paths]
+
+    for (index, path, mtime_ns, size), (spectrum, error) in zip(missing, loaded):
+        if spectrum is not None:
+            spectrum_cache.put(path, mtime_ns, size, spectrum)
+        results[index] = (spectrum, error)
+    return results
+
 
 # 調整成callback function，變數為initial_file_path、group_number、file_number、指定範圍的最大值和最小值
 # 輸出成陣列，裡面是object，包含檔案名稱和平均值，要回傳給前端
 # 這個callback function要在app.py裡面被呼叫
-def txt_to_transmittance(initial_file_path, group_number, file_number, max_spectrum, min_spectrum):
+def txt_to_transmittance(initial_file_path, group_number, file_number, max_spectrum, min_spectrum, windows=None, stats=None):
+    """
+    windows 有值時每個檔案只解析一次，同時計算所有波長範圍 ([(min, max), ...]) 的 stats 統計量，
+    結果放在 windows 欄位，averageTransmittance 為第一個範圍的平均值
+    """
+    # 先找出所有檔案，再批次載入 (已快取的光譜不重新解析)
+    files = discover_spectrum_files(initial_file_path, group_number, file_number)
+    spectra = load_spectra([path for _, path in files])
+    if windows:
+        windows = [(float(low), float(high)) for low, high in windows]
+        stats = normalize_stats(stats)
+        max_spectrum, min_spectrum = windows[0][1], windows[0][0]
+    else:
+        max_spectrum = float(max_spectrum)
+        min_spectrum = float(min_spectrum)
+
     # 用來儲存每個檔案的平均值和檔案名稱
     averages_list = []
-
-    # 迴圈遍歷所有的檔案
-    while True:
-        # 組合當前的檔案名稱
-        file_path = f'{initial_file_path}/{group_number}-{file_number}.txt'
-        
-        # 檢查檔案是否存在
-        if os.path.isfile(file_path):
-            try:
-                # 讀取檔案，跳過第一行
-                df = pd.read_csv(file_path, skiprows=1)
-                
-                # 設定列的標題
-                df.columns = ["Wavelength nm.", "T%"]
-                
-                # 將 Wavelength 和 T% 轉換為浮點數
-                df["Wavelength nm."] = df["Wavelength nm."].astype(float)
-                df["T%"] = df["T%"].astype(float)
-                
-                # 篩選指定範圍的數據
-                filtered_df = df[(df["Wavelength nm."] > min_spectrum) & (df["Wavelength nm."] < max_spectrum)]
-                
-                # 計算 T% 的平均值
-                total = filtered_df["T%"].sum()
-                average = total / len(filtered_df)  # 計算範圍內的平均值
-                
-                # 將結果加入列表中
-                averages_list.append({
-                    "fileName": f"{group_number}-{file_number}",
-                    "averageTransmittance": average
-                })
-                
-                # 顯示讀取和計算成功的訊息
-                print(f"成功處理: {file_path}，平均值: {average}")
-                
-                # 讀取下一個檔案編號
-                file_number += 1
-
-            except Exception as e:
-                print(f"處理檔案時發生錯誤: {file_path}，錯誤訊息: {str(e)}")
-                break
+    for (name, path), (spectrum, error) in zip(files, spectra):
+        if error is not None:
+            # 與原本相同，遇到錯誤的檔案就停止
+            print(f"處理檔案時發生錯誤: {path}，錯誤訊息: {error}")
+            break
+        if windows:
+            window_results = window_stats(spectrum, windows, stats)
+            averages_list.append({
+                "fileName": name,
+                "averageTransmittance": window_results[0]["mean"],
+                "windows": window_results
+            })
         else:
-            # 如果檔案不存在，嘗試下一組 (group_number + 1)
-            if file_number == 1:
-                # 如果 file_number 為 1 且檔案仍不存在，則終止迴圈
-                print("所有檔案處理完成。")
-                break
-            else:
-                # 檔案不存在，切換到下一組
-                group_number += 1
-                file_number = 1  # 重置 file_number 為 1
-    
+            averages_list.append({
+                "fileName": name,
+                "averageTransmittance": window_average(spectrum, max_spectrum, min_spectrum)
+            })
+
+    print(f"所有檔案處理完成，共 {len(averages_list)} 個檔案。")
+
     # 返回處理結果
     return averages_list